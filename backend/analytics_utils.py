@@ -0,0 +1,154 @@
+"""Boost analytics rollups.
+
+Carousel impressions and listing views land in hourly buckets through the
+write-behind counters (see counter_utils). rollup_boost_stats(), run from
+cron, turns those into what sellers read:
+
+- unique viewers per boost-hour, from the deduped raw impression rows
+- per boost, per UTC day totals (boost_impression_days)
+- one boost_stats row per boost: impressions, unique viewers, and the
+  listing views and offers that happened during the boost window
+
+It then prunes raw impression rows and old hourly buckets. Stats are
+final (and no longer recomputed) an hour after a boost ends, well
+inside the raw-row retention window. Impressions and views from before
+the hourly tables existed were folded into them by migration
+7c1f0e4b2a9d.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import func, or_
+
+from counter_utils import flush
+from extensions import db
+from models import (
+    Boost, BoostImpression, BoostImpressionDay, BoostImpressionHour, BoostStats,
+    ListingViewHour, Offer,
+)
+
+
+def _utc_naive(dt):
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _hour_of(dt):
+    return _utc_naive(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def _rollup_buckets(since):
+    """Fill unique viewers on hourly buckets and rebuild daily rows from since's day on."""
+    day_start = datetime.combine(since.date(), time())
+
+    hour_viewers = defaultdict(set)
+    day_viewers = defaultdict(set)
+    for boost_id, viewer, shown_at in db.session.query(
+        BoostImpression.boost_id, BoostImpression.viewer_user_id, BoostImpression.shown_at,
+    ).filter(BoostImpression.shown_at >= day_start, BoostImpression.viewer_user_id.isnot(None)):
+        hour = _hour_of(shown_at)
+        hour_viewers[(boost_id, hour)].add(viewer)
+        day_viewers[(boost_id, hour.date())].add(viewer)
+
+    day_impressions = defaultdict(int)
+    for h in BoostImpressionHour.query.filter(BoostImpressionHour.hour >= day_start):
+        hour = _utc_naive(h.hour)
+        if hour >= since:
+            h.unique_viewers = len(hour_viewers.get((h.boost_id, hour), ()))
+        day_impressions[(h.boost_id, hour.date())] += h.impressions
+
+    existing = {
+        (d.boost_id, d.day): d
+        for d in BoostImpressionDay.query.filter(BoostImpressionDay.day >= since.date())
+    }
+    for (boost_id, day), n in day_impressions.items():
+        row = existing.get((boost_id, day))
+        if row is None:
+            row = BoostImpressionDay(boost_id=boost_id, day=day)
+            db.session.add(row)
+        row.impressions = n
+        row.unique_viewers = len(day_viewers.get((boost_id, day), ()))
+    return len(day_impressions)
+
+
+def _refresh_boost_stats(now):
+    """Recompute totals for every boost whose stats are not final yet."""
+    boosts = Boost.query.outerjoin(BoostStats, BoostStats.boost_id == Boost.id).filter(
+        or_(BoostStats.id.is_(None), BoostStats.finalized == False),
+    ).all()
+    if not boosts:
+        return 0
+    ids = [b.id for b in boosts]
+
+    impressions = dict(db.session.query(
+        BoostImpressionHour.boost_id, func.sum(BoostImpressionHour.impressions),
+    ).filter(BoostImpressionHour.boost_id.in_(ids)).group_by(BoostImpressionHour.boost_id).all())
+    viewers = dict(db.session.query(
+        BoostImpression.boost_id, func.count(func.distinct(BoostImpression.viewer_user_id)),
+    ).filter(BoostImpression.boost_id.in_(ids)).group_by(BoostImpression.boost_id).all())
+    stats = {s.boost_id: s for s in BoostStats.query.filter(BoostStats.boost_id.in_(ids))}
+
+    # Views and offers for every boost's listing over the span of all windows,
+    # in two queries, then split per boost window below
+    listing_ids = {b.listing_id for b in boosts}
+    earliest = min(_hour_of(b.starts_at) for b in boosts)
+    latest = max(_utc_naive(b.ends_at) for b in boosts)
+    view_hours = defaultdict(list)
+    for listing_id, hour, n in db.session.query(
+        ListingViewHour.listing_id, ListingViewHour.hour, ListingViewHour.views,
+    ).filter(
+        ListingViewHour.listing_id.in_(listing_ids), ListingViewHour.hour >= earliest, ListingViewHour.hour < latest,
+    ):
+        view_hours[listing_id].append((_utc_naive(hour), n))
+    offer_times = defaultdict(list)
+    for listing_id, created_at in db.session.query(Offer.listing_id, Offer.created_at).filter(
+        Offer.listing_id.in_(listing_ids), Offer.created_at >= earliest, Offer.created_at < latest,
+    ):
+        offer_times[listing_id].append(_utc_naive(created_at))
+
+    for b in boosts:
+        starts_at, ends_at = _utc_naive(b.starts_at), _utc_naive(b.ends_at)
+        # Views are hourly, so the hour the boost started in counts in full
+        first_hour = _hour_of(starts_at)
+        views = sum(n for hour, n in view_hours[b.listing_id] if first_hour <= hour < ends_at)
+        offers = sum(1 for t in offer_times[b.listing_id] if starts_at <= t < ends_at)
+
+        s = stats.get(b.id)
+        if s is None:
+            s = BoostStats(boost_id=b.id)
+            db.session.add(s)
+        s.impressions = int(impressions.get(b.id) or 0)
+        s.unique_viewers = int(viewers.get(b.id) or 0)
+        s.listing_views = int(views or 0)
+        s.offers = offers
+        s.finalized = ends_at <= now - timedelta(hours=1)
+        s.updated_at = now
+    return len(boosts)
+
+
+def _prune(now):
+    cfg = current_app.config
+    raw_cutoff = now - timedelta(days=cfg.get("BOOST_IMPRESSION_RETENTION_DAYS", 30))
+    hourly_cutoff = now - timedelta(days=cfg.get("HOURLY_BUCKET_RETENTION_DAYS", 90))
+    raw = BoostImpression.query.filter(BoostImpression.shown_at < raw_cutoff).delete(synchronize_session=False)
+    BoostImpressionHour.query.filter(BoostImpressionHour.hour < hourly_cutoff).delete(synchronize_session=False)
+    ListingViewHour.query.filter(ListingViewHour.hour < hourly_cutoff).delete(synchronize_session=False)
+    return raw
+
+
+def rollup_boost_stats(now=None):
+    """Run the whole rollup and pruning pass. Returns a summary dict."""
+    now = now or datetime.utcnow()
+    flush()  # land buffered impressions and views first
+    since = _hour_of(now) - timedelta(hours=current_app.config.get("ROLLUP_LOOKBACK_HOURS", 48))
+    try:
+        days = _rollup_buckets(since)
+        boosts = _refresh_boost_stats(now)
+        pruned = _prune(now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {"days": days, "boosts": boosts, "pruned_impressions": pruned}
@@ -1,5 +1,4 @@
 import os, re
-from datetime import datetime, timezone
 from flask import Flask, jsonify, send_from_directory, request, make_response
 from flask_cors import CORS
 from werkzeug.middleware.proxy_fix import ProxyFix
@@ -9,8 +8,13 @@ from flask_login import current_user
 
 from config import Config
 from extensions import db, migrate, login_manager, limiter
-from models import User, ListingImage, Listing
+from models import User
 from routes import register_blueprints
+from blob_store import init_blob_store
+from cli import register_commands
+from outbox_utils import init_outbox
+from presence_utils import touch as touch_last_seen
+from principal_utils import load_principal
 
 load_dotenv()
 
@@ -42,9 +46,12 @@ def create_app():
     # ensure upload folder exists
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
+    # blob store for listing images (local filesystem or S3-compatible)
+    init_blob_store(app)
+
     # init extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(__file__), "migrations"))
     login_manager.init_app(app)
     limiter.init_app(app)
 
@@ -58,193 +65,20 @@ def create_app():
     from flask_session import Session
     Session(app)
 
-    with app.app_context():
-        db.create_all()
-        # Add columns that create_all() won't add to existing tables
-        from sqlalchemy import text, inspect
-        insp = inspect(db.engine)
-        def _add_col(table, col, col_type):
-            t_cols = {c["name"] for c in insp.get_columns(table)}
-            if col not in t_cols:
-                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}"))
-                return True
-            return False
-
-        changed = False
-        changed |= _add_col("users", "avatar_data", "BYTEA")
-        changed |= _add_col("users", "avatar_mime", "VARCHAR(32)")
-        changed |= _add_col("users", "rating_avg", "NUMERIC DEFAULT 0")
-        changed |= _add_col("users", "rating_count", "INTEGER DEFAULT 0")
-        changed |= _add_col("users", "is_pro", "BOOLEAN DEFAULT FALSE")
-        changed |= _add_col("listings", "buyer_id", "VARCHAR(36) REFERENCES users(id)")
-        changed |= _add_col("users", "is_verified", "BOOLEAN DEFAULT FALSE")
-        changed |= _add_col("users", "onboarding_done", "BOOLEAN DEFAULT FALSE")
-        changed |= _add_col("listings", "renewed_at", "TIMESTAMP WITH TIME ZONE")
-        changed |= _add_col("listings", "bundle_discount_pct", "INTEGER")
-        changed |= _add_col("listings", "is_draft", "BOOLEAN DEFAULT FALSE")
-        changed |= _add_col("messages", "image_url", "TEXT")
-        changed |= _add_col("users", "last_seen", "TIMESTAMP WITH TIME ZONE")
-        changed |= _add_col("listings", "nudged_at", "TIMESTAMP WITH TIME ZONE")
-        changed |= _add_col("users", "pro_free_boost_last_used_day", "VARCHAR(10)")
-        changed |= _add_col("boosts", "boost_type", "VARCHAR(16) DEFAULT 'paid'")
-        changed |= _add_col("boosts", "duration_hours", "INTEGER DEFAULT 24")
-        changed |= _add_col("listing_images", "image_data", "BYTEA")
-        changed |= _add_col("listing_images", "image_mime", "VARCHAR(32)")
-        changed |= _add_col("reports", "listing_id", "VARCHAR(36) REFERENCES listings(id)")
-        changed |= _add_col("users", "is_test_account", "BOOLEAN DEFAULT FALSE")
-        changed |= _add_col("users", "is_admin", "BOOLEAN DEFAULT FALSE")
-        changed |= _add_col("users", "is_banned", "BOOLEAN DEFAULT FALSE")
-        changed |= _add_col("reports", "admin_notes", "TEXT")
-        changed |= _add_col("reports", "resolved_by", "VARCHAR(36)")
-        changed |= _add_col("reports", "resolved_at", "TIMESTAMP WITH TIME ZONE")
-        if changed:
-            db.session.commit()
-
-        # Drop is_demo column if it still exists (removed from model)
-        try:
-            listing_cols = {c["name"] for c in insp.get_columns("listings")}
-            if "is_demo" in listing_cols:
-                db.session.execute(text("ALTER TABLE listings DROP COLUMN is_demo"))
-                db.session.commit()
-        except Exception:
-            db.session.rollback()
-
-        # Fix reports table columns that may have been created as INTEGER instead of VARCHAR(36)
-        try:
-            report_cols = {c["name"]: c for c in insp.get_columns("reports")}
-            for col_name in ("id", "reporter_id", "reported_user_id"):
-                col_info = report_cols.get(col_name)
-                if col_info and "INT" in str(col_info["type"]).upper():
-                    db.session.execute(text(
-                        f"ALTER TABLE reports ALTER COLUMN {col_name} TYPE VARCHAR(36) USING {col_name}::VARCHAR(36)"
-                    ))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
-
-        # Partial unique index: only 1 active boost per listing at the DB level
-        try:
-            db.session.execute(text(
-                "CREATE UNIQUE INDEX IF NOT EXISTS uq_one_active_boost_per_listing "
-                "ON boosts (listing_id) WHERE status = 'active'"
-            ))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
-
-        # One-time cleanup: remove old broken images (filesystem URLs) and empty listings
-        # Use raw SQL to avoid ORM issues with missing columns
-        try:
-            result = db.session.execute(text(
-                "DELETE FROM listing_images WHERE image_url LIKE '%/uploads/%' AND image_data IS NULL"
-            ))
-            if result.rowcount > 0:
-                # Find listings with zero remaining images and delete them + dependents
-                orphans = db.session.execute(text(
-                    "SELECT id FROM listings WHERE id NOT IN (SELECT DISTINCT listing_id FROM listing_images)"
-                )).fetchall()
-                for (lid,) in orphans:
-                    # Delete dependents via raw SQL — each wrapped individually
-                    for tbl, col in [
-                        ("boost_impressions", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
-                        ("boosts", "listing_id=:lid"),
-                        ("messages", "conversation_id IN (SELECT id FROM conversations WHERE listing_id=:lid)"),
-                        ("conversations", "listing_id=:lid"),
-                        ("safe_meet_locations", "listing_id=:lid"),
-                        ("safety_ack_events", "listing_id=:lid"),
-                        ("observing", "listing_id=:lid"),
-                        ("notifications", "listing_id=:lid"),
-                        ("offers", "listing_id=:lid"),
-                        ("price_history", "listing_id=:lid"),
-                        ("reviews", "listing_id=:lid"),
-                        ("listing_views", "listing_id=:lid"),
-                        ("meetup_confirmations", "listing_id=:lid"),
-                    ]:
-                        try:
-                            db.session.execute(text(f"DELETE FROM {tbl} WHERE {col}"), {"lid": lid})
-                        except Exception:
-                            db.session.rollback()
-                    # Also try reports (column may not exist on older DBs)
-                    try:
-                        db.session.execute(text("DELETE FROM reports WHERE listing_id=:lid"), {"lid": lid})
-                    except Exception:
-                        db.session.rollback()
-                    try:
-                        db.session.execute(text("DELETE FROM listings WHERE id=:lid"), {"lid": lid})
-                    except Exception:
-                        db.session.rollback()
-                db.session.commit()
-        except Exception:
-            db.session.rollback()
-
-        # One-time cleanup: delete demo listings and demo user
-        try:
-            demo_user = db.session.execute(text(
-                "SELECT id FROM users WHERE email='demo@pocket-market.com'"
-            )).fetchone()
-            if demo_user:
-                demo_uid = demo_user[0]
-                demo_listings = db.session.execute(text(
-                    "SELECT id FROM listings WHERE user_id=:uid"
-                ), {"uid": demo_uid}).fetchall()
-                for (lid,) in demo_listings:
-                    for tbl, col in [
-                        ("boost_impressions", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
-                        ("boosts", "listing_id=:lid"),
-                        ("messages", "conversation_id IN (SELECT id FROM conversations WHERE listing_id=:lid)"),
-                        ("conversations", "listing_id=:lid"),
-                        ("safe_meet_locations", "listing_id=:lid"),
-                        ("safety_ack_events", "listing_id=:lid"),
-                        ("observing", "listing_id=:lid"),
-                        ("notifications", "listing_id=:lid"),
-                        ("offers", "listing_id=:lid"),
-                        ("price_history", "listing_id=:lid"),
-                        ("reviews", "listing_id=:lid"),
-                        ("listing_views", "listing_id=:lid"),
-                        ("meetup_confirmations", "listing_id=:lid"),
-                        ("listing_images", "listing_id=:lid"),
-                        ("reports", "listing_id=:lid"),
-                    ]:
-                        try:
-                            db.session.execute(text(f"DELETE FROM {tbl} WHERE {col}"), {"lid": lid})
-                        except Exception:
-                            db.session.rollback()
-                    db.session.execute(text("DELETE FROM listings WHERE id=:lid"), {"lid": lid})
-                # Delete the demo user itself
-                for tbl in ["subscriptions", "push_subscriptions", "saved_searches",
-                            "blocked_users", "notifications", "observing", "safety_ack_events"]:
-                    try:
-                        db.session.execute(text(f"DELETE FROM {tbl} WHERE user_id=:uid"), {"uid": demo_uid})
-                    except Exception:
-                        db.session.rollback()
-                try:
-                    db.session.execute(text("DELETE FROM blocked_users WHERE blocked_id=:uid"), {"uid": demo_uid})
-                except Exception:
-                    db.session.rollback()
-                db.session.execute(text("DELETE FROM users WHERE id=:uid"), {"uid": demo_uid})
-                db.session.commit()
-        except Exception:
-            db.session.rollback()
-
-        # Bootstrap admin: promote ADMIN_EMAIL user to is_admin on startup
-        admin_email = os.getenv("ADMIN_EMAIL", "").strip().lower()
-        if admin_email:
-            admin_user = User.query.filter_by(email=admin_email).first()
-            if not admin_user:
-                admin_user = User.query.filter(User.email.ilike(admin_email)).first()
-            if admin_user and not admin_user.is_admin:
-                admin_user.is_admin = True
-                db.session.commit()
+    # Schema changes and one-off data fixes live in migrations/ and run once
+    # per deploy via `flask maintenance run`, not in every worker
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, user_id)
+        return load_principal(user_id)
 
     @login_manager.unauthorized_handler
     def unauthorized():
         return jsonify({"error": "Login required"}), 401
 
     register_blueprints(app)
+    register_commands(app)
+    init_outbox(app)
 
     # Block write operations for test accounts (Stripe review)
     @app.before_request
@@ -274,13 +108,8 @@ def create_app():
 
     @app.before_request
     def _update_last_seen():
-        if not current_user.is_authenticated:
-            return
-        now = datetime.now(timezone.utc)
-        # Only write to DB at most once per minute to avoid excessive writes
-        if not current_user.last_seen or (now - current_user.last_seen).total_seconds() > 60:
-            current_user.last_seen = now
-            db.session.commit()
+        if current_user.is_authenticated:
+            touch_last_seen(current_user.id)
 
     @app.get("/api/health")
     def health():
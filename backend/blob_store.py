@@ -0,0 +1,169 @@
+"""Content-addressed blob storage for listing images.
+
+Blobs are keyed by the SHA-256 of their bytes, so identical uploads are
+stored once and a key never changes meaning. Two backends:
+
+- "local": files under BLOB_STORE_PATH, sharded as ab/cd/<key>
+- "s3": any S3-compatible service (AWS, MinIO, R2) via boto3, which is
+  optional: install requirements-s3.txt
+"""
+import hashlib
+import os
+import tempfile
+
+from flask import current_app
+
+
+def blob_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class LocalBlobStore:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, data, content_type=None):
+        key = blob_key(data)
+        dest = self.path(key)
+        if os.path.exists(dest):
+            os.utime(dest)  # counts as new again for gc-blobs
+            return key
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        # Write to a temp file and rename so readers never see partial blobs
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest))
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, dest)
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return key
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def modified(self, key):
+        """POSIX time the blob was last stored, or None if it does not exist."""
+        try:
+            return os.path.getmtime(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self):
+        """Yield (key, modified POSIX time) for every stored blob."""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if len(name) == 64:  # skips half-written temp files
+                    yield name, os.path.getmtime(os.path.join(dirpath, name))
+
+
+class S3BlobStore:
+    def __init__(self, bucket, endpoint_url=None, region=None,
+                 access_key_id=None, secret_access_key=None, prefix="blobs/"):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("BLOB_STORE=s3 needs boto3: pip install -r requirements-s3.txt") from e
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key_id or None,
+            aws_secret_access_key=secret_access_key or None,
+        )
+
+    def path(self, key):
+        return None  # not on the local filesystem
+
+    def _object_key(self, key):
+        return f"{self.prefix}{key[:2]}/{key}"
+
+    def put(self, data, content_type=None):
+        key = blob_key(data)
+        extra = {"ContentType": content_type} if content_type else {}
+        if self.exists(key):
+            # Copy onto itself so LastModified counts as new again for gc-blobs
+            self.client.copy_object(
+                Bucket=self.bucket, Key=self._object_key(key),
+                CopySource={"Bucket": self.bucket, "Key": self._object_key(key)},
+                MetadataDirective="REPLACE", CacheControl="public, max-age=31536000, immutable", **extra,
+            )
+            return key
+        self.client.put_object(
+            Bucket=self.bucket, Key=self._object_key(key), Body=data,
+            CacheControl="public, max-age=31536000, immutable", **extra,
+        )
+        return key
+
+    def get(self, key):
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return obj["Body"].read()
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception:
+            return False
+
+    def modified(self, key):
+        """POSIX time the blob was last stored, or None if it does not exist."""
+        try:
+            obj = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception:
+            return None
+        return obj["LastModified"].timestamp()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def keys(self):
+        """Yield (key, modified POSIX time) for every stored blob."""
+        pages = self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefix)
+        for page in pages:
+            for obj in page.get("Contents", ()):
+                yield obj["Key"].rsplit("/", 1)[-1], obj["LastModified"].timestamp()
+
+
+def init_blob_store(app):
+    backend = app.config.get("BLOB_STORE", "local")
+    if backend == "s3":
+        store = S3BlobStore(
+            bucket=app.config["S3_BUCKET"],
+            endpoint_url=app.config.get("S3_ENDPOINT_URL"),
+            region=app.config.get("S3_REGION"),
+            access_key_id=app.config.get("S3_ACCESS_KEY_ID"),
+            secret_access_key=app.config.get("S3_SECRET_ACCESS_KEY"),
+        )
+    else:
+        store = LocalBlobStore(app.config["BLOB_STORE_PATH"])
+    app.extensions["blob_store"] = store
+    return store
+
+
+def get_blob_store():
+    return current_app.extensions["blob_store"]
@@ -0,0 +1,254 @@
+"""Read-through cache for serialized listing payloads.
+
+Values are JSON-serializable dicts/lists stored under a key with a TTL
+and any number of tags. With REDIS_URL set the cache is shared by every
+gunicorn worker. Otherwise each process keeps its own LRU of up to
+CACHE_MAX_ENTRIES, and invalidation only reaches that process, so TTLs
+are the bound on staleness there.
+
+Invalidation follows the ORM, as the carousel cache does. Changes to
+listings, their images, safe-meet spots and boosts, and to the seller
+fields shown on cards, are collected at flush. The matching keys and
+tags are dropped once the transaction commits. Any change to a User also
+drops its cached session principal (see principal_utils). Code that writes with
+bulk UPDATE/DELETE statements calls invalidate()/invalidate_tags()
+itself.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from counter_utils import _get_redis
+from models import Boost, Listing, ListingImage, SafeMeetLocation, User
+
+_PREFIX = "pm:cache:"
+_TAG_PREFIX = "pm:cache-tag:"
+
+# User columns in seller summaries (see profile_utils) and serialized listings
+_SELLER_FIELDS = ("display_name", "email", "avatar_url", "is_pro", "is_verified", "rating_avg", "rating_count")
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # key -> (expires_at, value, tags)
+_tags = {}                 # tag -> {key}
+
+
+def listing_key(listing_id):
+    return f"listing:{listing_id}"
+
+
+def seller_tag(user_id):
+    return f"seller:{user_id}"
+
+
+def principal_key(user_id):
+    return f"principal:{user_id}"
+
+
+FEED_TAG = "feed"
+
+
+def _drop(key):
+    """Remove key and its tag memberships. Call with _lock held."""
+    entry = _entries.pop(key, None)
+    if entry is None:
+        return
+    for tag in entry[2]:
+        members = _tags.get(tag)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del _tags[tag]
+
+
+def _redis():
+    if not has_app_context():
+        return None
+    return _get_redis(current_app)
+
+
+def cache_get(key):
+    """The cached value for key, or None."""
+    r = _redis()
+    if r is not None:
+        try:
+            raw = r.get(_PREFIX + key)
+            return json.loads(raw) if raw is not None else None
+        except Exception as e:
+            current_app.logger.warning(f"Cache get failed for {key}: {e}")
+            return None
+    with _lock:
+        hit = _entries.get(key)
+        if hit is None:
+            return None
+        if hit[0] <= time.monotonic():
+            _drop(key)
+            return None
+        _entries.move_to_end(key)
+        return hit[1]
+
+
+def cache_set(key, value, ttl, tags=()):
+    if ttl <= 0:
+        return
+    r = _redis()
+    if r is not None:
+        try:
+            pipe = r.pipeline(transaction=False)
+            pipe.set(_PREFIX + key, json.dumps(value, default=str), ex=int(ttl))
+            for tag in tags:
+                pipe.sadd(_TAG_PREFIX + tag, key)
+                pipe.expire(_TAG_PREFIX + tag, int(ttl) * 2)
+            pipe.execute()
+        except Exception as e:
+            current_app.logger.warning(f"Cache set failed for {key}: {e}")
+        return
+    max_entries = current_app.config.get("CACHE_MAX_ENTRIES", 2048) if has_app_context() else 2048
+    tags = frozenset(tags)
+    with _lock:
+        _drop(key)
+        _entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            _tags.setdefault(tag, set()).add(key)
+        while len(_entries) > max_entries:
+            _drop(next(iter(_entries)))
+
+
+def cache_get_many(keys):
+    """{key: value} for the keys that are cached, in one round trip."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    r = _redis()
+    if r is not None:
+        try:
+            return {k: json.loads(v) for k, v in zip(keys, r.mget([_PREFIX + k for k in keys])) if v is not None}
+        except Exception as e:
+            current_app.logger.warning(f"Cache mget failed: {e}")
+            return {}
+    found = {}
+    for k in keys:
+        v = cache_get(k)
+        if v is not None:
+            found[k] = v
+    return found
+
+
+def cache_set_many(items, ttl, tags_for=None):
+    """Cache {key: value}. tags_for(key) gives each entry's tags."""
+    if ttl <= 0 or not items:
+        return
+    r = _redis()
+    if r is not None:
+        try:
+            pipe = r.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(_PREFIX + key, json.dumps(value, default=str), ex=int(ttl))
+                for tag in (tags_for(key) if tags_for else ()):
+                    pipe.sadd(_TAG_PREFIX + tag, key)
+                    pipe.expire(_TAG_PREFIX + tag, int(ttl) * 2)
+            pipe.execute()
+        except Exception as e:
+            current_app.logger.warning(f"Cache mset failed: {e}")
+        return
+    for key, value in items.items():
+        cache_set(key, value, ttl, tags_for(key) if tags_for else ())
+
+
+def cached(key, ttl, loader, tags=()):
+    """Return the cached value for key, or call loader() and cache what it returns.
+
+    loader may return (value, ttl) to shorten the TTL for that value. A
+    None value is not cached.
+    """
+    value = cache_get(key)
+    if value is not None:
+        return value
+    value = loader()
+    if isinstance(value, tuple):
+        value, ttl = value[0], min(ttl, value[1])
+    if value is not None:
+        cache_set(key, value, ttl, tags)
+    return value
+
+
+def invalidate(*keys):
+    r = _redis()
+    if r is not None:
+        try:
+            r.delete(*(_PREFIX + k for k in keys))
+        except Exception as e:
+            current_app.logger.warning(f"Cache invalidate failed: {e}")
+        return
+    with _lock:
+        for k in keys:
+            _drop(k)
+
+
+def invalidate_tags(*tags):
+    r = _redis()
+    if r is not None:
+        try:
+            for tag in tags:
+                members = r.smembers(_TAG_PREFIX + tag)
+                pipe = r.pipeline(transaction=False)
+                for m in members:
+                    pipe.delete(_PREFIX + (m.decode() if isinstance(m, bytes) else m))
+                pipe.delete(_TAG_PREFIX + tag)
+                pipe.execute()
+        except Exception as e:
+            current_app.logger.warning(f"Cache tag invalidate failed: {e}")
+        return
+    with _lock:
+        for tag in tags:
+            for k in list(_tags.get(tag, ())):
+                _drop(k)
+
+
+# ── Invalidation ─────────────────────────────────────────────────
+
+
+def _changed_seller(user):
+    state = inspect(user)
+    return any(state.attrs[f].history.has_changes() for f in _SELLER_FIELDS)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect(session, flush_context, instances):
+    keys = session.info.setdefault("cache_keys", set())
+    tags = session.info.setdefault("cache_tags", set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Listing):
+            keys.add(listing_key(obj.id))
+            tags.add(FEED_TAG)
+        elif isinstance(obj, (ListingImage, SafeMeetLocation, Boost)):
+            keys.add(listing_key(obj.listing_id))
+            tags.add(FEED_TAG)
+        elif isinstance(obj, User) and obj not in session.new:
+            if obj in session.deleted or session.is_modified(obj):
+                keys.add(principal_key(obj.id))
+            if obj in session.deleted or _changed_seller(obj):
+                tags.update((seller_tag(obj.id), FEED_TAG))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    keys = session.info.pop("cache_keys", None)
+    tags = session.info.pop("cache_tags", None)
+    if not (keys or tags) or not has_app_context():
+        return
+    if keys:
+        invalidate(*keys)
+    if tags:
+        invalidate_tags(*tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("cache_keys", None)
+    session.info.pop("cache_tags", None)
@@ -0,0 +1,227 @@
+"""Featured carousel: cached boost candidates and weighted sampling.
+
+The set of active boosts changes rarely (a purchase, a free boost, an
+expiry) but is read on every home page load. Candidates, meaning the
+boost, listing, seller, weight and serialized card, are built once
+with bulk queries and reused until a boost or boosted listing changes,
+the earliest boost in the set ends, or CAROUSEL_CACHE_SECONDS passes.
+Each request then draws its slots from a Walker alias table, O(1) per
+draw.
+"""
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from counter_utils import _get_redis
+from extensions import db
+from image_utils import variant_srcsets
+from models import Boost, Listing, ListingImage, User
+
+# ── Configurable constants ──
+CAROUSEL_SIZE = 10              # max boosted slots shown per request
+PAID_BOOST_WEIGHT = 3           # paid boosts appear 3x more often
+FREE_PRO_BOOST_WEIGHT = 1       # free Pro boosts appear at base rate
+MAX_SLOTS_PER_SELLER = 2        # anti-spam: same seller can't fill more than 2 slots
+
+_VERSION_KEY = "pm:carousel:version"
+
+_lock = threading.Lock()
+_cache = None          # (version, built_at, valid_until, candidates, prob, alias)
+_local_version = 0
+
+
+def invalidate_carousel():
+    """Drop the cached candidate set in this process and, via Redis, every other one."""
+    global _local_version
+    _local_version += 1
+    if not has_app_context():
+        return
+    r = _get_redis(current_app)
+    if r is not None:
+        try:
+            r.incr(_VERSION_KEY)
+        except Exception:
+            pass
+
+
+def _version(app):
+    shared = 0
+    r = _get_redis(app)
+    if r is not None:
+        try:
+            shared = int(r.get(_VERSION_KEY) or 0)
+        except Exception:
+            pass
+    return (shared, _local_version)
+
+
+def _build_alias(weights):
+    """Vose's alias method: O(n) setup for O(1) weighted draws."""
+    n = len(weights)
+    total = float(sum(weights))
+    prob = [0.0] * n
+    alias = [0] * n
+    scaled = [w * n / total for w in weights]
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] = scaled[l] + scaled[s] - 1.0
+        (small if scaled[l] < 1.0 else large).append(l)
+    for i in chain(small, large):
+        prob[i] = 1.0
+    return prob, alias
+
+
+def _build(now):
+    rows = db.session.query(
+        Boost.id, Boost.listing_id, Boost.boost_type, Boost.ends_at, Listing.user_id,
+    ).join(Listing, Listing.id == Boost.listing_id).filter(
+        Boost.status == "active",
+        Boost.ends_at > now,
+        Listing.is_sold == False,
+        Listing.is_draft == False,
+    ).order_by(Boost.created_at.asc()).all()
+
+    boosts = {}
+    for row in rows:
+        boosts.setdefault(row.listing_id, row)  # one slot per listing
+    if not boosts:
+        return [], None
+
+    ids = list(boosts)
+    listings = {l.id: l for l in Listing.query.filter(Listing.id.in_(ids))}
+    imgs = defaultdict(list)
+    for lid, image_id, url in db.session.query(
+        ListingImage.listing_id, ListingImage.id, ListingImage.image_url,
+    ).filter(ListingImage.listing_id.in_(ids)).order_by(ListingImage.created_at.asc()):
+        imgs[lid].append((image_id, url))
+    srcsets = variant_srcsets([i for v in imgs.values() for i, _ in v])
+    pro_sellers = {uid for uid, in db.session.query(User.id).filter(
+        User.id.in_({b.user_id for b in boosts.values()}), User.is_pro == True,
+    )}
+
+    candidates = []
+    for lid, b in boosts.items():
+        l = listings[lid]
+        candidates.append({
+            "boost_id": b.id,
+            "listing_id": lid,
+            "seller_id": b.user_id,
+            "weight": PAID_BOOST_WEIGHT if b.boost_type == "paid" else FREE_PRO_BOOST_WEIGHT,
+            "card": {
+                "id": l.id,
+                "title": l.title,
+                "price_cents": l.price_cents,
+                "is_sold": l.is_sold,
+                "images": [url for _, url in imgs[lid]],
+                "image_srcsets": [srcsets.get(i, {}) for i, _ in imgs[lid]],
+                "is_pro_seller": b.user_id in pro_sellers,
+                "created_at": l.created_at.isoformat(),
+                "boost_ends_at": b.ends_at.isoformat(),
+            },
+        })
+    return candidates, min(b.ends_at for b in boosts.values())
+
+
+def _candidates():
+    global _cache
+    app = current_app._get_current_object()
+    version = _version(app)
+    cache = _cache
+    if cache and cache[0] == version and time.monotonic() < cache[2]:
+        return cache[3], cache[4], cache[5]
+
+    with _lock:
+        cache = _cache
+        if cache and cache[0] == version and time.monotonic() < cache[2]:
+            return cache[3], cache[4], cache[5]
+        now = datetime.utcnow()
+        candidates, first_end = _build(now)
+        ttl = app.config.get("CAROUSEL_CACHE_SECONDS", 60)
+        if first_end is not None:
+            # Rebuild as soon as the first boost in the set runs out
+            ttl = min(ttl, max((first_end.replace(tzinfo=None) - now).total_seconds(), 0))
+        prob, alias = _build_alias([c["weight"] for c in candidates]) if candidates else (None, None)
+        _cache = (version, time.monotonic(), time.monotonic() + ttl, candidates, prob, alias)
+        return candidates, prob, alias
+
+
+def pick_featured(size=CAROUSEL_SIZE, per_seller=MAX_SLOTS_PER_SELLER):
+    """Weighted random carousel slots, without repeats and at most per_seller per seller."""
+    candidates, prob, alias = _candidates()
+    n = len(candidates)
+    if not n:
+        return []
+
+    chosen = []
+    taken = set()
+    seller_count = defaultdict(int)
+
+    def _take(i):
+        taken.add(i)
+        c = candidates[i]
+        if seller_count[c["seller_id"]] < per_seller:
+            seller_count[c["seller_id"]] += 1
+            chosen.append(c)
+
+    # Rejection sampling from the alias table; repeats are rare while n >> size
+    for _ in range(size * 8):
+        if len(chosen) >= size or len(taken) >= n:
+            break
+        i = random.randrange(n)
+        if random.random() >= prob[i]:
+            i = alias[i]
+        if i not in taken:
+            _take(i)
+
+    if len(chosen) < size and len(taken) < n:
+        # Few candidates left: finish with an exact weighted shuffle
+        # (Efraimidis-Spirakis keys) over whatever was not drawn
+        rest = sorted(
+            (i for i in range(n) if i not in taken),
+            key=lambda i: random.random() ** (1.0 / candidates[i]["weight"]),
+            reverse=True,
+        )
+        for i in rest:
+            if len(chosen) >= size:
+                break
+            _take(i)
+    return chosen
+
+
+# ── Invalidation ─────────────────────────────────────────────────
+# Any ORM change to a boost, listing or listing image, or to a seller's
+# is_pro (shown on the card), marks the session; the cache is dropped once
+# that transaction commits. Bulk UPDATE/DELETE
+# statements bypass the ORM and call invalidate_carousel() themselves.
+
+
+@event.listens_for(Session, "before_flush")
+def _watch_flush(session, flush_context, instances):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (Boost, Listing, ListingImage)) or (
+            isinstance(obj, User) and obj not in session.new and inspect(obj).attrs.is_pro.history.has_changes()
+        ):
+            session.info["carousel_dirty"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop("carousel_dirty", False):
+        invalidate_carousel()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("carousel_dirty", None)
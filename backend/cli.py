@@ -0,0 +1,252 @@
+"""Flask CLI maintenance commands (run with `flask --app wsgi <group> <command>`)."""
+import click
+from flask.cli import AppGroup
+
+from extensions import db
+from models import ListingImage, ListingImageVariant, OutboxJob
+
+images_cli = AppGroup("images", help="Listing image storage maintenance.")
+outbox_cli = AppGroup("outbox", help="Queued email and push delivery.")
+maintenance_cli = AppGroup("maintenance", help="Schema upgrade and one-off data fixes, run once per deploy.")
+
+# Revision that databases built by the old boot-time create_all() are stamped at
+_LEGACY_BASE_REVISION = "db077b74c8ed"
+
+# Rows that hang off a listing, deleted before the listing itself
+_LISTING_DEPENDENTS = [
+    ("boost_impressions", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
+    ("boost_impression_hours", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
+    ("boost_impression_days", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
+    ("boost_stats", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
+    ("boosts", "listing_id=:lid"),
+    ("messages", "conversation_id IN (SELECT id FROM conversations WHERE listing_id=:lid)"),
+    ("conversations", "listing_id=:lid"),
+    ("safe_meet_locations", "listing_id=:lid"),
+    ("safety_ack_events", "listing_id=:lid"),
+    ("observing", "listing_id=:lid"),
+    ("notifications", "listing_id=:lid"),
+    ("offers", "listing_id=:lid"),
+    ("price_history", "listing_id=:lid"),
+    ("reviews", "listing_id=:lid"),
+    ("listing_views", "listing_id=:lid"),
+    ("listing_view_hours", "listing_id=:lid"),
+    ("meetup_confirmations", "listing_id=:lid"),
+    ("listing_image_variants", "image_id IN (SELECT id FROM listing_images WHERE listing_id=:lid)"),
+    ("listing_images", "listing_id=:lid"),
+    ("reports", "listing_id=:lid"),
+]
+
+
+@images_cli.command("migrate-blobs")
+@click.option("--batch-size", default=100, show_default=True, help="Rows moved per transaction.")
+@click.option("--limit", default=0, help="Stop after this many images (0 = all).")
+@click.option("--keep-data", is_flag=True, help="Leave the BYTEA copy in place.")
+def migrate_blobs(batch_size, limit, keep_data):
+    """Move legacy image_data BYTEA rows into the blob store in batches."""
+    from blob_store import get_blob_store
+    store = get_blob_store()
+    moved = 0
+    while True:
+        rows = db.session.query(
+            ListingImage.id, ListingImage.image_data, ListingImage.image_mime,
+        ).filter(
+            ListingImage.blob_key.is_(None), ListingImage.image_data.isnot(None),
+        ).limit(min(batch_size, limit - moved) if limit else batch_size).all()
+        if not rows:
+            break
+        for image_id, data, mime in rows:
+            data = bytes(data)
+            values = {"blob_key": store.put(data, mime or "image/jpeg"), "byte_size": len(data)}
+            if not keep_data:
+                values["image_data"] = None
+            ListingImage.query.filter_by(id=image_id).update(values, synchronize_session=False)
+        db.session.commit()
+        moved += len(rows)
+        click.echo(f"Moved {moved} images")
+        if limit and moved >= limit:
+            break
+    click.echo(f"Done: {moved} images in the blob store")
+
+
+@images_cli.command("build-variants")
+@click.option("--batch-size", default=50, show_default=True, help="Images processed per transaction.")
+@click.option("--limit", default=0, help="Stop after this many images (0 = all).")
+def build_image_variants(batch_size, limit):
+    """Generate variants for older images and finish any left pending by a restart."""
+    from blob_store import get_blob_store
+    from image_utils import build_variants, finish_image, release_blobs, store_variants
+    store = get_blob_store()
+    done = failed = 0
+    skip = set()
+    while True:
+        has_variants = db.session.query(ListingImageVariant.image_id)
+        query = db.session.query(ListingImage.id, ListingImage.blob_key, ListingImage.status).filter(
+            ListingImage.id.notin_(has_variants),
+        )
+        if skip:
+            query = query.filter(ListingImage.id.notin_(skip))
+        rows = query.limit(min(batch_size, limit - done) if limit else batch_size).all()
+        if not rows:
+            break
+        previews = []
+        for image_id, key, status in rows:
+            if key:
+                data = store.get(key)
+            else:
+                data = db.session.query(ListingImage.image_data).filter_by(id=image_id).scalar()
+            try:
+                variants = build_variants(bytes(data))
+                if status == "pending":
+                    finish_image(db.session.get(ListingImage, image_id), variants)
+                    previews.append(key)
+                else:
+                    store_variants(image_id, variants)
+                done += 1
+            except Exception as e:
+                click.echo(f"Skipping {image_id}: {e}")
+                skip.add(image_id)
+                failed += 1
+        db.session.commit()
+        release_blobs(previews)
+        click.echo(f"Processed {done} images")
+        if limit and done >= limit:
+            break
+    click.echo(f"Done: {done} images with variants, {failed} skipped")
+
+
+@images_cli.command("gc-blobs")
+@click.option("--min-age-hours", default=24, show_default=True,
+              help="Keep blobs stored more recently than this (uploads not committed yet).")
+@click.option("--dry-run", is_flag=True, help="Only count what would be deleted.")
+def gc_blobs(min_age_hours, dry_run):
+    """Delete blobs that no image or variant points at any more."""
+    from image_utils import gc_blobs as gc
+    n = gc(min_age_hours * 3600, dry_run=dry_run)
+    click.echo(f"{n} unreferenced blobs" if dry_run else f"Deleted {n} unreferenced blobs")
+
+
+@outbox_cli.command("drain")
+def drain_outbox():
+    """Deliver every job that is due now."""
+    from outbox_utils import drain_outbox as drain
+    total = drain()
+    click.echo(f"Attempted {total} jobs")
+
+
+@outbox_cli.command("retry-failed")
+@click.option("--kind", type=click.Choice(["email", "push"]), default=None, help="Only this kind of job.")
+def retry_failed(kind):
+    """Put jobs that ran out of attempts back in the queue."""
+    from datetime import datetime
+    query = OutboxJob.query.filter_by(status="failed")
+    if kind:
+        query = query.filter_by(kind=kind)
+    n = query.update({
+        OutboxJob.status: "pending", OutboxJob.attempts: 0, OutboxJob.next_attempt_at: datetime.utcnow(),
+    }, synchronize_session=False)
+    db.session.commit()
+    click.echo(f"Requeued {n} jobs")
+
+
+def _delete_listings(listing_ids):
+    """Delete listings and their dependents. Returns their blob keys, for release_blobs() after commit."""
+    from sqlalchemy import text
+    from image_utils import listing_blob_keys
+    blob_keys = listing_blob_keys(listing_ids)
+    for lid in listing_ids:
+        for tbl, where in _LISTING_DEPENDENTS:
+            db.session.execute(text(f"DELETE FROM {tbl} WHERE {where}"), {"lid": lid})
+        db.session.execute(text("DELETE FROM listings WHERE id=:lid"), {"lid": lid})
+    return blob_keys
+
+
+def upgrade_schema():
+    """Bring the database to the latest migration.
+
+    Databases without an alembic_version table were built by create_all()
+    at boot. They are stamped at the legacy base first, and the next
+    revision checks for everything it creates.
+    """
+    from flask_migrate import stamp, upgrade
+    from sqlalchemy import inspect
+    if "alembic_version" not in inspect(db.engine).get_table_names():
+        stamp(revision=_LEGACY_BASE_REVISION)
+    upgrade()
+
+
+def purge_broken_images():
+    """Delete old filesystem-URL images that have no bytes, then listings left without images."""
+    from sqlalchemy import text
+    result = db.session.execute(text(
+        "DELETE FROM listing_images WHERE image_url LIKE '%/uploads/%' AND image_data IS NULL"
+    ))
+    orphans = []
+    if result.rowcount > 0:
+        orphans = [lid for lid, in db.session.execute(text(
+            "SELECT id FROM listings WHERE id NOT IN (SELECT DISTINCT listing_id FROM listing_images)"
+        ))]
+        _delete_listings(orphans)  # listings without images, so no blobs to release
+    db.session.commit()
+    return result.rowcount, len(orphans)
+
+
+def purge_demo_user():
+    """Delete the demo account and its listings. Returns the listings removed."""
+    from sqlalchemy import text
+    from image_utils import release_blobs
+    demo = db.session.execute(text("SELECT id FROM users WHERE email='demo@pocket-market.com'")).fetchone()
+    if not demo:
+        return 0
+    uid = demo[0]
+    listing_ids = [lid for lid, in db.session.execute(text("SELECT id FROM listings WHERE user_id=:uid"), {"uid": uid})]
+    blob_keys = _delete_listings(listing_ids)
+    for tbl in ["subscriptions", "push_subscriptions", "saved_searches",
+                "notifications", "observing", "safety_ack_events"]:
+        db.session.execute(text(f"DELETE FROM {tbl} WHERE user_id=:uid"), {"uid": uid})
+    db.session.execute(text("DELETE FROM blocked_users WHERE blocker_id=:uid OR blocked_id=:uid"), {"uid": uid})
+    db.session.execute(text("DELETE FROM users WHERE id=:uid"), {"uid": uid})
+    db.session.commit()
+    release_blobs(blob_keys)
+    return len(listing_ids)
+
+
+def promote_admin_email():
+    """Make the ADMIN_EMAIL user an admin. Returns the email promoted, if any."""
+    import os
+    from models import User
+    admin_email = os.getenv("ADMIN_EMAIL", "").strip().lower()
+    if not admin_email:
+        return None
+    admin_user = User.query.filter_by(email=admin_email).first()
+    if not admin_user:
+        admin_user = User.query.filter(User.email.ilike(admin_email)).first()
+    if admin_user and not admin_user.is_admin:
+        admin_user.is_admin = True
+        db.session.commit()
+        return admin_user.email
+    return None
+
+
+@maintenance_cli.command("run")
+@click.option("--skip-cleanup", is_flag=True, help="Only upgrade the schema and promote ADMIN_EMAIL.")
+def run_maintenance(skip_cleanup):
+    """Upgrade the schema, purge broken and demo listings, promote ADMIN_EMAIL."""
+    upgrade_schema()
+    if not skip_cleanup:
+        # Best effort, as when this ran at boot: a failed cleanup must not block the deploy
+        try:
+            images, listings = purge_broken_images()
+            click.echo(f"Removed {images} broken images and {listings} listings left without images")
+            click.echo(f"Removed {purge_demo_user()} demo listings")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Cleanup skipped: {e}", err=True)
+    promoted = promote_admin_email()
+    if promoted:
+        click.echo(f"Promoted {promoted} to admin")
+
+
+def register_commands(app):
+    app.cli.add_command(images_cli)
+    app.cli.add_command(outbox_cli)
+    app.cli.add_command(maintenance_cli)
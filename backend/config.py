@@ -19,6 +19,28 @@ class Config:
     RESET_TOKEN_EXPIRES_SECONDS = int(os.getenv("RESET_TOKEN_EXPIRES_SECONDS", "3600"))
 
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
+
+    # Listing image blobs: "local" (needs a persistent volume in production) or
+    # "s3" (needs boto3: requirements-s3.txt, or build the image with WITH_S3=1)
+    BLOB_STORE = os.getenv("BLOB_STORE", "local")
+    BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", os.path.join(UPLOAD_FOLDER, "blobs"))
+    S3_BUCKET = os.getenv("S3_BUCKET", "")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")  # e.g. http://localhost:9000 for MinIO
+    S3_REGION = os.getenv("S3_REGION", "")
+    S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID", "")
+    S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY", "")
+
+    # Image processing: worker processes per app process (0 = in-request),
+    # and whether uploads return before variants are built. Async jobs
+    # lost to a restart are picked up by `flask images build-variants`.
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+    IMAGE_VARIANTS_ASYNC = os.getenv("IMAGE_VARIANTS_ASYNC", "").lower() in ("1", "true", "yes")
+    # Unreferenced blobs stored more recently than this are kept (an upload of
+    # the same bytes may not have committed yet) and left to the daily
+    # POST /api/cron/gc-blobs, which deletes those older than BLOB_GC_MIN_AGE_HOURS
+    BLOB_RELEASE_MIN_AGE_SECONDS = int(os.getenv("BLOB_RELEASE_MIN_AGE_SECONDS", "900"))
+    BLOB_GC_MIN_AGE_HOURS = int(os.getenv("BLOB_GC_MIN_AGE_HOURS", "24"))
+
     MAX_CONTENT_LENGTH_MB = int(os.getenv("MAX_CONTENT_LENGTH_MB", "50"))
 
     # Session cookie settings for HTTPS (Railway)
@@ -29,11 +51,25 @@ class Config:
     # Resend (transactional email)
     RESEND_API_KEY = os.getenv("RESEND_API_KEY", "")
     RESEND_FROM = os.getenv("RESEND_FROM", "Pocket Market <noreply@pocket-market.com>")
+    RESEND_API_BASE = os.getenv("RESEND_API_BASE", "https://api.resend.com")  # tests point this at a fake server (tests/conftest.py)
+
+    # Email/push outbox: delivery threads per process, poll interval, retries
+    OUTBOX_WORKER = os.getenv("OUTBOX_WORKER", "1").lower() in ("1", "true", "yes")
+    OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "8"))
+    OUTBOX_POLL_SECONDS = int(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_BACKOFF_SECONDS = int(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+    OUTBOX_MAX_BACKOFF_SECONDS = int(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "3600"))
+    OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+    # Listing edits within this window reach observers as one notification
+    LISTING_FANOUT_DELAY_SECONDS = int(os.getenv("LISTING_FANOUT_DELAY_SECONDS", "120"))
 
     # Web Push (VAPID)
     VAPID_PUBLIC_KEY = os.getenv("VAPID_PUBLIC_KEY", "")
     VAPID_PRIVATE_KEY = os.getenv("VAPID_PRIVATE_KEY", "")
     VAPID_CLAIMS = {"sub": "mailto:pocketmarket.help@gmail.com"}
+    PUSH_CONCURRENCY = int(os.getenv("PUSH_CONCURRENCY", "16"))  # devices sent to at once
 
     # Cron auth
     CRON_SECRET = os.getenv("CRON_SECRET", "dev-secret-change-me")
@@ -46,6 +82,37 @@ class Config:
     SESSION_KEY_PREFIX = "pm:"
     PERMANENT_SESSION_LIFETIME = 60 * 60 * 24 * 30  # 30 days
 
+    # Listing payload / first feed page cache (Redis, else per-process LRU)
+    LISTING_CACHE_SECONDS = int(os.getenv("LISTING_CACHE_SECONDS", "60"))
+    FEED_CACHE_SECONDS = int(os.getenv("FEED_CACHE_SECONDS", "30"))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+    USER_SUMMARY_CACHE_SECONDS = int(os.getenv("USER_SUMMARY_CACHE_SECONDS", "300"))
+
+    # Featured carousel candidate cache (also rebuilt on any boost change)
+    CAROUSEL_CACHE_SECONDS = int(os.getenv("CAROUSEL_CACHE_SECONDS", "60"))
+
+    # Write-behind counters (listing views) flush interval
+    COUNTER_FLUSH_SECONDS = int(os.getenv("COUNTER_FLUSH_SECONDS", "10"))
+
+    # Buffered users.last_seen: per-user write resolution and flush interval
+    LAST_SEEN_RESOLUTION_SECONDS = int(os.getenv("LAST_SEEN_RESOLUTION_SECONDS", "60"))
+    LAST_SEEN_FLUSH_SECONDS = int(os.getenv("LAST_SEEN_FLUSH_SECONDS", "30"))
+
+    # Cached session principal (the columns current_user is read for)
+    PRINCIPAL_CACHE_SECONDS = int(os.getenv("PRINCIPAL_CACHE_SECONDS", "60"))
+
+    # Server-Sent Events (/api/stream): keep-alive ping and max connection age
+    STREAM_HEARTBEAT_SECONDS = int(os.getenv("STREAM_HEARTBEAT_SECONDS", "25"))
+    STREAM_MAX_SECONDS = int(os.getenv("STREAM_MAX_SECONDS", "300"))
+    # Open streams per process; each holds a gthread thread, so keep this well
+    # below GUNICORN_THREADS to leave threads for ordinary API requests
+    STREAM_MAX_CONNECTIONS = int(os.getenv("STREAM_MAX_CONNECTIONS", "8"))
+
+    # Boost analytics rollup (POST /api/cron/rollup-boost-stats, hourly)
+    ROLLUP_LOOKBACK_HOURS = int(os.getenv("ROLLUP_LOOKBACK_HOURS", "48"))
+    BOOST_IMPRESSION_RETENTION_DAYS = int(os.getenv("BOOST_IMPRESSION_RETENTION_DAYS", "30"))
+    HOURLY_BUCKET_RETENTION_DAYS = int(os.getenv("HOURLY_BUCKET_RETENTION_DAYS", "90"))
+
     # Sentry
     SENTRY_DSN = os.getenv("SENTRY_DSN", "")
 
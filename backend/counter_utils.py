@@ -0,0 +1,249 @@
+"""Write-behind counters for hot, low-value writes.
+
+Hits are buffered in Redis (when REDIS_URL is set, shared by every gunicorn
+worker) or in process memory, and a daemon thread flushes them to the
+database in batches every COUNTER_FLUSH_SECONDS.
+"""
+import atexit
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import DateTime, bindparam, text
+
+from extensions import db
+
+_KEY_PREFIX = "pm:counter:"
+
+_lock = threading.Lock()
+_pending = {}       # counter name -> Counter of key -> hits (memory backend)
+_appliers = {}      # counter name -> fn({key: hits})
+_flusher = None
+_app = None
+_redis = None
+
+
+def register_counter(name, apply_fn):
+    """Register a counter. apply_fn(counts) writes {key: hits} to the DB."""
+    _appliers[name] = apply_fn
+    _pending.setdefault(name, Counter())
+
+
+def _get_redis(app):
+    global _redis
+    url = app.config.get("REDIS_URL")
+    if not url:
+        return None
+    if _redis is None:
+        import redis
+        _redis = redis.from_url(url)
+    return _redis
+
+
+def incr(name, key, n=1):
+    """Buffer n hits for key on counter name. Never touches the database."""
+    app = current_app._get_current_object()
+    _ensure_flusher(app)
+    r = _get_redis(app)
+    if r is not None:
+        try:
+            r.hincrby(_KEY_PREFIX + name, key, n)
+            return
+        except Exception as e:
+            app.logger.warning(f"Counter {name}: redis unavailable, buffering in memory: {e}")
+    with _lock:
+        _pending[name][key] += n
+
+
+def incr_many(name, keys):
+    """Buffer one hit for each key in a single Redis round trip."""
+    if not keys:
+        return
+    app = current_app._get_current_object()
+    _ensure_flusher(app)
+    r = _get_redis(app)
+    if r is not None:
+        try:
+            pipe = r.pipeline(transaction=False)
+            for key in keys:
+                pipe.hincrby(_KEY_PREFIX + name, key, 1)
+            pipe.execute()
+            return
+        except Exception as e:
+            app.logger.warning(f"Counter {name}: redis unavailable, buffering in memory: {e}")
+    with _lock:
+        _pending[name].update(keys)
+
+
+def _drain(app, name):
+    """Take everything buffered for name, from Redis and memory."""
+    with _lock:
+        counts = Counter(_pending[name])
+        _pending[name].clear()
+
+    r = _get_redis(app)
+    if r is not None:
+        # RENAME is atomic, so hits landing mid-flush go to a fresh hash
+        tmp = f"{_KEY_PREFIX}{name}:flushing:{uuid.uuid4().hex}"
+        try:
+            r.rename(_KEY_PREFIX + name, tmp)
+        except Exception:
+            return counts  # nothing buffered yet
+        try:
+            for k, v in r.hgetall(tmp).items():
+                counts[k.decode() if isinstance(k, bytes) else k] += int(v)
+        finally:
+            r.delete(tmp)
+    return counts
+
+
+def flush(name=None):
+    """Flush one counter (or all of them) to the database. Returns rows applied."""
+    app = current_app._get_current_object()
+    applied = 0
+    for counter_name in ([name] if name else list(_appliers)):
+        counts = _drain(app, counter_name)
+        if not counts:
+            continue
+        try:
+            _appliers[counter_name](dict(counts))
+            db.session.commit()
+            applied += len(counts)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Counter {counter_name} flush failed, re-buffering: {e}")
+            with _lock:
+                _pending[counter_name].update(counts)
+    return applied
+
+
+def _run_flusher(app):
+    interval = app.config.get("COUNTER_FLUSH_SECONDS", 10)
+    stop = threading.Event()
+    while not stop.wait(interval):
+        with app.app_context():
+            try:
+                flush()
+            except Exception as e:
+                app.logger.error(f"Counter flusher error: {e}")
+            finally:
+                db.session.remove()
+
+
+def _flush_at_exit():
+    if _app is None:
+        return
+    with _app.app_context():
+        try:
+            flush()
+        except Exception:
+            pass
+
+
+def _ensure_flusher(app):
+    global _flusher, _app
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        if _app is None:
+            atexit.register(_flush_at_exit)
+        _app = app
+        _flusher = threading.Thread(target=_run_flusher, args=(app,), name="counter-flusher", daemon=True)
+        _flusher.start()
+
+
+# ── Listing views ────────────────────────────────────────────────
+
+
+def _apply_listing_views(counts):
+    db.session.execute(
+        text("UPDATE listings SET view_count = COALESCE(view_count, 0) + :n WHERE id = :id"),
+        [{"id": lid, "n": n} for lid, n in counts.items()],
+    )
+
+
+register_counter("listing_views", _apply_listing_views)
+
+
+# ── Hourly buckets ───────────────────────────────────────────────
+# Keys carry the UTC hour so every flush lands in the right bucket:
+#   boost_impressions:  "<boost_id>|<hour>"            -> impressions
+#   boost_viewers:      "<boost_id>|<user_id>|<hour>"  -> (deduped to one raw row)
+#   listing_view_hours: "<listing_id>|<hour>"          -> views
+
+_HOUR_FMT = "%Y-%m-%dT%H"
+
+
+def _hour_param(name):
+    return bindparam(name, type_=DateTime(timezone=True))
+
+
+def _apply_boost_impressions(counts):
+    # Boosts deleted since the hit are skipped rather than failing the batch
+    stmt = text(
+        "INSERT INTO boost_impression_hours (id, boost_id, hour, impressions) "
+        "SELECT :id, :boost_id, :hour, :n WHERE EXISTS (SELECT 1 FROM boosts WHERE id = :boost_id) "
+        "ON CONFLICT (boost_id, hour) DO UPDATE "
+        "SET impressions = boost_impression_hours.impressions + excluded.impressions"
+    ).bindparams(_hour_param("hour"))
+    rows = []
+    for key, n in counts.items():
+        boost_id, hour = key.split("|")
+        rows.append({"id": str(uuid.uuid4()), "boost_id": boost_id,
+                     "hour": datetime.strptime(hour, _HOUR_FMT), "n": n})
+    db.session.execute(stmt, rows)
+
+
+def _apply_boost_viewers(counts):
+    """Write one raw impression row per (boost, viewer, hour), however often it was shown."""
+    stmt = text(
+        "INSERT INTO boost_impressions (id, boost_id, viewer_user_id, shown_at) "
+        "SELECT :id, :boost_id, :viewer, :hour "
+        "WHERE EXISTS (SELECT 1 FROM boosts WHERE id = :boost_id) "
+        "AND EXISTS (SELECT 1 FROM users WHERE id = :viewer) "
+        "AND NOT EXISTS (SELECT 1 FROM boost_impressions WHERE boost_id = :boost_id "
+        "AND viewer_user_id = :viewer AND shown_at >= :hour AND shown_at < :next_hour)"
+    ).bindparams(_hour_param("hour"), _hour_param("next_hour"))
+    rows = []
+    for key in counts:
+        boost_id, viewer, hour = key.split("|")
+        start = datetime.strptime(hour, _HOUR_FMT)
+        rows.append({"id": str(uuid.uuid4()), "boost_id": boost_id, "viewer": viewer,
+                     "hour": start, "next_hour": start + timedelta(hours=1)})
+    db.session.execute(stmt, rows)
+
+
+def _apply_listing_view_hours(counts):
+    stmt = text(
+        "INSERT INTO listing_view_hours (id, listing_id, hour, views) "
+        "SELECT :id, :listing_id, :hour, :n WHERE EXISTS (SELECT 1 FROM listings WHERE id = :listing_id) "
+        "ON CONFLICT (listing_id, hour) DO UPDATE "
+        "SET views = listing_view_hours.views + excluded.views"
+    ).bindparams(_hour_param("hour"))
+    rows = []
+    for key, n in counts.items():
+        listing_id, hour = key.split("|")
+        rows.append({"id": str(uuid.uuid4()), "listing_id": listing_id,
+                     "hour": datetime.strptime(hour, _HOUR_FMT), "n": n})
+    db.session.execute(stmt, rows)
+
+
+register_counter("boost_impressions", _apply_boost_impressions)
+register_counter("boost_viewers", _apply_boost_viewers)
+register_counter("listing_view_hours", _apply_listing_view_hours)
+
+
+def record_listing_view(listing_id):
+    incr("listing_views", listing_id)
+    incr("listing_view_hours", f"{listing_id}|{datetime.utcnow().strftime(_HOUR_FMT)}")
+
+
+def record_boost_impressions(boost_ids, viewer_id=None):
+    hour = datetime.utcnow().strftime(_HOUR_FMT)
+    incr_many("boost_impressions", [f"{b}|{hour}" for b in boost_ids])
+    if viewer_id:
+        incr_many("boost_viewers", [f"{b}|{viewer_id}|{hour}" for b in boost_ids])
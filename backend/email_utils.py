@@ -1,9 +1,16 @@
+import threading
 import uuid
+from string import Template
+
 import requests as http_requests
 from datetime import datetime, timezone
 
 from flask import current_app
 
+from extensions import db
+from models import Listing
+from outbox_utils import DeliveryError, enqueue, register_handler
+
 
 SUPPORT_EMAIL = "pocketmarket.help@gmail.com"
 BRAND_COLOR = "#3ee0ff"
@@ -40,58 +47,106 @@ def _ticket_id(prefix="PM"):
     return f"{prefix}-{short}"
 
 
-def send_email(to, subject, body_html, reply_to=None):
-    """Send an email via Resend API (synchronous)."""
-    api_key = current_app.config.get("RESEND_API_KEY")
-    if not api_key:
-        current_app.logger.warning("RESEND_API_KEY not set, skipping email")
-        return
+BATCH_SIZE = 100  # Resend's limit per /emails/batch call
 
-    from_addr = current_app.config.get("RESEND_FROM", "Pocket Market <noreply@pocket-market.com>")
-    payload = {
-        "from": from_addr,
-        "to": [to],
-        "subject": subject,
-        "html": body_html,
-    }
-    if reply_to:
-        payload["reply_to"] = reply_to
+_session = None
+_session_lock = threading.Lock()
 
-    try:
-        resp = http_requests.post(
-            "https://api.resend.com/emails",
-            headers={"Authorization": f"Bearer {api_key}"},
-            json=payload,
-            timeout=10,
-        )
-        if resp.status_code >= 400:
-            current_app.logger.error(f"Resend API error {resp.status_code}: {resp.text}")
-    except Exception as e:
-        current_app.logger.error(f"Failed to send email: {e}")
 
+def _http():
+    """One pooled HTTP session per process for all Resend calls."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = http_requests.Session()
+            adapter = http_requests.adapters.HTTPAdapter(pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)  # RESEND_API_BASE may be a local fake server
+        return _session
 
-def send_email_sync(to, subject, body_html, reply_to=None):
-    """Send an email via Resend synchronously and return the result."""
-    api_key = current_app.config.get("RESEND_API_KEY")
-    if not api_key:
-        raise ValueError("RESEND_API_KEY not set")
 
-    from_addr = current_app.config.get("RESEND_FROM", "Pocket Market <noreply@pocket-market.com>")
+def _resend_payload(to, subject, html, reply_to=None):
     payload = {
-        "from": from_addr,
+        "from": current_app.config.get("RESEND_FROM", "Pocket Market <noreply@pocket-market.com>"),
         "to": [to],
         "subject": subject,
-        "html": body_html,
+        "html": html,
     }
     if reply_to:
         payload["reply_to"] = reply_to
+    return payload
 
-    resp = http_requests.post(
-        "https://api.resend.com/emails",
-        headers={"Authorization": f"Bearer {api_key}"},
-        json=payload,
+
+def _resend_post(path, body):
+    base = current_app.config.get("RESEND_API_BASE", "https://api.resend.com").rstrip("/")
+    return _http().post(
+        base + path,
+        headers={"Authorization": f"Bearer {current_app.config['RESEND_API_KEY']}"},
+        json=body,
         timeout=10,
     )
+
+
+def _raise_for_resend(resp):
+    if resp.status_code >= 400:
+        # 429 and 5xx are worth retrying; other 4xx won't get better
+        retry = resp.status_code == 429 or resp.status_code >= 500
+        raise DeliveryError(f"Resend API error {resp.status_code}: {resp.text[:500]}", permanent=not retry)
+
+
+def send_email(to, subject, body_html, reply_to=None):
+    """Queue an email for the outbox worker; returns immediately."""
+    payload = {"to": to, "subject": subject, "html": body_html}
+    if reply_to:
+        payload["reply_to"] = reply_to
+    enqueue("email", payload)
+
+
+def send_email_batch(emails):
+    """Queue many emails (dicts of to, subject, html, reply_to) as batch jobs of up to BATCH_SIZE."""
+    emails = list(emails)
+    for i in range(0, len(emails), BATCH_SIZE):
+        enqueue("email_batch", {"emails": emails[i:i + BATCH_SIZE]})
+
+
+def _deliver_email(job):
+    """Outbox handler: send one queued email via Resend."""
+    if not current_app.config.get("RESEND_API_KEY"):
+        current_app.logger.warning("RESEND_API_KEY not set, skipping email")
+        return
+    _raise_for_resend(_resend_post("/emails", _resend_payload(job["to"], job["subject"], job["html"], job.get("reply_to"))))
+
+
+def _deliver_email_batch(job):
+    """Outbox handler: send a batch of emails in one Resend call (all or nothing).
+
+    Stale-listing nudges carry nudge_listing_id; those listings are marked
+    nudged only once the batch is accepted, so a failed batch is sent again
+    by the next /api/cron/nudge-stale run.
+    """
+    if not current_app.config.get("RESEND_API_KEY"):
+        current_app.logger.warning("RESEND_API_KEY not set, skipping email batch")
+        return
+    body = [_resend_payload(e["to"], e["subject"], e["html"], e.get("reply_to")) for e in job["emails"]]
+    _raise_for_resend(_resend_post("/emails/batch", body))
+
+    nudged = [e["nudge_listing_id"] for e in job["emails"] if e.get("nudge_listing_id")]
+    if nudged:
+        Listing.query.filter(Listing.id.in_(nudged), Listing.nudged_at.is_(None)).update(
+            {Listing.nudged_at: datetime.utcnow()}, synchronize_session=False,
+        )
+        db.session.commit()
+
+
+register_handler("email", _deliver_email)
+register_handler("email_batch", _deliver_email_batch)
+
+
+def send_email_sync(to, subject, body_html, reply_to=None):
+    """Send an email via Resend synchronously and return the result."""
+    if not current_app.config.get("RESEND_API_KEY"):
+        raise ValueError("RESEND_API_KEY not set")
+    resp = _resend_post("/emails", _resend_payload(to, subject, body_html, reply_to))
     return resp.status_code, resp.json()
 
 
@@ -310,63 +365,41 @@ def send_verification_email(email, display_name, token):
     )
 
 
-def send_message_notification(recipient_email, recipient_name, sender_name, listing_title, conversation_id):
-    name = recipient_name or "there"
-    sender = sender_name or "Someone"
-    listing = listing_title or "a listing"
-    link = f"https://pocket-market.com/chat/{conversation_id}"
-    send_email(
-        to=recipient_email,
-        subject=f"{sender} sent you a message on Pocket Market",
-        reply_to=SUPPORT_EMAIL,
-        body_html=_wrap(f"""
+# High-volume templates: the layout is wrapped and compiled once at import,
+# each send only substitutes its fields.
+_BUTTON = (
+    f'<a href="$link" style="display:inline-block;background:{BRAND_COLOR};color:#000;font-weight:600;'
+    f'padding:12px 32px;border-radius:8px;text-decoration:none;font-size:15px;">$label</a>'
+)
+
+_MESSAGE_NOTIFICATION = Template(_wrap(f"""
             <h2 style="color:{BRAND_COLOR};margin-top:0;">New Message</h2>
-            <p>Hi {name},</p>
-            <p><strong>{sender}</strong> sent you a message about <strong>{listing}</strong>.</p>
+            <p>Hi $name,</p>
+            <p><strong>$sender</strong> sent you a message about <strong>$listing</strong>.</p>
             <div style="text-align:center;margin:24px 0;">
-                <a href="{link}" style="display:inline-block;background:{BRAND_COLOR};color:#000;font-weight:600;padding:12px 32px;border-radius:8px;text-decoration:none;font-size:15px;">View Message</a>
+                {_BUTTON.replace("$label", "View Message")}
             </div>
             <p style="font-size:13px;color:#666;">You're receiving this because you haven't been online recently.</p>
-        """),
-    )
+        """))
 
-
-def send_price_drop_alert(observer_email, observer_name, listing_title, listing_id, old_price_cents, new_price_cents):
-    name = observer_name or "there"
-    old_price = f"${old_price_cents / 100:.2f}"
-    new_price = f"${new_price_cents / 100:.2f}"
-    link = f"https://pocket-market.com/listing/{listing_id}"
-    send_email(
-        to=observer_email,
-        subject=f"Price drop! {listing_title} is now {new_price}",
-        reply_to=SUPPORT_EMAIL,
-        body_html=_wrap(f"""
+_PRICE_DROP = Template(_wrap(f"""
             <h2 style="color:{BRAND_COLOR};margin-top:0;">Price Drop Alert</h2>
-            <p>Hi {name},</p>
+            <p>Hi $name,</p>
             <p>An item you're watching just got cheaper!</p>
             <div style="background:#f8f8f8;padding:16px;border-radius:8px;margin:16px 0;text-align:center;">
-                <div style="font-weight:700;font-size:16px;margin-bottom:8px;">{listing_title}</div>
-                <span style="text-decoration:line-through;color:#999;font-size:14px;">{old_price}</span>
-                <span style="font-size:20px;font-weight:800;color:#27ae60;margin-left:8px;">{new_price}</span>
+                <div style="font-weight:700;font-size:16px;margin-bottom:8px;">$listing_title</div>
+                <span style="text-decoration:line-through;color:#999;font-size:14px;">$old_price</span>
+                <span style="font-size:20px;font-weight:800;color:#27ae60;margin-left:8px;">$new_price</span>
             </div>
             <div style="text-align:center;margin:24px 0;">
-                <a href="{link}" style="display:inline-block;background:{BRAND_COLOR};color:#000;font-weight:600;padding:12px 32px;border-radius:8px;text-decoration:none;font-size:15px;">View Listing</a>
+                {_BUTTON.replace("$label", "View Listing")}
             </div>
-        """),
-    )
+        """))
 
-
-def send_stale_listing_nudge(seller_email, seller_name, listing_title, listing_id, days_old):
-    name = seller_name or "there"
-    link = f"https://pocket-market.com/listing/{listing_id}"
-    send_email(
-        to=seller_email,
-        subject=f"Your listing \"{listing_title}\" hasn't had any offers",
-        reply_to=SUPPORT_EMAIL,
-        body_html=_wrap(f"""
+_STALE_NUDGE = Template(_wrap(f"""
             <h2 style="color:{BRAND_COLOR};margin-top:0;">Time for a Price Check?</h2>
-            <p>Hi {name},</p>
-            <p>Your listing <strong>{listing_title}</strong> has been up for <strong>{days_old} days</strong> without any offers.</p>
+            <p>Hi $name,</p>
+            <p>Your listing <strong>$listing_title</strong> has been up for <strong>$days_old days</strong> without any offers.</p>
             <div style="background:#f8f8f8;border-left:3px solid {BRAND_COLOR};padding:12px 16px;margin:20px 0;border-radius:4px;">
                 <p style="margin:0;font-size:14px;"><strong>Quick tips to sell faster:</strong></p>
                 <ul style="margin:8px 0 0;padding-left:20px;font-size:13px;color:#666;line-height:1.8;">
@@ -376,7 +409,62 @@ def send_stale_listing_nudge(seller_email, seller_name, listing_title, listing_i
                 </ul>
             </div>
             <div style="text-align:center;margin:24px 0;">
-                <a href="{link}" style="display:inline-block;background:{BRAND_COLOR};color:#000;font-weight:600;padding:12px 32px;border-radius:8px;text-decoration:none;font-size:15px;">Edit Listing</a>
+                {_BUTTON.replace("$label", "Edit Listing")}
             </div>
-        """),
-    )
+        """))
+
+
+def render_message_notification(recipient_email, recipient_name, sender_name, listing_title, conversation_id):
+    sender = sender_name or "Someone"
+    return {
+        "to": recipient_email,
+        "subject": f"{sender} sent you a message on Pocket Market",
+        "reply_to": SUPPORT_EMAIL,
+        "html": _MESSAGE_NOTIFICATION.substitute(
+            name=recipient_name or "there", sender=sender, listing=listing_title or "a listing",
+            link=f"https://pocket-market.com/chat/{conversation_id}",
+        ),
+    }
+
+
+def render_price_drop_alert(observer_email, observer_name, listing_title, listing_id, old_price_cents, new_price_cents):
+    new_price = f"${new_price_cents / 100:.2f}"
+    return {
+        "to": observer_email,
+        "subject": f"Price drop! {listing_title} is now {new_price}",
+        "reply_to": SUPPORT_EMAIL,
+        "html": _PRICE_DROP.substitute(
+            name=observer_name or "there", listing_title=listing_title,
+            old_price=f"${old_price_cents / 100:.2f}", new_price=new_price,
+            link=f"https://pocket-market.com/listing/{listing_id}",
+        ),
+    }
+
+
+def render_stale_listing_nudge(seller_email, seller_name, listing_title, listing_id, days_old):
+    return {
+        "to": seller_email,
+        "subject": f"Your listing \"{listing_title}\" hasn't had any offers",
+        "reply_to": SUPPORT_EMAIL,
+        "html": _STALE_NUDGE.substitute(
+            name=seller_name or "there", listing_title=listing_title, days_old=days_old,
+            link=f"https://pocket-market.com/listing/{listing_id}",
+        ),
+        "nudge_listing_id": listing_id,  # see _deliver_email_batch
+    }
+
+
+def _send_rendered(email):
+    send_email(email["to"], email["subject"], email["html"], reply_to=email["reply_to"])
+
+
+def send_message_notification(recipient_email, recipient_name, sender_name, listing_title, conversation_id):
+    _send_rendered(render_message_notification(recipient_email, recipient_name, sender_name, listing_title, conversation_id))
+
+
+def send_price_drop_alert(observer_email, observer_name, listing_title, listing_id, old_price_cents, new_price_cents):
+    _send_rendered(render_price_drop_alert(observer_email, observer_name, listing_title, listing_id, old_price_cents, new_price_cents))
+
+
+def send_stale_listing_nudge(seller_email, seller_name, listing_title, listing_id, days_old):
+    _send_rendered(render_stale_listing_nudge(seller_email, seller_name, listing_title, listing_id, days_old))
@@ -0,0 +1,102 @@
+"""Observer fan-out for listing edits.
+
+A price or sold-status edit used to notify every watcher inline: one user
+lookup, notification, email and push per observer, before the seller got
+a response. update_listing now only queues a "listing_change" outbox job
+holding the listing's state before the edit, delayed by
+LISTING_FANOUT_DELAY_SECONDS. Further edits inside that window reuse the
+waiting job, so watchers hear about the net change once ($100 -> $80 ->
+$70 is one "dropped to $70"; a change that is undone sends nothing).
+
+The job compares that state with the listing as it is at delivery time,
+loads observers with their users in one query and bulk-inserts the
+notifications. Price-drop emails and pushes go back on the outbox as
+Resend batch jobs (100 emails per call) and a single push job covering
+every observer's devices.
+"""
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert
+
+from extensions import db
+from models import Listing, Notification, Observing, User
+from outbox_utils import enqueue, register_handler
+from realtime_utils import publish
+
+
+def queue_listing_change(listing, old_price_cents, old_sold, actor_id):
+    """Schedule the observer fan-out for an edit. Call after the edit is committed."""
+    enqueue("listing_change", {
+        "listing_id": listing.id,
+        "old_price_cents": old_price_cents,
+        "old_sold": old_sold,
+        "actor_id": actor_id,
+    }, delay=current_app.config.get("LISTING_FANOUT_DELAY_SECONDS", 120), key=f"listing_change:{listing.id}")
+    db.session.commit()
+
+
+def _change_messages(l, old_price, old_sold):
+    messages = []
+    if l.price_cents != old_price:
+        old_d = old_price / 100
+        new_d = l.price_cents / 100
+        if l.price_cents < old_price:
+            messages.append(f'Price dropped on "{l.title}": ${old_d:.0f} → ${new_d:.0f}')
+        else:
+            messages.append(f'Price changed on "{l.title}": ${old_d:.0f} → ${new_d:.0f}')
+    if l.is_sold != old_sold:
+        if l.is_sold:
+            messages.append(f'"{l.title}" has been marked as sold')
+        else:
+            messages.append(f'"{l.title}" is available again!')
+    return messages
+
+
+def _deliver_listing_change(job):
+    """Outbox handler: notify everyone watching a listing about its net change."""
+    l = db.session.get(Listing, job["listing_id"])
+    if not l:
+        return
+    old_price = job["old_price_cents"]
+    messages = _change_messages(l, old_price, job["old_sold"])
+    if not messages:
+        return
+
+    observers = db.session.query(User.id, User.email, User.display_name).join(
+        Observing, Observing.user_id == User.id,
+    ).filter(Observing.listing_id == l.id, User.id != job["actor_id"]).all()
+    if not observers:
+        return
+
+    now = datetime.utcnow()
+    rows = [
+        {"id": str(uuid.uuid4()), "user_id": uid, "listing_id": l.id, "message": msg, "is_read": False, "created_at": now}
+        for uid, _, _ in observers for msg in messages
+    ]
+    db.session.execute(insert(Notification), rows)
+
+    if l.price_cents < old_price:
+        from email_utils import render_price_drop_alert, send_email_batch
+        from push_utils import send_push_to_users
+        new_d = l.price_cents / 100
+        send_email_batch(
+            render_price_drop_alert(email, name, l.title, l.id, old_price, l.price_cents)
+            for _, email, name in observers
+        )
+        send_push_to_users(
+            [uid for uid, _, _ in observers], "Price Drop!", f"{l.title} dropped to ${new_d:.2f}",
+            url=f"/listing/{l.id}", tag=f"price_drop_{l.id}",
+        )
+    db.session.commit()
+
+    # Bulk inserts skip the ORM flush hooks, so stream them here
+    for r in rows:
+        publish(r["user_id"], "notification", {
+            "id": r["id"], "listing_id": r["listing_id"], "message": r["message"],
+            "is_read": False, "created_at": now.isoformat(),
+        })
+
+
+register_handler("listing_change", _deliver_listing_change)
@@ -0,0 +1,136 @@
+"""Geohash indexing and haversine distance for radius search.
+
+Each listing stores the geohash of its lat/lng in an indexed column. A
+radius query first narrows to the handful of geohash cells covering the
+circle (B-tree range scans), then applies the exact haversine distance
+in SQL so corners of the bounding box are dropped.
+"""
+import math
+import sqlite3
+
+from sqlalchemy import Float, event, func, or_
+from sqlalchemy.engine import Engine
+
+from models import Listing
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m cells
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Approximate cell height / width (km, at the equator) per geohash length
+_CELL_KM = {
+    1: (4992.6, 5009.4),
+    2: (624.1, 1252.3),
+    3: (156.0, 156.5),
+    4: (19.5, 39.1),
+    5: (4.89, 4.89),
+    6: (0.61, 1.22),
+    7: (0.153, 0.153),
+}
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_lo = mid
+            else:
+                bits <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def covering_prefixes(lat, lng, radius_km):
+    """Geohash prefixes whose cells together cover the circle, or None if too wide."""
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    precision = None
+    for p in sorted(_CELL_KM, reverse=True):
+        height, width = _CELL_KM[p]
+        if height >= radius_km and width * cos_lat >= radius_km:
+            precision = p
+            break
+    if precision is None:
+        return None
+
+    # Cells are at least radius wide, so sampling the bounding box at its
+    # edges and centre touches every cell it overlaps (at most 3x3).
+    lat_delta = radius_km / 111.0
+    lng_delta = radius_km / (111.0 * cos_lat)
+    prefixes = set()
+    for dlat in (-lat_delta, 0, lat_delta):
+        for dlng in (-lng_delta, 0, lng_delta):
+            plat = min(max(lat + dlat, -90.0), 90.0)
+            plng = (lng + dlng + 180.0) % 360.0 - 180.0
+            prefixes.add(geohash_encode(plat, plng, precision))
+    return sorted(prefixes)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def distance_km_expr(lat, lng):
+    """SQL haversine distance (km) from (lat, lng) to each listing."""
+    dlat = func.radians(Listing.lat - lat)
+    dlng = func.radians(Listing.lng - lng)
+    a = (func.power(func.sin(dlat / 2), 2)
+         + math.cos(math.radians(lat)) * func.cos(func.radians(Listing.lat))
+         * func.power(func.sin(dlng / 2), 2))
+    # Clamp as haversine_km does: rounding can push a just past 1 for
+    # near-antipodal points, and PostgreSQL's asin() rejects that
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(func.least(1.0, a)), type_=Float)
+
+
+def apply_radius_filter(query, lat, lng, radius_km):
+    """Limit a Listing query to listings within radius_km of (lat, lng).
+
+    Returns (query, distance_expr).
+    """
+    query = query.filter(Listing.lat.isnot(None), Listing.lng.isnot(None))
+    prefixes = covering_prefixes(lat, lng, radius_km)
+    if prefixes:
+        query = query.filter(or_(*[
+            Listing.geohash.between(p, p + "z" * (GEOHASH_PRECISION - len(p)))
+            for p in prefixes
+        ]))
+    distance = distance_km_expr(lat, lng)
+    return query.filter(distance <= radius_km), distance
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_math_functions(dbapi_conn, connection_record):
+    """SQLite builds often lack trig functions; register them for the dev backend."""
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    for name, fn in (("sin", math.sin), ("cos", math.cos), ("asin", math.asin),
+                     ("sqrt", math.sqrt), ("radians", math.radians)):
+        dbapi_conn.create_function(name, 1, lambda x, fn=fn: None if x is None else fn(x), deterministic=True)
+    dbapi_conn.create_function("power", 2, lambda x, y: None if x is None else math.pow(x, y), deterministic=True)
+    # PostgreSQL's least(); SQLite's own spelling is the two-argument min()
+    dbapi_conn.create_function("least", 2, lambda x, y: None if x is None or y is None else min(x, y), deterministic=True)
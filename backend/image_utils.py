@@ -1,25 +1,334 @@
+import io
+import multiprocessing
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Response, current_app, request, send_file
 from PIL import Image, ImageOps
 
+from blob_store import get_blob_store
+from extensions import db
+from models import ListingImage, ListingImageVariant
+
+ONE_YEAR = 31536000
+
+# Longest-side sizes generated for every listing photo (card, detail, full)
+VARIANT_WIDTHS = (160, 480, 1200)
+
+# (mime, Pillow format, save options), best compression first. AVIF needs
+# Pillow >= 11.2 or pillow-avif-plugin, so it is only offered when present.
+VARIANT_FORMATS = [
+    ("image/webp", "WEBP", {"quality": 80, "method": 4}),
+    ("image/jpeg", "JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+]
+if ".avif" in Image.registered_extensions():
+    VARIANT_FORMATS.insert(0, ("image/avif", "AVIF", {"quality": 60}))
+
+
+def _resize(img, max_size):
+    if max(img.size) > max_size:
+        ratio = max_size / max(img.size)
+        new_size = (max(1, int(img.size[0] * ratio)), max(1, int(img.size[1] * ratio)))
+        # reducing_gap box-downsamples first, then LANCZOS: near-identical, much faster
+        img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return img
+
+
+def _flatten(img):
+    """Drop alpha onto a white background so the image can be saved as JPEG."""
+    if img.mode in ("RGBA", "P", "LA"):
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        bg = Image.new("RGB", img.size, (255, 255, 255))
+        bg.paste(img, mask=img.split()[-1])
+        return bg
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    return img
+
 
 def compress_image(file_path, max_size=1200, quality=85):
     """Resize and compress an image in-place."""
     try:
         img = Image.open(file_path)
         img = ImageOps.exif_transpose(img)
-
-        if max(img.size) > max_size:
-            ratio = max_size / max(img.size)
-            new_size = (int(img.size[0] * ratio), int(img.size[1] * ratio))
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
-
-        if img.mode in ("RGBA", "P", "LA"):
-            bg = Image.new("RGB", img.size, (255, 255, 255))
-            if img.mode in ("RGBA", "LA"):
-                bg.paste(img, mask=img.split()[-1])
-            else:
-                bg.paste(img)
-            img = bg
-
+        img = _flatten(_resize(img, max_size))
         img.save(file_path, "JPEG", quality=quality, optimize=True)
     except Exception as e:
         print(f"Image compression failed: {e}")
+
+
+def build_variants(data, widths=VARIANT_WIDTHS):
+    """Decode an upload once and encode it at each width in every format.
+
+    Widths larger than the source are collapsed into the source size, so a
+    small photo is never upscaled. Returns a list of (width, height, mime,
+    bytes) with width/height in pixels. Raises on undecodable input.
+    """
+    img = Image.open(io.BytesIO(data))
+    # JPEGs can be decoded straight at 1/2, 1/4 or 1/8 scale when that is
+    # still at least the largest size we need
+    largest = max(widths)
+    img.draft("RGB", (largest, largest))
+    img = _flatten(ImageOps.exif_transpose(img))
+
+    variants = []
+    seen = set()
+    # Downscale from the largest size down, reusing each step as the next source
+    for width in sorted(widths, reverse=True):
+        img = _resize(img, width)
+        if img.size in seen:
+            continue
+        seen.add(img.size)
+        for mime, fmt, opts in VARIANT_FORMATS:
+            buf = io.BytesIO()
+            img.save(buf, fmt, **opts)
+            variants.append((img.size[0], img.size[1], mime, buf.getvalue()))
+    return variants
+
+
+def build_preview(data, max_size=max(VARIANT_WIDTHS)):
+    """Re-encode an upload as a JPEG with no EXIF, for serving until its variants exist.
+
+    The raw upload can carry GPS and camera metadata, so it is never stored
+    as-is. Raises on undecodable input.
+    """
+    img = Image.open(io.BytesIO(data))
+    img.draft("RGB", (max_size, max_size))
+    img = _flatten(_resize(ImageOps.exif_transpose(img), max_size))
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+
+def image_blob_keys(image_ids):
+    """Blob keys of these images and their variants. Collect before deleting the rows."""
+    keys = {k for k, in db.session.query(ListingImage.blob_key).filter(ListingImage.id.in_(image_ids))}
+    keys.update(k for k, in db.session.query(ListingImageVariant.blob_key).filter(ListingImageVariant.image_id.in_(image_ids)))
+    return keys
+
+
+def listing_blob_keys(listing_ids):
+    """Blob keys of every image of these listings. Collect before deleting the rows."""
+    return image_blob_keys(db.session.query(ListingImage.id).filter(ListingImage.listing_id.in_(listing_ids)))
+
+
+def release_blobs(keys, min_age=None):
+    """Delete the blobs that no image or variant points at any more. Returns how many.
+
+    Blob keys are content hashes, so identical uploads share one blob, and
+    an upload of the same bytes may have put() it without committing its
+    row yet. put() refreshes the blob's modified time, so blobs stored in
+    the last min_age seconds (BLOB_RELEASE_MIN_AGE_SECONDS by default) are
+    kept and left to gc_blobs(). Call after the commit that dropped the
+    references.
+    """
+    if min_age is None:
+        min_age = current_app.config.get("BLOB_RELEASE_MIN_AGE_SECONDS", 900)
+    store = get_blob_store()
+    cutoff = time.time() - min_age
+    released = 0
+    for key in set(keys) - {None}:
+        in_use = db.session.query(ListingImage.id).filter_by(blob_key=key).first() or \
+            db.session.query(ListingImageVariant.id).filter_by(blob_key=key).first()
+        if in_use:
+            continue
+        modified = store.modified(key)
+        if modified is not None and modified < cutoff:
+            store.delete(key)
+            released += 1
+    return released
+
+
+def gc_blobs(min_age, dry_run=False):
+    """Delete every blob older than min_age seconds that nothing references. Returns how many."""
+    referenced = {k for k, in db.session.query(ListingImage.blob_key).filter(ListingImage.blob_key.isnot(None))}
+    referenced.update(k for k, in db.session.query(ListingImageVariant.blob_key))
+    cutoff = time.time() - min_age
+    unreferenced = [key for key, modified in get_blob_store().keys() if modified < cutoff and key not in referenced]
+    if dry_run:
+        return len(unreferenced)
+    # release_blobs checks the tables and the age again, right before each delete
+    return release_blobs(unreferenced, min_age)
+
+
+def store_variants(image_id, variants):
+    """Put variant bytes in the blob store and record them for image_id."""
+    store = get_blob_store()
+    for width, height, mime, data in variants:
+        db.session.add(ListingImageVariant(
+            image_id=image_id, width=width, height=height, mime=mime,
+            blob_key=store.put(data, mime), byte_size=len(data),
+        ))
+
+
+def finish_image(img, variants):
+    """Store variants for a ListingImage and point it at the full-size JPEG."""
+    store_variants(img.id, variants)
+    full = max((v for v in variants if v[2] == "image/jpeg"), key=lambda v: v[0])
+    img.blob_key = get_blob_store().put(full[3], "image/jpeg")
+    img.byte_size = len(full[3])
+    img.image_mime = "image/jpeg"
+    img.image_data = None
+    img.status = "ready"
+
+
+# ── Worker pool ──────────────────────────────────────────────────
+# Decoding and encoding are CPU-bound and hold the GIL, so they run in a
+# process pool (spawned, not forked, so children never inherit the
+# app's threads, locks or DB connections).
+
+_pool = None
+_finisher = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(app):
+    global _pool
+    workers = app.config.get("IMAGE_WORKERS", 2)
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _try_build(data):
+    try:
+        return build_variants(data)
+    except Exception:
+        return None
+
+
+def process_images(blobs):
+    """Build variants for several uploads in parallel.
+
+    Returns one variant list per input, or None where the input could not
+    be decoded. Falls back to in-process work if the pool is disabled or dies.
+    """
+    app = current_app._get_current_object()
+    pool = _get_pool(app)
+    if pool is not None and len(blobs) > 1:
+        try:
+            return list(pool.map(_try_build, blobs))
+        except BrokenProcessPool:
+            app.logger.error("Image worker pool died, processing in-request")
+            _reset_pool()
+    return [_try_build(b) for b in blobs]
+
+
+def _finish_later(app, image_id, data):
+    with app.app_context():
+        try:
+            pool = _get_pool(app)
+            try:
+                variants = pool.submit(_try_build, data).result() if pool else _try_build(data)
+            except BrokenProcessPool:
+                _reset_pool()
+                variants = _try_build(data)
+            img = db.session.get(ListingImage, image_id)
+            if img is None:
+                return  # deleted while processing
+            if variants is None:
+                img.status = "failed"
+                db.session.commit()
+                return
+            preview_key = img.blob_key
+            finish_image(img, variants)
+            db.session.commit()
+            if preview_key != img.blob_key:
+                release_blobs([preview_key])
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Background image processing failed for {image_id}: {e}")
+        finally:
+            db.session.remove()
+
+
+def process_images_later(items):
+    """Queue (image_id, data) pairs for background processing. Call after commit."""
+    global _finisher
+    app = current_app._get_current_object()
+    with _pool_lock:
+        if _finisher is None:
+            _finisher = ThreadPoolExecutor(
+                max_workers=max(1, app.config.get("IMAGE_WORKERS", 2)), thread_name_prefix="image-finisher",
+            )
+    for image_id, data in items:
+        _finisher.submit(_finish_later, app, image_id, data)
+
+
+def variant_srcsets(image_ids):
+    """Map image id -> {pixel width: url} for images that have variants."""
+    srcsets = defaultdict(dict)
+    if not image_ids:
+        return srcsets
+    rows = db.session.query(ListingImageVariant.image_id, ListingImageVariant.width).filter(
+        ListingImageVariant.image_id.in_(list(image_ids))
+    ).distinct()
+    for image_id, width in rows:
+        srcsets[image_id][width] = f"/api/listings/image/{image_id}?w={width}"
+    return srcsets
+
+
+def pick_variant(variants, width=None):
+    """Choose the best (width, mime, blob_key) for this request.
+
+    Format comes from the Accept header (only formats the client names
+    explicitly, so */* gets JPEG); width is the smallest variant at least
+    as wide as requested, else the largest.
+    """
+    accepted = {v for v in request.accept_mimetypes.values()}
+    by_mime = defaultdict(list)
+    for v in variants:
+        by_mime[v.mime].append(v)
+    choices = None
+    for mime, _, _ in VARIANT_FORMATS:
+        if by_mime.get(mime) and (mime == "image/jpeg" or mime in accepted):
+            choices = by_mime[mime]
+            break
+    if choices is None:
+        choices = next(iter(by_mime.values()))
+    choices.sort(key=lambda v: v.width)
+    if width:
+        for v in choices:
+            if v.width >= width:
+                return v
+    return choices[-1]
+
+
+def not_modified(etag, max_age, immutable=False):
+    """Return a 304 if the client already has etag, else None. Checked before loading any bytes."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = max_age
+    if immutable:
+        resp.cache_control.immutable = True
+    return resp
+
+
+def send_image(source, mimetype, etag, max_age, immutable=False, last_modified=None):
+    """Send image bytes or a file path with ETag, Last-Modified, 304 and Range support."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(bytes(source))
+    resp = send_file(
+        source, mimetype=mimetype, etag=etag, last_modified=last_modified,
+        max_age=max_age, conditional=True,
+    )
+    resp.cache_control.public = True
+    if immutable:
+        resp.cache_control.immutable = True
+    return resp
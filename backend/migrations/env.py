@@ -51,6 +51,26 @@ def get_metadata():
     return target_db.metadata
 
 
+# Created with raw SQL in migrations and not described by the models (search
+# index, partial and covering indexes). Keeps autogenerate from dropping them.
+RAW_SQL_INDEXES = {
+    "ix_boost_impressions_boost_viewer_shown", "uq_one_active_boost_per_listing",
+    "ix_listings_search_vector", "ix_listings_title_trgm",
+}
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    if not reflected or compare_to is not None:
+        return True
+    if type_ == "table" and name.startswith("listings_fts"):
+        return False
+    if type_ == "index" and name in RAW_SQL_INDEXES:
+        return False
+    if type_ == "column" and name == "search_vector":
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +85,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -93,6 +114,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,693 @@
+"""Schema that create_app() used to patch in on every boot
+
+Databases built by db.create_all() plus the boot-time ALTERs already
+have most of this, so every step checks first and the revision is safe to
+run on those as well as on an empty database. `flask maintenance run`
+stamps a database without an alembic_version table at db077b74c8ed (a
+one-off conversion of the old integer-id schema) before upgrading.
+
+Revision ID: 517520e7b3da
+Revises: db077b74c8ed
+Create Date: 2026-10-17 20:09:11.173507
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '517520e7b3da'
+down_revision = 'db077b74c8ed'
+branch_labels = None
+depends_on = None
+
+# Columns added to existing tables over time: (table, column, DDL type)
+ADDED_COLUMNS = [
+    ("users", "avatar_data", "BYTEA"),
+    ("users", "avatar_mime", "VARCHAR(32)"),
+    ("users", "rating_avg", "NUMERIC DEFAULT 0"),
+    ("users", "rating_count", "INTEGER DEFAULT 0"),
+    ("users", "is_pro", "BOOLEAN DEFAULT FALSE"),
+    ("listings", "buyer_id", "VARCHAR(36) REFERENCES users(id)"),
+    ("users", "is_verified", "BOOLEAN DEFAULT FALSE"),
+    ("users", "onboarding_done", "BOOLEAN DEFAULT FALSE"),
+    ("listings", "renewed_at", "TIMESTAMP WITH TIME ZONE"),
+    ("listings", "bundle_discount_pct", "INTEGER"),
+    ("listings", "is_draft", "BOOLEAN DEFAULT FALSE"),
+    ("messages", "image_url", "TEXT"),
+    ("users", "last_seen", "TIMESTAMP WITH TIME ZONE"),
+    ("listings", "nudged_at", "TIMESTAMP WITH TIME ZONE"),
+    ("users", "pro_free_boost_last_used_day", "VARCHAR(10)"),
+    ("boosts", "boost_type", "VARCHAR(16) DEFAULT 'paid'"),
+    ("boosts", "duration_hours", "INTEGER DEFAULT 24"),
+    ("listing_images", "image_data", "BYTEA"),
+    ("listing_images", "image_mime", "VARCHAR(32)"),
+    ("reports", "listing_id", "VARCHAR(36) REFERENCES listings(id)"),
+    ("users", "is_test_account", "BOOLEAN DEFAULT FALSE"),
+    ("users", "is_admin", "BOOLEAN DEFAULT FALSE"),
+    ("users", "is_banned", "BOOLEAN DEFAULT FALSE"),
+    ("reports", "admin_notes", "TEXT"),
+    ("reports", "resolved_by", "VARCHAR(36)"),
+    ("reports", "resolved_at", "TIMESTAMP WITH TIME ZONE"),
+    ("users", "avatar_hash", "VARCHAR(64)"),
+    ("listing_images", "blob_key", "VARCHAR(64)"),
+    ("listing_images", "byte_size", "INTEGER"),
+    ("listing_images", "status", "VARCHAR(16) DEFAULT 'ready'"),
+    ("boost_impression_hours", "unique_viewers", "INTEGER"),
+    ("conversations", "last_message_id", "VARCHAR(36)"),
+    ("conversations", "buyer_unread_count", "INTEGER DEFAULT 0"),
+    ("conversations", "seller_unread_count", "INTEGER DEFAULT 0"),
+    ("conversations", "buyer_last_read_at", "TIMESTAMP WITH TIME ZONE"),
+    ("conversations", "seller_last_read_at", "TIMESTAMP WITH TIME ZONE"),
+    ("outbox_jobs", "coalesce_key", "VARCHAR(64)"),
+]
+
+# Columns that need a one-time backfill when they are added to existing rows
+BACKFILLED_COLUMNS = {
+    ("listings", "view_count", "INTEGER DEFAULT 0"): (
+        "UPDATE listings SET view_count = "
+        "(SELECT COUNT(*) FROM listing_views WHERE listing_views.listing_id = listings.id)"
+    ),
+    ("listings", "observing_count", "INTEGER DEFAULT 0"): (
+        "UPDATE listings SET observing_count = "
+        "(SELECT COUNT(*) FROM observing WHERE observing.listing_id = listings.id)"
+    ),
+    ("conversations", "last_message_at", "TIMESTAMP WITH TIME ZONE"): (
+        "UPDATE conversations SET "
+        "last_message_at = COALESCE((SELECT MAX(created_at) FROM messages "
+        "WHERE messages.conversation_id = conversations.id), created_at), "
+        "last_message_id = (SELECT id FROM messages WHERE messages.conversation_id = conversations.id "
+        "ORDER BY created_at DESC LIMIT 1)"
+    ),
+}
+
+# Indexes the boot code created with raw SQL on tables that already existed
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_listings_geohash ON listings (geohash)",
+    "CREATE INDEX IF NOT EXISTS ix_listing_images_blob_key ON listing_images (blob_key)",
+    "CREATE INDEX IF NOT EXISTS ix_messages_conversation_created ON messages (conversation_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_conversations_buyer_activity ON conversations (buyer_id, last_message_at)",
+    "CREATE INDEX IF NOT EXISTS ix_conversations_seller_activity ON conversations (seller_id, last_message_at)",
+    "CREATE INDEX IF NOT EXISTS ix_outbox_jobs_coalesce_key ON outbox_jobs (coalesce_key)",
+    # Dedup lookup for the buffered boost_viewers flush
+    "CREATE INDEX IF NOT EXISTS ix_boost_impressions_boost_viewer_shown "
+    "ON boost_impressions (boost_id, viewer_user_id, shown_at)",
+    # Only one active boost per listing
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_one_active_boost_per_listing ON boosts (listing_id) WHERE status = 'active'",
+]
+
+
+def _add_col(table, col, col_type):
+    if col in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}:
+        return False
+    op.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}")
+    return True
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'ads' not in tables:
+        op.create_table('ads',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=False),
+        sa.Column('image_url', sa.Text(), nullable=True),
+        sa.Column('link_url', sa.Text(), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'outbox_jobs' not in tables:
+        op.create_table('outbox_jobs',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('coalesce_key', sa.String(length=64), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('outbox_jobs', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_outbox_jobs_coalesce_key'), ['coalesce_key'], unique=False)
+            batch_op.create_index('ix_outbox_jobs_status_next', ['status', 'next_attempt_at'], unique=False)
+
+    if 'users' not in tables:
+        op.create_table('users',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('password_hash', sa.Text(), nullable=True),
+        sa.Column('display_name', sa.String(length=120), nullable=True),
+        sa.Column('google_sub', sa.String(length=255), nullable=True),
+        sa.Column('avatar_url', sa.Text(), nullable=True),
+        sa.Column('avatar_data', sa.LargeBinary(), nullable=True),
+        sa.Column('avatar_mime', sa.String(length=32), nullable=True),
+        sa.Column('avatar_hash', sa.String(length=64), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('rating_avg', sa.Numeric(), nullable=True),
+        sa.Column('rating_count', sa.Integer(), nullable=True),
+        sa.Column('is_pro', sa.Boolean(), nullable=True),
+        sa.Column('is_verified', sa.Boolean(), nullable=True),
+        sa.Column('onboarding_done', sa.Boolean(), nullable=True),
+        sa.Column('is_test_account', sa.Boolean(), nullable=True),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.Column('is_banned', sa.Boolean(), nullable=True),
+        sa.Column('last_seen', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('pro_free_boost_last_used_day', sa.String(length=10), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_users_email'), ['email'], unique=True)
+            batch_op.create_index(batch_op.f('ix_users_google_sub'), ['google_sub'], unique=True)
+
+    if 'blocked_users' not in tables:
+        op.create_table('blocked_users',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('blocker_id', sa.String(length=36), nullable=False),
+        sa.Column('blocked_id', sa.String(length=36), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['blocked_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['blocker_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('blocker_id', 'blocked_id', name='uq_block_pair')
+        )
+        with op.batch_alter_table('blocked_users', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_blocked_users_blocked_id'), ['blocked_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_blocked_users_blocker_id'), ['blocker_id'], unique=False)
+
+    if 'listings' not in tables:
+        op.create_table('listings',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('title', sa.Text(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price_cents', sa.Integer(), nullable=False),
+        sa.Column('category', sa.String(length=64), nullable=False),
+        sa.Column('condition', sa.String(length=32), nullable=False),
+        sa.Column('city', sa.String(length=64), nullable=True),
+        sa.Column('zip', sa.String(length=16), nullable=True),
+        sa.Column('lat', sa.Float(), nullable=True),
+        sa.Column('lng', sa.Float(), nullable=True),
+        sa.Column('geohash', sa.String(length=12), nullable=True),
+        sa.Column('pickup_or_shipping', sa.String(length=16), nullable=False),
+        sa.Column('is_sold', sa.Boolean(), nullable=True),
+        sa.Column('is_draft', sa.Boolean(), nullable=True),
+        sa.Column('buyer_id', sa.String(length=36), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('renewed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('nudged_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('bundle_discount_pct', sa.Integer(), nullable=True),
+        sa.Column('view_count', sa.Integer(), nullable=True),
+        sa.Column('observing_count', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['buyer_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('listings', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_listings_buyer_id'), ['buyer_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_listings_geohash'), ['geohash'], unique=False)
+            batch_op.create_index(batch_op.f('ix_listings_user_id'), ['user_id'], unique=False)
+
+    if 'push_subscriptions' not in tables:
+        op.create_table('push_subscriptions',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('endpoint', sa.Text(), nullable=False),
+        sa.Column('p256dh', sa.Text(), nullable=False),
+        sa.Column('auth', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('endpoint')
+        )
+        with op.batch_alter_table('push_subscriptions', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_push_subscriptions_user_id'), ['user_id'], unique=False)
+
+    if 'saved_searches' not in tables:
+        op.create_table('saved_searches',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('query', sa.String(length=255), nullable=False),
+        sa.Column('category', sa.String(length=64), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('saved_searches', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_saved_searches_user_id'), ['user_id'], unique=False)
+
+    if 'subscriptions' not in tables:
+        op.create_table('subscriptions',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('stripe_customer_id', sa.String(length=255), nullable=True),
+        sa.Column('stripe_subscription_id', sa.String(length=255), nullable=True),
+        sa.Column('status', sa.String(length=32), nullable=False),
+        sa.Column('current_period_end', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('subscriptions', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_subscriptions_user_id'), ['user_id'], unique=False)
+
+    if 'boosts' not in tables:
+        op.create_table('boosts',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('starts_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('ends_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('status', sa.String(length=32), nullable=False),
+        sa.Column('duration_hours', sa.Integer(), nullable=False),
+        sa.Column('paid_cents', sa.Integer(), nullable=False),
+        sa.Column('boost_type', sa.String(length=16), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('boosts', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_boosts_listing_id'), ['listing_id'], unique=False)
+
+    if 'conversations' not in tables:
+        op.create_table('conversations',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('buyer_id', sa.String(length=36), nullable=False),
+        sa.Column('seller_id', sa.String(length=36), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_message_id', sa.String(length=36), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('buyer_unread_count', sa.Integer(), nullable=False),
+        sa.Column('seller_unread_count', sa.Integer(), nullable=False),
+        sa.Column('buyer_last_read_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('seller_last_read_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['buyer_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.ForeignKeyConstraint(['seller_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('listing_id', 'buyer_id', 'seller_id', name='uq_conv_triplet')
+        )
+        with op.batch_alter_table('conversations', schema=None) as batch_op:
+            batch_op.create_index('ix_conversations_buyer_activity', ['buyer_id', 'last_message_at'], unique=False)
+            batch_op.create_index(batch_op.f('ix_conversations_buyer_id'), ['buyer_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_conversations_listing_id'), ['listing_id'], unique=False)
+            batch_op.create_index('ix_conversations_seller_activity', ['seller_id', 'last_message_at'], unique=False)
+            batch_op.create_index(batch_op.f('ix_conversations_seller_id'), ['seller_id'], unique=False)
+
+    if 'listing_images' not in tables:
+        op.create_table('listing_images',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('image_url', sa.Text(), nullable=False),
+        sa.Column('image_data', sa.LargeBinary(), nullable=True),
+        sa.Column('image_mime', sa.String(length=32), nullable=True),
+        sa.Column('blob_key', sa.String(length=64), nullable=True),
+        sa.Column('byte_size', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('listing_images', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_listing_images_blob_key'), ['blob_key'], unique=False)
+            batch_op.create_index(batch_op.f('ix_listing_images_listing_id'), ['listing_id'], unique=False)
+
+    if 'listing_view_hours' not in tables:
+        op.create_table('listing_view_hours',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('hour', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('views', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('listing_id', 'hour', name='uq_listing_view_hour')
+        )
+        with op.batch_alter_table('listing_view_hours', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_listing_view_hours_listing_id'), ['listing_id'], unique=False)
+
+    if 'listing_views' not in tables:
+        op.create_table('listing_views',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('viewer_id', sa.String(length=36), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.ForeignKeyConstraint(['viewer_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('listing_views', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_listing_views_listing_id'), ['listing_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_listing_views_viewer_id'), ['viewer_id'], unique=False)
+
+    if 'meetup_confirmations' not in tables:
+        op.create_table('meetup_confirmations',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('token', sa.String(length=64), nullable=False),
+        sa.Column('buyer_confirmed', sa.Boolean(), nullable=True),
+        sa.Column('seller_confirmed', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('token')
+        )
+        with op.batch_alter_table('meetup_confirmations', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_meetup_confirmations_listing_id'), ['listing_id'], unique=False)
+
+    if 'notifications' not in tables:
+        op.create_table('notifications',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=True),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('is_read', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('notifications', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_notifications_listing_id'), ['listing_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_notifications_user_id'), ['user_id'], unique=False)
+
+    if 'observing' not in tables:
+        op.create_table('observing',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'listing_id', name='uq_observing_user_listing')
+        )
+        with op.batch_alter_table('observing', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_observing_listing_id'), ['listing_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_observing_user_id'), ['user_id'], unique=False)
+
+    if 'offers' not in tables:
+        op.create_table('offers',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('buyer_id', sa.String(length=36), nullable=False),
+        sa.Column('seller_id', sa.String(length=36), nullable=False),
+        sa.Column('amount_cents', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=32), nullable=False),
+        sa.Column('counter_cents', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['buyer_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.ForeignKeyConstraint(['seller_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('offers', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_offers_buyer_id'), ['buyer_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_offers_listing_id'), ['listing_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_offers_seller_id'), ['seller_id'], unique=False)
+
+    if 'price_history' not in tables:
+        op.create_table('price_history',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('old_cents', sa.Integer(), nullable=False),
+        sa.Column('new_cents', sa.Integer(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('price_history', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_price_history_listing_id'), ['listing_id'], unique=False)
+
+    if 'reports' not in tables:
+        op.create_table('reports',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('reporter_id', sa.String(length=36), nullable=False),
+        sa.Column('reported_user_id', sa.String(length=36), nullable=True),
+        sa.Column('listing_id', sa.String(length=36), nullable=True),
+        sa.Column('reason', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=32), nullable=True),
+        sa.Column('admin_notes', sa.Text(), nullable=True),
+        sa.Column('resolved_by', sa.String(length=36), nullable=True),
+        sa.Column('resolved_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.ForeignKeyConstraint(['reported_user_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['reporter_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['resolved_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('reports', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_reports_listing_id'), ['listing_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_reports_reported_user_id'), ['reported_user_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_reports_reporter_id'), ['reporter_id'], unique=False)
+
+    if 'reviews' not in tables:
+        op.create_table('reviews',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('reviewer_id', sa.String(length=36), nullable=False),
+        sa.Column('seller_id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('is_positive', sa.Boolean(), nullable=False),
+        sa.Column('comment', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.ForeignKeyConstraint(['reviewer_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['seller_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('reviewer_id', 'listing_id', name='uq_review_per_listing')
+        )
+        with op.batch_alter_table('reviews', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_reviews_listing_id'), ['listing_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_reviews_reviewer_id'), ['reviewer_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_reviews_seller_id'), ['seller_id'], unique=False)
+
+    if 'safe_meet_locations' not in tables:
+        op.create_table('safe_meet_locations',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=False),
+        sa.Column('place_name', sa.String(length=255), nullable=False),
+        sa.Column('address', sa.String(length=255), nullable=False),
+        sa.Column('lat', sa.Numeric(), nullable=False),
+        sa.Column('lng', sa.Numeric(), nullable=False),
+        sa.Column('place_type', sa.String(length=64), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('safe_meet_locations', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_safe_meet_locations_listing_id'), ['listing_id'], unique=False)
+
+    if 'safety_ack_events' not in tables:
+        op.create_table('safety_ack_events',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('listing_id', sa.String(length=36), nullable=True),
+        sa.Column('event_type', sa.String(length=64), nullable=False),
+        sa.Column('ack_text', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('safety_ack_events', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_safety_ack_events_listing_id'), ['listing_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_safety_ack_events_user_id'), ['user_id'], unique=False)
+
+    if 'boost_impression_days' not in tables:
+        op.create_table('boost_impression_days',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('boost_id', sa.String(length=36), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('impressions', sa.Integer(), nullable=False),
+        sa.Column('unique_viewers', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['boost_id'], ['boosts.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('boost_id', 'day', name='uq_boost_impression_day')
+        )
+        with op.batch_alter_table('boost_impression_days', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_boost_impression_days_boost_id'), ['boost_id'], unique=False)
+
+    if 'boost_impression_hours' not in tables:
+        op.create_table('boost_impression_hours',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('boost_id', sa.String(length=36), nullable=False),
+        sa.Column('hour', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('impressions', sa.Integer(), nullable=False),
+        sa.Column('unique_viewers', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['boost_id'], ['boosts.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('boost_id', 'hour', name='uq_boost_impression_hour')
+        )
+        with op.batch_alter_table('boost_impression_hours', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_boost_impression_hours_boost_id'), ['boost_id'], unique=False)
+
+    if 'boost_impressions' not in tables:
+        op.create_table('boost_impressions',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('boost_id', sa.String(length=36), nullable=False),
+        sa.Column('viewer_user_id', sa.String(length=36), nullable=True),
+        sa.Column('shown_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['boost_id'], ['boosts.id'], ),
+        sa.ForeignKeyConstraint(['viewer_user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('boost_impressions', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_boost_impressions_boost_id'), ['boost_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_boost_impressions_viewer_user_id'), ['viewer_user_id'], unique=False)
+
+    if 'boost_stats' not in tables:
+        op.create_table('boost_stats',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('boost_id', sa.String(length=36), nullable=False),
+        sa.Column('impressions', sa.Integer(), nullable=False),
+        sa.Column('unique_viewers', sa.Integer(), nullable=False),
+        sa.Column('listing_views', sa.Integer(), nullable=False),
+        sa.Column('offers', sa.Integer(), nullable=False),
+        sa.Column('finalized', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['boost_id'], ['boosts.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('boost_id')
+        )
+
+    if 'listing_image_variants' not in tables:
+        op.create_table('listing_image_variants',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('image_id', sa.String(length=36), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=False),
+        sa.Column('height', sa.Integer(), nullable=False),
+        sa.Column('mime', sa.String(length=32), nullable=False),
+        sa.Column('blob_key', sa.String(length=64), nullable=False),
+        sa.Column('byte_size', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['image_id'], ['listing_images.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('image_id', 'width', 'mime', name='uq_listing_image_variant')
+        )
+        with op.batch_alter_table('listing_image_variants', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_listing_image_variants_image_id'), ['image_id'], unique=False)
+
+    if 'messages' not in tables:
+        op.create_table('messages',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('conversation_id', sa.String(length=36), nullable=False),
+        sa.Column('sender_id', sa.String(length=36), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('image_url', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ),
+        sa.ForeignKeyConstraint(['sender_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('messages', schema=None) as batch_op:
+            batch_op.create_index('ix_messages_conversation_created', ['conversation_id', 'created_at'], unique=False)
+            batch_op.create_index(batch_op.f('ix_messages_conversation_id'), ['conversation_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_messages_sender_id'), ['sender_id'], unique=False)
+
+    for table, col, col_type in ADDED_COLUMNS:
+        _add_col(table, col, col_type)
+    for (table, col, col_type), backfill in BACKFILLED_COLUMNS.items():
+        if _add_col(table, col, col_type):
+            op.execute(backfill)
+    _backfill_geohash()
+
+    listing_cols = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("listings")}
+    if "is_demo" in listing_cols:
+        with op.batch_alter_table("listings") as batch_op:
+            batch_op.drop_column("is_demo")
+
+    _fix_report_id_types()
+
+    for ddl in INDEXES:
+        op.execute(ddl)
+
+    _search_index()
+
+
+def _backfill_geohash():
+    from geo_utils import geohash_encode
+    if not _add_col("listings", "geohash", "VARCHAR(12)"):
+        return
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, lat, lng FROM listings WHERE lat IS NOT NULL AND lng IS NOT NULL"
+    )).fetchall()
+    if rows:
+        bind.execute(
+            sa.text("UPDATE listings SET geohash=:gh WHERE id=:id"),
+            [{"id": lid, "gh": geohash_encode(lat, lng)} for lid, lat, lng in rows],
+        )
+
+
+def _fix_report_id_types():
+    """Some early databases created reports ids as INTEGER instead of VARCHAR(36)."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    report_cols = {c["name"]: c for c in sa.inspect(op.get_bind()).get_columns("reports")}
+    for col_name in ("id", "reporter_id", "reported_user_id"):
+        col_info = report_cols.get(col_name)
+        if col_info and "INT" in str(col_info["type"]).upper():
+            op.execute(
+                f"ALTER TABLE reports ALTER COLUMN {col_name} TYPE VARCHAR(36) USING {col_name}::VARCHAR(36)"
+            )
+
+
+def _search_index():
+    """Full-text search: tsvector + trigram on Postgres, FTS5 on SQLite (see search_utils)."""
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            "ALTER TABLE listings ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+            ") STORED"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_listings_search_vector ON listings USING GIN (search_vector)")
+        # pg_trgm may need superuser; search still works without it
+        try:
+            with bind.begin_nested():
+                bind.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                bind.execute(sa.text(
+                    "CREATE INDEX IF NOT EXISTS ix_listings_title_trgm ON listings USING GIN (title gin_trgm_ops)"
+                ))
+        except sa.exc.DBAPIError:
+            pass
+    elif bind.dialect.name == "sqlite":
+        if "listings_fts" in sa.inspect(bind).get_table_names():
+            return
+        try:
+            bind.execute(sa.text(
+                "CREATE VIRTUAL TABLE listings_fts USING fts5("
+                "title, description, content='listings', content_rowid='rowid', "
+                "tokenize='porter unicode61')"
+            ))
+        except sa.exc.OperationalError:
+            return  # SQLite built without FTS5
+        op.execute(
+            "CREATE TRIGGER listings_fts_ai AFTER INSERT ON listings BEGIN "
+            "INSERT INTO listings_fts(rowid, title, description) "
+            "VALUES (new.rowid, new.title, new.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER listings_fts_ad AFTER DELETE ON listings BEGIN "
+            "INSERT INTO listings_fts(listings_fts, rowid, title, description) "
+            "VALUES ('delete', old.rowid, old.title, old.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER listings_fts_au AFTER UPDATE OF title, description ON listings BEGIN "
+            "INSERT INTO listings_fts(listings_fts, rowid, title, description) "
+            "VALUES ('delete', old.rowid, old.title, old.description); "
+            "INSERT INTO listings_fts(rowid, title, description) "
+            "VALUES (new.rowid, new.title, new.description); END"
+        )
+        op.execute("INSERT INTO listings_fts(listings_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    # Most of these tables and columns predate this revision on existing
+    # databases, so there is nothing that is safe to drop here
+    pass
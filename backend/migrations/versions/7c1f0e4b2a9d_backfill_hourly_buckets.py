@@ -0,0 +1,121 @@
+"""Fold legacy impression and view rows into the hourly buckets
+
+boost_stats reads impressions from boost_impression_hours and listing
+views from listing_view_hours. Rows recorded before those tables existed
+(one boost_impressions row per impression, one listing_views row per
+view) were never counted, so older boosts rolled up to 0 and were then
+finalized. This aggregates the rows older than each boost's or listing's
+first bucket into hourly and daily buckets, and un-finalizes boost_stats
+so the next rollup recomputes them. The raw impression rows are pruned
+after BOOST_IMPRESSION_RETENTION_DAYS, so this has to run before that.
+
+Revision ID: 7c1f0e4b2a9d
+Revises: 517520e7b3da
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1f0e4b2a9d'
+down_revision = '517520e7b3da'
+branch_labels = None
+depends_on = None
+
+boost_impression_hours = sa.table(
+    'boost_impression_hours',
+    sa.column('id', sa.String), sa.column('boost_id', sa.String), sa.column('hour', sa.DateTime(timezone=True)),
+    sa.column('impressions', sa.Integer), sa.column('unique_viewers', sa.Integer),
+)
+boost_impression_days = sa.table(
+    'boost_impression_days',
+    sa.column('id', sa.String), sa.column('boost_id', sa.String), sa.column('day', sa.Date),
+    sa.column('impressions', sa.Integer), sa.column('unique_viewers', sa.Integer),
+)
+listing_view_hours = sa.table(
+    'listing_view_hours',
+    sa.column('id', sa.String), sa.column('listing_id', sa.String), sa.column('hour', sa.DateTime(timezone=True)),
+    sa.column('views', sa.Integer),
+)
+
+
+def _truncate(col, unit):
+    if op.get_bind().dialect.name == "postgresql":
+        return f"date_trunc('{unit}', {col})"
+    return f"strftime('{'%Y-%m-%d %H:00:00' if unit == 'hour' else '%Y-%m-%d 00:00:00'}', {col})"
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return value
+
+
+def _legacy_impressions(unit):
+    # Older than every bucket of the boost: the per-viewer rows written since
+    # the buckets exist always share an hour with a bucket
+    return op.get_bind().execute(sa.text(
+        f"SELECT boost_id, {_truncate('shown_at', unit)} AS t, COUNT(*), COUNT(DISTINCT viewer_user_id) "
+        "FROM boost_impressions bi WHERE NOT EXISTS (SELECT 1 FROM boost_impression_hours h "
+        "WHERE h.boost_id = bi.boost_id AND h.hour <= bi.shown_at) "
+        "GROUP BY boost_id, t"
+    )).fetchall()
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # Both before inserting anything: new hourly rows change what counts as legacy
+    hours = _legacy_impressions("hour")
+    days = _legacy_impressions("day")
+    if hours:
+        op.bulk_insert(boost_impression_hours, [
+            {"id": str(uuid.uuid4()), "boost_id": boost_id, "hour": _as_datetime(t),
+             "impressions": n, "unique_viewers": viewers}
+            for boost_id, t, n, viewers in hours
+        ])
+
+    existing = defaultdict(dict)
+    for day_id, boost_id, day in bind.execute(sa.text("SELECT id, boost_id, day FROM boost_impression_days")):
+        existing[boost_id][str(day)[:10]] = day_id
+    new_days = []
+    for boost_id, t, n, viewers in days:
+        day = _as_datetime(t).date()
+        day_id = existing[boost_id].get(day.isoformat())
+        if day_id:
+            # The day the buckets started: add the legacy part to it
+            bind.execute(sa.text(
+                "UPDATE boost_impression_days SET impressions = impressions + :n WHERE id = :id"
+            ), {"n": n, "id": day_id})
+        else:
+            new_days.append({"id": str(uuid.uuid4()), "boost_id": boost_id, "day": day,
+                             "impressions": n, "unique_viewers": viewers})
+    if new_days:
+        op.bulk_insert(boost_impression_days, new_days)
+
+    views = bind.execute(sa.text(
+        f"SELECT listing_id, {_truncate('created_at', 'hour')} AS t, COUNT(*) "
+        "FROM listing_views lv WHERE NOT EXISTS (SELECT 1 FROM listing_view_hours h "
+        "WHERE h.listing_id = lv.listing_id AND h.hour <= lv.created_at) "
+        "GROUP BY listing_id, t"
+    )).fetchall()
+    if views:
+        op.bulk_insert(listing_view_hours, [
+            {"id": str(uuid.uuid4()), "listing_id": listing_id, "hour": _as_datetime(t), "views": n}
+            for listing_id, t, n in views
+        ])
+
+    op.execute("UPDATE boost_stats SET finalized = FALSE")
+
+
+def downgrade():
+    # The backfilled buckets are indistinguishable from counted ones
+    pass
@@ -19,8 +19,10 @@ class User(UserMixin, db.Model):
     display_name = db.Column(db.String(120))
     google_sub = db.Column(db.String(255), unique=True, nullable=True, index=True)
     avatar_url = db.Column(db.Text, nullable=True)
-    avatar_data = db.Column(db.LargeBinary, nullable=True)
+    # Deferred: only serve_avatar reads the bytes, with its own column query
+    avatar_data = db.deferred(db.Column(db.LargeBinary, nullable=True))
     avatar_mime = db.Column(db.String(32), nullable=True)
+    avatar_hash = db.Column(db.String(64), nullable=True)  # SHA-256 of avatar_data, used as ETag
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
     rating_avg = db.Column(db.Numeric, default=0)
@@ -59,6 +61,7 @@ class Listing(db.Model):
 
     lat = db.Column(db.Float, nullable=True)
     lng = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)  # see geo_utils
 
     pickup_or_shipping = db.Column(db.String(16), nullable=False)  # "pickup"|"shipping"
     is_sold = db.Column(db.Boolean, default=False)
@@ -70,16 +73,38 @@ class Listing(db.Model):
     nudged_at = db.Column(db.DateTime(timezone=True), nullable=True)
     bundle_discount_pct = db.Column(db.Integer, nullable=True)  # e.g. 10 for 10% off
 
+    # Denormalized counters (views are flushed in batches by counter_utils)
+    view_count = db.Column(db.Integer, default=0)
+    observing_count = db.Column(db.Integer, default=0)
+
 class ListingImage(db.Model):
     __tablename__ = "listing_images"
 
     id = db.Column(db.String(36), primary_key=True, default=_uuid)
     listing_id = db.Column(db.String(36), db.ForeignKey("listings.id"), nullable=False, index=True)
     image_url = db.Column(db.Text, nullable=False)
-    image_data = db.Column(db.LargeBinary, nullable=True)
+    # Legacy, new uploads go to the blob store. Deferred like User.avatar_data
+    image_data = db.deferred(db.Column(db.LargeBinary, nullable=True))
     image_mime = db.Column(db.String(32), nullable=True)
+    blob_key = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 of the bytes
+    byte_size = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(16), default="ready")  # pending while variants are built in the background
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
+class ListingImageVariant(db.Model):
+    """A resized / re-encoded copy of a listing image, generated at upload time."""
+    __tablename__ = "listing_image_variants"
+
+    id = db.Column(db.String(36), primary_key=True, default=_uuid)
+    image_id = db.Column(db.String(36), db.ForeignKey("listing_images.id"), nullable=False, index=True)
+    width = db.Column(db.Integer, nullable=False)  # pixels
+    height = db.Column(db.Integer, nullable=False)
+    mime = db.Column(db.String(32), nullable=False)
+    blob_key = db.Column(db.String(64), nullable=False)
+    byte_size = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint("image_id", "width", "mime", name="uq_listing_image_variant"),)
+
 class Observing(db.Model):
     __tablename__ = "observing"
 
@@ -101,7 +126,19 @@ class Conversation(db.Model):
 
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
-    __table_args__ = (db.UniqueConstraint("listing_id", "buyer_id", "seller_id", name="uq_conv_triplet"),)
+    # Denormalized inbox state, maintained when a message is written
+    last_message_id = db.Column(db.String(36), nullable=True)
+    last_message_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=True)
+    buyer_unread_count = db.Column(db.Integer, default=0, nullable=False)
+    seller_unread_count = db.Column(db.Integer, default=0, nullable=False)
+    buyer_last_read_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    seller_last_read_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint("listing_id", "buyer_id", "seller_id", name="uq_conv_triplet"),
+        db.Index("ix_conversations_buyer_activity", "buyer_id", "last_message_at"),
+        db.Index("ix_conversations_seller_activity", "seller_id", "last_message_at"),
+    )
 
 class Message(db.Model):
     __tablename__ = "messages"
@@ -113,6 +150,9 @@ class Message(db.Model):
     image_url = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
+    # Thread reads (tail and backward paging) are range scans on this
+    __table_args__ = (db.Index("ix_messages_conversation_created", "conversation_id", "created_at"),)
+
 class SafeMeetLocation(db.Model):
     __tablename__ = "safe_meet_locations"
 
@@ -162,6 +202,42 @@ class BoostImpression(db.Model):
     viewer_user_id = db.Column(db.String(36), db.ForeignKey("users.id"), nullable=True, index=True)
     shown_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
+class BoostImpressionHour(db.Model):
+    """Carousel impressions per boost per UTC hour, flushed from the write-behind counter."""
+    __tablename__ = "boost_impression_hours"
+
+    id = db.Column(db.String(36), primary_key=True, default=_uuid)
+    boost_id = db.Column(db.String(36), db.ForeignKey("boosts.id"), nullable=False, index=True)
+    hour = db.Column(db.DateTime(timezone=True), nullable=False)  # start of the hour
+    impressions = db.Column(db.Integer, nullable=False, default=0)
+    unique_viewers = db.Column(db.Integer, nullable=True)  # filled in by the rollup job
+
+    __table_args__ = (db.UniqueConstraint("boost_id", "hour", name="uq_boost_impression_hour"),)
+
+class BoostImpressionDay(db.Model):
+    __tablename__ = "boost_impression_days"
+
+    id = db.Column(db.String(36), primary_key=True, default=_uuid)
+    boost_id = db.Column(db.String(36), db.ForeignKey("boosts.id"), nullable=False, index=True)
+    day = db.Column(db.Date, nullable=False)  # UTC
+    impressions = db.Column(db.Integer, nullable=False, default=0)
+    unique_viewers = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint("boost_id", "day", name="uq_boost_impression_day"),)
+
+class BoostStats(db.Model):
+    """Rolled-up totals for one boost's window, refreshed by the rollup cron."""
+    __tablename__ = "boost_stats"
+
+    id = db.Column(db.String(36), primary_key=True, default=_uuid)
+    boost_id = db.Column(db.String(36), db.ForeignKey("boosts.id"), nullable=False, unique=True)
+    impressions = db.Column(db.Integer, nullable=False, default=0)
+    unique_viewers = db.Column(db.Integer, nullable=False, default=0)
+    listing_views = db.Column(db.Integer, nullable=False, default=0)
+    offers = db.Column(db.Integer, nullable=False, default=0)
+    finalized = db.Column(db.Boolean, nullable=False, default=False)  # boost ended and fully counted
+    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
 class Subscription(db.Model):
     __tablename__ = "subscriptions"
 
@@ -271,6 +347,17 @@ class ListingView(db.Model):
     viewer_id = db.Column(db.String(36), db.ForeignKey("users.id"), nullable=True, index=True)
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
+class ListingViewHour(db.Model):
+    """Listing detail views per UTC hour, flushed from the write-behind counter."""
+    __tablename__ = "listing_view_hours"
+
+    id = db.Column(db.String(36), primary_key=True, default=_uuid)
+    listing_id = db.Column(db.String(36), db.ForeignKey("listings.id"), nullable=False, index=True)
+    hour = db.Column(db.DateTime(timezone=True), nullable=False)
+    views = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint("listing_id", "hour", name="uq_listing_view_hour"),)
+
 class MeetupConfirmation(db.Model):
     __tablename__ = "meetup_confirmations"
     id = db.Column(db.String(36), primary_key=True, default=_uuid)
@@ -288,3 +375,18 @@ class PushSubscription(db.Model):
     p256dh = db.Column(db.Text, nullable=False)
     auth = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+class OutboxJob(db.Model):
+    __tablename__ = "outbox_jobs"
+    id = db.Column(db.String(36), primary_key=True, default=_uuid)
+    kind = db.Column(db.String(16), nullable=False)          # "email" or "push"
+    payload = db.Column(db.Text, nullable=False)             # JSON
+    status = db.Column(db.String(16), default="pending", nullable=False)  # pending | sent | failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    coalesce_key = db.Column(db.String(64), nullable=True, index=True)  # see outbox_utils.enqueue
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (db.Index("ix_outbox_jobs_status_next", "status", "next_attempt_at"),)
@@ -0,0 +1,257 @@
+"""Durable outbox for email and web push.
+
+Request handlers never talk to Resend or push services directly. They call
+enqueue(kind, payload), which adds an outbox_jobs row to the current
+session, so it commits or rolls back with the handler's own writes. Rows
+added after the handler's last commit are written in a transaction of
+their own when a 2xx/3xx response goes out; whatever else the handler left
+uncommitted is discarded, as it would be at teardown. A daemon thread per process claims due jobs and
+delivers them concurrently on OUTBOX_WORKERS threads. A failed delivery is
+retried with exponential backoff until OUTBOX_MAX_ATTEMPTS.
+
+Claiming pushes next_attempt_at forward by a lease instead of flipping a
+status, so several processes can share the table without row locks. A
+job held by a crashed worker just becomes due again when the lease runs
+out.
+"""
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import OutboxJob
+
+_LEASE_SECONDS = 120
+
+_handlers = {}     # kind -> fn(payload)
+_lock = threading.Lock()
+_wake = threading.Event()
+_worker = None
+_pool = None
+
+
+class DeliveryError(Exception):
+    """Raised by a handler when a send failed.
+
+    permanent=True skips the remaining retries. payload, if given, replaces
+    the job's payload for the next attempt (e.g. only the devices that
+    still need the push).
+    """
+
+    def __init__(self, message, permanent=False, payload=None):
+        super().__init__(message)
+        self.permanent = permanent
+        self.payload = payload
+
+
+def register_handler(kind, fn):
+    """Register fn(payload) as the sender for jobs of this kind."""
+    _handlers[kind] = fn
+
+
+def enqueue(kind, payload, delay=0, key=None):
+    """Queue a send. Becomes visible to the worker when the session commits.
+
+    delay holds the job back that many seconds. With a key, a job that is
+    still waiting (not yet picked up) under the same key absorbs this one
+    and is returned instead, so bursts collapse into a single send.
+    """
+    if key is not None:
+        waiting = OutboxJob.query.filter_by(coalesce_key=key, status="pending", attempts=0).first()
+        if waiting is not None:
+            return waiting
+    job = OutboxJob(
+        kind=kind, payload=json.dumps(payload, default=str), coalesce_key=key,
+        next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(job)
+    db.session.info.setdefault("outbox_jobs", []).append(job)
+    _ensure_worker(current_app._get_current_object())
+    return job
+
+
+def _backoff(attempts):
+    cfg = current_app.config
+    base = cfg.get("OUTBOX_BACKOFF_SECONDS", 30)
+    delay = min(base * 2 ** (attempts - 1), cfg.get("OUTBOX_MAX_BACKOFF_SECONDS", 3600))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _claim(limit):
+    """Lease up to limit due jobs to this worker. Returns [(id, kind, payload, attempts)]."""
+    now = datetime.utcnow()
+    due = db.session.query(OutboxJob.id).filter(
+        OutboxJob.status == "pending", OutboxJob.next_attempt_at <= now,
+    ).order_by(OutboxJob.next_attempt_at.asc()).limit(limit).all()
+
+    claimed = []
+    for job_id, in due:
+        # Conditional update: only one process wins each job
+        won = OutboxJob.query.filter(
+            OutboxJob.id == job_id, OutboxJob.status == "pending", OutboxJob.next_attempt_at <= now,
+        ).update({
+            OutboxJob.next_attempt_at: now + timedelta(seconds=_LEASE_SECONDS),
+            OutboxJob.attempts: OutboxJob.attempts + 1,
+        }, synchronize_session=False)
+        if won:
+            claimed.append(job_id)
+    db.session.commit()
+    if not claimed:
+        return []
+    return db.session.query(OutboxJob.id, OutboxJob.kind, OutboxJob.payload, OutboxJob.attempts).filter(
+        OutboxJob.id.in_(claimed),
+    ).all()
+
+
+def _deliver(app, job_id, kind, payload, attempts):
+    with app.app_context():
+        values = {}
+        try:
+            handler = _handlers.get(kind)
+            if handler is None:
+                raise DeliveryError(f"No handler for outbox kind {kind!r}", permanent=True)
+            handler(json.loads(payload))
+            values = {OutboxJob.status: "sent", OutboxJob.sent_at: datetime.utcnow(), OutboxJob.last_error: None}
+        except Exception as e:
+            db.session.rollback()
+            permanent = getattr(e, "permanent", False)
+            values = {OutboxJob.last_error: str(e)[:1000]}
+            if getattr(e, "payload", None) is not None:
+                values[OutboxJob.payload] = json.dumps(e.payload, default=str)
+            if permanent or attempts >= app.config.get("OUTBOX_MAX_ATTEMPTS", 8):
+                values[OutboxJob.status] = "failed"
+                app.logger.error(f"Outbox {kind} job {job_id} failed for good: {e}")
+            else:
+                values[OutboxJob.next_attempt_at] = datetime.utcnow() + _backoff(attempts)
+                app.logger.warning(f"Outbox {kind} job {job_id} attempt {attempts} failed: {e}")
+        try:
+            OutboxJob.query.filter_by(id=job_id).update(values, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Outbox job {job_id} status update failed: {e}")
+        finally:
+            db.session.remove()
+
+
+def process_outbox(limit):
+    """Deliver every job that is due now, concurrently. Returns the number attempted."""
+    global _pool
+    app = current_app._get_current_object()
+    jobs = _claim(limit)
+    if not jobs:
+        return 0
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=max(1, app.config.get("OUTBOX_WORKERS", 8)), thread_name_prefix="outbox-send",
+            )
+    futures = [_pool.submit(_deliver, app, *job) for job in jobs]
+    for f in futures:
+        f.result()
+    return len(jobs)
+
+
+def drain_outbox():
+    """Deliver due jobs in OUTBOX_BATCH_SIZE batches until a short one comes back. Returns the number attempted."""
+    limit = current_app.config.get("OUTBOX_BATCH_SIZE", 100)
+    total = 0
+    while True:
+        n = process_outbox(limit)
+        total += n
+        if n < limit:
+            return total
+
+
+def prune_outbox(days=7):
+    """Delete sent jobs older than days. Failed jobs are kept for inspection."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    n = OutboxJob.query.filter(OutboxJob.status == "sent", OutboxJob.sent_at < cutoff).delete(
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return n
+
+
+def _run_worker(app):
+    interval = app.config.get("OUTBOX_POLL_SECONDS", 5)
+    last_prune = 0.0
+    while True:
+        _wake.wait(interval)
+        _wake.clear()
+        with app.app_context():
+            try:
+                drain_outbox()
+                if time.monotonic() - last_prune > 3600:
+                    prune_outbox(app.config.get("OUTBOX_RETENTION_DAYS", 7))
+                    last_prune = time.monotonic()
+            except Exception as e:
+                app.logger.error(f"Outbox worker error: {e}")
+            finally:
+                db.session.remove()
+
+
+def _ensure_worker(app):
+    global _worker
+    if not app.config.get("OUTBOX_WORKER", True):
+        return
+    if _worker is not None and _worker.is_alive():
+        return
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, args=(app,), name="outbox-worker", daemon=True)
+            _worker.start()
+
+
+def init_outbox(app):
+    """Register the senders and the end-of-request write for late enqueues."""
+    import email_utils  # noqa: F401 (registers "email")
+    import fanout_utils  # noqa: F401 (registers "listing_change")
+    try:
+        import push_utils  # noqa: F401 (registers "push")
+    except ImportError as e:
+        app.logger.warning(f"Web push disabled: {e}")
+
+    @app.after_request
+    def _commit_outbox(response):
+        late = db.session.info.get("outbox_jobs")
+        if not late:
+            return response
+        rows = [
+            {"kind": j.kind, "payload": j.payload, "coalesce_key": j.coalesce_key, "next_attempt_at": j.next_attempt_at}
+            for j in late
+        ]
+        # Only the jobs: the handler's other uncommitted changes are dropped, not committed
+        db.session.rollback()
+        if response.status_code < 400:
+            try:
+                db.session.add_all(OutboxJob(**row) for row in rows)
+                db.session.commit()
+                _wake.set()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Outbox commit failed: {e}")
+        return response
+
+    # Pick up anything a previous process left behind
+    @app.before_request
+    def _start_outbox_worker():
+        _ensure_worker(app)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop("outbox_jobs", None):
+        _wake.set()
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("outbox_jobs", None)
@@ -0,0 +1,72 @@
+"""Keyset (cursor) pagination.
+
+A cursor is an opaque, URL-safe token holding the sort name, the sort key
+of the last row returned and that row's id. The next page is then
+"rows after (key, id)" — an index range scan instead of OFFSET, so deep
+pages cost the same as the first one.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort, key, row_id):
+    if isinstance(key, datetime):
+        key = {"dt": key.isoformat()}
+    elif key is not None and not isinstance(key, (int, float, str)):
+        key = float(key)  # Numeric -> Decimal
+    raw = json.dumps({"s": sort, "k": key, "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, sort):
+    """Return (key, id) for sort. Raises ValueError on a bad or mismatched cursor."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        key, row_id = data["k"], data["id"]
+        if isinstance(key, dict):
+            key = datetime.fromisoformat(key["dt"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if data.get("s") != sort:
+        raise ValueError("Cursor does not match sort order")
+    return key, row_id
+
+
+def paginate(query, sort, sort_expr, descending, id_col, per_page, cursor=None, page=1):
+    """Page a query by (sort_expr, id_col).
+
+    With a cursor, rows strictly after it are returned (keyset). Without
+    one, the legacy page number is used as an OFFSET. Either way the
+    response carries a next_cursor so clients can switch to keyset paging.
+
+    Returns (rows, has_more, next_cursor).
+    """
+    if cursor:
+        key, last_id = decode_cursor(cursor, sort)
+        if descending:
+            query = query.filter(or_(sort_expr < key, and_(sort_expr == key, id_col < last_id)))
+        else:
+            query = query.filter(or_(sort_expr > key, and_(sort_expr == key, id_col > last_id)))
+
+    if descending:
+        query = query.order_by(sort_expr.desc(), id_col.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), id_col.asc())
+
+    query = query.add_columns(sort_expr.label("_sort_key")).limit(per_page + 1)
+    if not cursor:
+        query = query.offset((max(page, 1) - 1) * per_page)
+
+    results = query.all()
+    has_more = len(results) > per_page
+    results = results[:per_page]
+
+    next_cursor = None
+    if has_more:
+        last, last_key = results[-1]
+        next_cursor = encode_cursor(sort, last_key, last.id)
+    return [r[0] for r in results], has_more, next_cursor
@@ -0,0 +1,140 @@
+"""Write-behind last_seen.
+
+Every authenticated request used to commit users.last_seen (auth.me on
+every call). touch() now records the time in a buffer, in Redis when
+REDIS_URL is set or in process memory otherwise. A daemon thread writes
+the buffer in one executemany UPDATE every LAST_SEEN_FLUSH_SECONDS.
+Each process records a user at most once per LAST_SEEN_RESOLUTION_SECONDS,
+so last_seen can lag by about the sum of the two. Readers only compare it
+against minutes (the 5-minute "offline" email rule).
+"""
+import atexit
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import bindparam, or_
+
+from counter_utils import _get_redis
+from extensions import db
+from models import User
+
+_KEY = "pm:last-seen"
+
+_lock = threading.Lock()
+_pending = {}      # user id -> aware datetime (memory backend)
+_recent = {}       # user id -> monotonic time last recorded by this process
+_flusher = None
+_app = None
+
+
+def touch(user_id):
+    """Record that user_id is active now. Never touches the database."""
+    app = current_app._get_current_object()
+    now = time.monotonic()
+    with _lock:
+        if now - _recent.get(user_id, float("-inf")) < app.config.get("LAST_SEEN_RESOLUTION_SECONDS", 60):
+            return
+        _recent[user_id] = now
+    _ensure_flusher(app)
+    seen = datetime.now(timezone.utc)
+    r = _get_redis(app)
+    if r is not None:
+        try:
+            r.hset(_KEY, user_id, seen.isoformat())
+            return
+        except Exception as e:
+            app.logger.warning(f"last_seen: redis unavailable, buffering in memory: {e}")
+    with _lock:
+        _pending[user_id] = seen
+
+
+def _drain(app):
+    with _lock:
+        seen = dict(_pending)
+        _pending.clear()
+        # Forget users not seen lately so _recent stays bounded
+        cutoff = time.monotonic() - app.config.get("LAST_SEEN_RESOLUTION_SECONDS", 60)
+        for uid in [uid for uid, t in _recent.items() if t < cutoff]:
+            del _recent[uid]
+
+    r = _get_redis(app)
+    if r is not None:
+        tmp = f"{_KEY}:flushing:{uuid.uuid4().hex}"
+        try:
+            r.rename(_KEY, tmp)
+        except Exception:
+            return seen  # nothing buffered yet
+        try:
+            for k, v in r.hgetall(tmp).items():
+                uid = k.decode() if isinstance(k, bytes) else k
+                ts = datetime.fromisoformat(v.decode() if isinstance(v, bytes) else v)
+                if uid not in seen or ts > seen[uid]:
+                    seen[uid] = ts
+        finally:
+            r.delete(tmp)
+    return seen
+
+
+def flush():
+    """Write buffered last_seen times to the database. Returns users updated."""
+    app = current_app._get_current_object()
+    seen = _drain(app)
+    if not seen:
+        return 0
+    users = User.__table__
+    stmt = users.update().where(
+        users.c.id == bindparam("uid"),
+        or_(users.c.last_seen.is_(None), users.c.last_seen < bindparam("ts")),
+    ).values(last_seen=bindparam("ts"))
+    try:
+        db.session.execute(stmt, [{"uid": uid, "ts": ts} for uid, ts in seen.items()])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"last_seen flush failed, re-buffering: {e}")
+        with _lock:
+            for uid, ts in seen.items():
+                if uid not in _pending or ts > _pending[uid]:
+                    _pending[uid] = ts
+        return 0
+    return len(seen)
+
+
+def _run_flusher(app):
+    interval = app.config.get("LAST_SEEN_FLUSH_SECONDS", 30)
+    stop = threading.Event()
+    while not stop.wait(interval):
+        with app.app_context():
+            try:
+                flush()
+            except Exception as e:
+                app.logger.error(f"last_seen flusher error: {e}")
+            finally:
+                db.session.remove()
+
+
+def _flush_at_exit():
+    if _app is None:
+        return
+    with _app.app_context():
+        try:
+            flush()
+        except Exception:
+            pass
+
+
+def _ensure_flusher(app):
+    global _flusher, _app
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        if _app is None:
+            atexit.register(_flush_at_exit)
+        _app = app
+        _flusher = threading.Thread(target=_run_flusher, args=(app,), name="last-seen-flusher", daemon=True)
+        _flusher.start()
@@ -0,0 +1,66 @@
+"""The logged-in user for a request, without loading the User row.
+
+Flask-Login's user_loader runs on every authenticated request, and the
+before-request hooks only read a few flags. load_principal() returns a
+Principal built from those columns, cached under principal:<id> for
+PRINCIPAL_CACHE_SECONDS. cache_utils drops the entry when any of them
+changes on the User row. Without Redis the cache is per process, so a ban
+or promotion reaches other workers within that TTL.
+
+Reading any other attribute, or assigning any attribute, goes to the User
+row, which is loaded on first use. So handlers that update current_user
+and commit behave as before.
+"""
+from flask import current_app
+from flask_login import UserMixin
+
+from cache_utils import cached, principal_key
+from extensions import db
+from models import User
+
+PRINCIPAL_FIELDS = (
+    "id", "email", "display_name", "avatar_url", "is_pro", "is_verified", "onboarding_done",
+    "is_test_account", "is_admin", "is_banned", "pro_free_boost_last_used_day",
+)
+
+
+class Principal(UserMixin):
+    def __init__(self, data):
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_row", None)
+
+    def get_id(self):
+        return self._data["id"]
+
+    def user(self):
+        """The full User row, loaded into the current session on first use."""
+        if self._row is None:
+            object.__setattr__(self, "_row", db.session.get(User, self._data["id"]))
+        return self._row
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self._data and self._row is None:
+            return self._data[name]
+        return getattr(self.user(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user(), name, value)
+        if name in self._data:
+            self._data[name] = value
+
+
+def _load(user_id):
+    row = db.session.query(*(getattr(User, f) for f in PRINCIPAL_FIELDS)).filter(User.id == user_id).first()
+    return dict(row._mapping) if row else None
+
+
+def load_principal(user_id):
+    """The Principal for user_id, or None if there is no such user."""
+    data = cached(
+        principal_key(user_id), current_app.config.get("PRINCIPAL_CACHE_SECONDS", 60),
+        lambda: _load(user_id),
+    )
+    # A copy: Principal writes through to its dict, and the in-process cache hands out the same one
+    return Principal(dict(data)) if data else None
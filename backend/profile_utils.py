@@ -0,0 +1,63 @@
+"""Cached seller summaries: the few User fields shown next to listings,
+offers, reviews and conversations.
+
+get_many(user_ids) returns {id: summary} with one cache round trip. The
+misses are loaded in one query that selects only these columns, never
+the avatar BYTEA. Entries carry the user's seller tag, which cache_utils
+drops whenever one of these fields changes on a User row.
+"""
+from flask import current_app
+
+from cache_utils import cache_get_many, cache_set_many, seller_tag
+from extensions import db
+from models import User
+
+_KEY_PREFIX = "user-summary:"
+
+
+def _summary(row):
+    return {
+        "id": row.id,
+        "email": row.email,
+        "display_name": row.display_name,
+        "avatar_url": row.avatar_url,
+        "is_pro": bool(row.is_pro),
+        "is_verified": bool(row.is_verified),
+        "rating_avg": float(row.rating_avg) if row.rating_avg else 0,
+        "rating_count": row.rating_count or 0,
+    }
+
+
+def get_many(user_ids):
+    """{user_id: summary} for the users that exist."""
+    ids = {uid for uid in user_ids if uid}
+    if not ids:
+        return {}
+    hits = cache_get_many(_KEY_PREFIX + uid for uid in ids)
+    found = {key[len(_KEY_PREFIX):]: s for key, s in hits.items()}
+
+    missing = ids - found.keys()
+    if missing:
+        loaded = {row.id: _summary(row) for row in db.session.query(
+            User.id, User.email, User.display_name, User.avatar_url,
+            User.is_pro, User.is_verified, User.rating_avg, User.rating_count,
+        ).filter(User.id.in_(missing))}
+        cache_set_many(
+            {_KEY_PREFIX + uid: s for uid, s in loaded.items()},
+            current_app.config.get("USER_SUMMARY_CACHE_SECONDS", 300),
+            tags_for=lambda key: (seller_tag(key[len(_KEY_PREFIX):]),),
+        )
+        found.update(loaded)
+    return found
+
+
+def get_one(user_id):
+    """The summary for one user, or None."""
+    return get_many([user_id]).get(user_id)
+
+
+def display_name(summary, default="Unknown"):
+    """Name to show for a user: display name, else email."""
+    if not summary:
+        return default
+    return summary["display_name"] or summary["email"]
@@ -1,41 +1,143 @@
+"""Web push delivery.
+
+send_push_to_user(s) only queues an outbox job. The job's handler sends
+to every subscribed device at once on a shared thread pool
+(PUSH_CONCURRENCY), over one pooled requests.Session per push service
+origin. The VAPID JWT only depends on that origin, so each signed header is
+reused until shortly before it expires instead of being re-signed for
+every device. Endpoints the service reports gone (404/410) are deleted in
+one statement.
+"""
 import json
-from pywebpush import webpush, WebPushException
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from py_vapid import Vapid
+from pywebpush import WebPusher
 from flask import current_app
 
 from extensions import db
 from models import PushSubscription
+from outbox_utils import DeliveryError, enqueue, register_handler
+
+_VAPID_TTL = 12 * 3600     # JWT lifetime, the most push services accept
+_VAPID_RENEW = 600         # re-sign this long before expiry
+
+_lock = threading.Lock()
+_vapid = None              # (private key, Vapid)
+_vapid_headers = {}        # audience -> (exp, headers)
+_sessions = {}             # audience -> requests.Session
+_pool = None
 
 
 def send_push_to_user(user_id, title, body, url="/", tag="default"):
-    """Send a web push notification to all of a user's subscribed devices."""
-    subs = PushSubscription.query.filter_by(user_id=user_id).all()
-    if not subs:
-        return
+    """Queue a web push notification to all of a user's subscribed devices."""
+    send_push_to_users([user_id], title, body, url=url, tag=tag)
+
+
+def send_push_to_users(user_ids, title, body, url="/", tag="default"):
+    """Queue one notification for every device of every user in user_ids, as one job."""
+    if user_ids:
+        enqueue("push", {"user_ids": list(user_ids), "title": title, "body": body, "url": url, "tag": tag})
+
+
+def _signer(private_key):
+    global _vapid
+    if _vapid is None or _vapid[0] != private_key:
+        _vapid = (private_key, Vapid.from_string(private_key=private_key))
+    return _vapid[1]
+
+
+def _headers_for(aud, private_key, claims):
+    """Signed VAPID headers for a push service origin, cached until near expiry."""
+    now = int(time.time())
+    with _lock:
+        cached = _vapid_headers.get(aud)
+        if cached and cached[0] - _VAPID_RENEW > now:
+            return cached[1]
+        exp = now + _VAPID_TTL
+        headers = _signer(private_key).sign({**claims, "aud": aud, "exp": exp})
+        _vapid_headers[aud] = (exp, headers)
+        return headers
+
+
+def _session_for(aud):
+    with _lock:
+        s = _sessions.get(aud)
+        if s is None:
+            size = current_app.config.get("PUSH_CONCURRENCY", 16)
+            s = requests.Session()
+            s.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size))
+            _sessions[aud] = s
+        return s
+
 
+def _get_pool(app):
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=max(1, app.config.get("PUSH_CONCURRENCY", 16)), thread_name_prefix="push-send",
+            )
+        return _pool
+
+
+def _send_one(sub, data, private_key, claims):
+    """POST one encrypted notification. Returns the HTTP status, or None on a network error."""
+    url = urlparse(sub.endpoint)
+    aud = f"{url.scheme}://{url.netloc}"
+    try:
+        resp = WebPusher(
+            {"endpoint": sub.endpoint, "keys": {"p256dh": sub.p256dh, "auth": sub.auth}},
+            requests_session=_session_for(aud),
+        ).send(data, dict(_headers_for(aud, private_key, claims)), timeout=10)
+        if resp.status_code > 202 and resp.status_code not in (404, 410):
+            current_app.logger.error(f"Push failed: {resp.status_code} {resp.text[:200]}")
+        return resp.status_code
+    except Exception as e:
+        current_app.logger.error(f"Push error: {e}")
+        return None
+
+
+def _deliver_push(job):
+    """Outbox handler: send one queued notification to each of the users' devices.
+
+    On a retry only the devices that failed last time are sent to again.
+    """
     vapid_private = current_app.config.get("VAPID_PRIVATE_KEY")
     vapid_claims = current_app.config.get("VAPID_CLAIMS", {})
     if not vapid_private:
         return
 
-    payload = json.dumps({"title": title, "body": body, "url": url, "tag": tag})
-
-    for sub in subs:
-        try:
-            webpush(
-                subscription_info={
-                    "endpoint": sub.endpoint,
-                    "keys": {"p256dh": sub.p256dh, "auth": sub.auth},
-                },
-                data=payload,
-                vapid_private_key=vapid_private,
-                vapid_claims=vapid_claims,
-            )
-        except WebPushException as e:
-            if e.response and e.response.status_code in (404, 410):
-                db.session.delete(sub)
-            else:
-                current_app.logger.error(f"Push failed: {e}")
-        except Exception as e:
-            current_app.logger.error(f"Push error: {e}")
-
-    db.session.commit()
+    user_ids = job.get("user_ids") or [job["user_id"]]
+    query = db.session.query(
+        PushSubscription.id, PushSubscription.endpoint, PushSubscription.p256dh, PushSubscription.auth,
+    ).filter(PushSubscription.user_id.in_(user_ids))
+    if job.get("endpoints"):
+        query = query.filter(PushSubscription.endpoint.in_(job["endpoints"]))
+    subs = query.all()
+    if not subs:
+        return
+
+    payload = json.dumps({"title": job["title"], "body": job["body"], "url": job["url"], "tag": job["tag"]})
+    app = current_app._get_current_object()
+
+    def _send(sub):
+        with app.app_context():
+            return _send_one(sub, payload, vapid_private, vapid_claims)
+
+    statuses = list(_get_pool(app).map(_send, subs))
+
+    gone = [sub.id for sub, status in zip(subs, statuses) if status in (404, 410)]
+    failed = [sub.endpoint for sub, status in zip(subs, statuses) if status is None or (status > 202 and status not in (404, 410))]
+    if gone:
+        PushSubscription.query.filter(PushSubscription.id.in_(gone)).delete(synchronize_session=False)
+        db.session.commit()
+    if failed:
+        raise DeliveryError(f"Push failed on {len(failed)} of {len(subs)} devices", payload={**job, "endpoints": failed})
+
+
+register_handler("push", _deliver_push)
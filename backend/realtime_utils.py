@@ -0,0 +1,134 @@
+"""Per-user event fan-out for the Server-Sent Events stream.
+
+publish(user_id, event, data) delivers to every open stream of that
+user. With REDIS_URL set, events go through Redis pub/sub, so a message
+sent on one gunicorn worker reaches a stream held by another. Each
+process runs one listener thread that hands events to its local
+subscribers. Without Redis, fan-out is in-process only.
+
+Call publish() after the database commit, so a client that refetches on
+an event sees the new rows.
+"""
+import json
+import queue
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from counter_utils import _get_redis
+from models import Notification
+
+_CHANNEL_PREFIX = "pm:events:"
+
+_lock = threading.Lock()
+_subscribers = defaultdict(set)   # user_id -> {queue.Queue}
+_listener = None
+
+
+def _deliver(user_id, payload):
+    with _lock:
+        queues = list(_subscribers.get(user_id, ()))
+    for q in queues:
+        try:
+            q.put_nowait(payload)
+        except queue.Full:
+            pass  # a stalled client drops events rather than blocking the sender
+
+
+def _listen(app, r):
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    pubsub.psubscribe(_CHANNEL_PREFIX + "*")
+    for msg in pubsub.listen():
+        try:
+            channel = msg["channel"]
+            channel = channel.decode() if isinstance(channel, bytes) else channel
+            data = msg["data"]
+            _deliver(channel[len(_CHANNEL_PREFIX):], data.decode() if isinstance(data, bytes) else data)
+        except Exception as e:
+            app.logger.warning(f"Realtime listener dropped an event: {e}")
+
+
+def _ensure_listener(app):
+    global _listener
+    r = _get_redis(app)
+    if r is None or (_listener is not None and _listener.is_alive()):
+        return
+    with _lock:
+        if _listener is not None and _listener.is_alive():
+            return
+        _listener = threading.Thread(target=_listen, args=(app, r), name="realtime-listener", daemon=True)
+        _listener.start()
+
+
+def publish(user_id, event, data):
+    """Send an event to all of user_id's open streams. Never raises."""
+    if not user_id:
+        return
+    payload = json.dumps({"event": event, "data": data}, default=str)
+    try:
+        app = current_app._get_current_object()
+        r = _get_redis(app)
+        if r is not None:
+            r.publish(_CHANNEL_PREFIX + user_id, payload)
+            return
+    except Exception as e:
+        current_app.logger.warning(f"Realtime publish via redis failed, delivering locally: {e}")
+    _deliver(user_id, payload)
+
+
+def subscribe(user_id, maxsize=100):
+    """Register a queue for user_id's events. Pair with unsubscribe()."""
+    _ensure_listener(current_app._get_current_object())
+    q = queue.Queue(maxsize=maxsize)
+    with _lock:
+        _subscribers[user_id].add(q)
+    return q
+
+
+def unsubscribe(user_id, q):
+    with _lock:
+        subs = _subscribers.get(user_id)
+        if subs:
+            subs.discard(q)
+            if not subs:
+                del _subscribers[user_id]
+
+
+# ── Notifications ────────────────────────────────────────────────
+# Notification rows are created in many places (offers, reviews, price
+# drops...). Instead of a publish() next to each, new rows are collected
+# at flush and pushed once the transaction commits.
+
+
+@sa_event.listens_for(Session, "after_flush")
+def _collect_notifications(session, flush_context):
+    new = [obj for obj in session.new if isinstance(obj, Notification)]
+    if new:
+        session.info.setdefault("realtime_notifications", []).extend(
+            {"id": n.id, "user_id": n.user_id, "listing_id": n.listing_id,
+             "message": n.message, "created_at": n.created_at}
+            for n in new
+        )
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_notifications(session):
+    pending = session.info.pop("realtime_notifications", None)
+    if not pending:
+        return
+    try:
+        for n in pending:
+            publish(n["user_id"], "notification", {
+                "id": n["id"], "listing_id": n["listing_id"], "message": n["message"],
+                "is_read": False, "created_at": n["created_at"].isoformat() if n["created_at"] else None,
+            })
+    except Exception:
+        pass  # outside an app context; clients still see it on next fetch
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _drop_notifications(session):
+    session.info.pop("realtime_notifications", None)
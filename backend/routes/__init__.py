@@ -16,6 +16,7 @@ from .support import support_bp
 from .push import push_bp
 from .cron import cron_bp
 from .admin import admin_bp
+from .stream import stream_bp
 
 def register_blueprints(app):
     init_oauth(app)
@@ -37,3 +38,4 @@ def register_blueprints(app):
     app.register_blueprint(push_bp, url_prefix="/api/push")
     app.register_blueprint(cron_bp, url_prefix="/api/cron")
     app.register_blueprint(admin_bp, url_prefix="/api/admin")
+    app.register_blueprint(stream_bp, url_prefix="/api/stream")
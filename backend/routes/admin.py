@@ -5,7 +5,11 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from sqlalchemy import text, func
 
+from cache_utils import invalidate, listing_key
 from extensions import db
+from image_utils import listing_blob_keys, release_blobs
+from pagination_utils import paginate
+import profile_utils
 from models import User, Listing, ListingImage, Report, Review, Ad
 
 admin_bp = Blueprint("admin", __name__)
@@ -27,6 +31,25 @@ def admin_required(f):
     return decorated
 
 
+def _paginate(query, created_col, id_col, per_page=20):
+    """Newest-first admin paging.
+
+    ?cursor= pages by keyset and skips the COUNT(*); the legacy ?page= keeps
+    returning total/pages for the numbered pager.
+    Returns (rows, meta) or raises ValueError on a bad cursor.
+    """
+    cursor = request.args.get("cursor")
+    page = int(request.args.get("page", 1))
+    total = None if cursor else query.count()
+    rows, has_more, next_cursor = paginate(
+        query, "newest", created_col, True, id_col, per_page, cursor=cursor, page=page,
+    )
+    meta = {"has_more": has_more, "next_cursor": next_cursor}
+    if total is not None:
+        meta.update(total=total, page=page, pages=(total + per_page - 1) // per_page)
+    return rows, meta
+
+
 # ── Dashboard ──
 
 @admin_bp.get("/dashboard")
@@ -65,16 +88,15 @@ def dashboard():
 @admin_required
 def list_users():
     q = request.args.get("q", "").strip()
-    page = int(request.args.get("page", 1))
-    per_page = 20
 
     query = User.query
     if q:
         like = f"%{q}%"
         query = query.filter(db.or_(User.email.ilike(like), User.display_name.ilike(like)))
-    query = query.order_by(User.created_at.desc())
-    total = query.count()
-    users = query.offset((page - 1) * per_page).limit(per_page).all()
+    try:
+        users, meta = _paginate(query, User.created_at, User.id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     return jsonify({
         "users": [{
@@ -85,9 +107,7 @@ def list_users():
             "is_banned": bool(getattr(u, "is_banned", False)),
             "is_admin": bool(getattr(u, "is_admin", False)),
         } for u in users],
-        "total": total,
-        "page": page,
-        "pages": (total + per_page - 1) // per_page,
+        **meta,
     })
 
 
@@ -117,10 +137,14 @@ def delete_user(user_id):
 
     # Delete all user's listings and their dependents
     user_listings = Listing.query.filter_by(user_id=uid).all()
+    blob_keys = listing_blob_keys([l.id for l in user_listings])
     for listing in user_listings:
         lid = listing.id
         for stmt in [
             "DELETE FROM boost_impressions WHERE boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)",
+            "DELETE FROM boost_impression_hours WHERE boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)",
+            "DELETE FROM boost_impression_days WHERE boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)",
+            "DELETE FROM boost_stats WHERE boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)",
             "DELETE FROM boosts WHERE listing_id=:lid",
             "DELETE FROM messages WHERE conversation_id IN (SELECT id FROM conversations WHERE listing_id=:lid)",
             "DELETE FROM conversations WHERE listing_id=:lid",
@@ -132,7 +156,9 @@ def delete_user(user_id):
             "DELETE FROM price_history WHERE listing_id=:lid",
             "DELETE FROM reviews WHERE listing_id=:lid",
             "DELETE FROM listing_views WHERE listing_id=:lid",
+            "DELETE FROM listing_view_hours WHERE listing_id=:lid",
             "DELETE FROM meetup_confirmations WHERE listing_id=:lid",
+            "DELETE FROM listing_image_variants WHERE image_id IN (SELECT id FROM listing_images WHERE listing_id=:lid)",
             "DELETE FROM listing_images WHERE listing_id=:lid",
             "DELETE FROM reports WHERE listing_id=:lid",
         ]:
@@ -142,6 +168,15 @@ def delete_user(user_id):
     # Nullify buyer_id on other people's listings where this user was the buyer
     db.session.execute(text("UPDATE listings SET buyer_id=NULL WHERE buyer_id=:uid"), {"uid": uid})
 
+    # Keep observer counters on other sellers' listings in step
+    observed = db.session.execute(
+        text("SELECT listing_id FROM observing WHERE user_id=:uid"), {"uid": uid},
+    ).scalars().all()
+    db.session.execute(text(
+        "UPDATE listings SET observing_count = COALESCE(observing_count, 0) - 1 "
+        "WHERE id IN (SELECT listing_id FROM observing WHERE user_id=:uid)"
+    ), {"uid": uid})
+
     # Delete user-level data (order matters for FK constraints)
     for stmt in [
         "DELETE FROM boost_impressions WHERE viewer_user_id=:uid",
@@ -165,6 +200,9 @@ def delete_user(user_id):
 
     db.session.delete(u)
     db.session.commit()
+    release_blobs(blob_keys)
+    if observed:
+        invalidate(*(listing_key(listing_id) for listing_id in observed))
     return jsonify({"ok": True})
 
 
@@ -196,31 +234,31 @@ def toggle_verified(user_id):
 @admin_required
 def list_listings():
     q = request.args.get("q", "").strip()
-    page = int(request.args.get("page", 1))
-    per_page = 20
 
     query = Listing.query
     if q:
         like = f"%{q}%"
         query = query.filter(Listing.title.ilike(like))
-    query = query.order_by(Listing.created_at.desc())
-    total = query.count()
-    listings = query.offset((page - 1) * per_page).limit(per_page).all()
+    try:
+        listings, meta = _paginate(query, Listing.created_at, Listing.id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    sellers = profile_utils.get_many({l.user_id for l in listings})
     result = []
     for l in listings:
         img = ListingImage.query.filter_by(listing_id=l.id).first()
-        seller = db.session.get(User, l.user_id)
+        seller = sellers.get(l.user_id)
         result.append({
             "id": l.id, "title": l.title,
             "price_cents": l.price_cents, "category": l.category,
             "is_sold": l.is_sold, "is_draft": l.is_draft,
             "created_at": l.created_at.isoformat() if l.created_at else None,
             "image_url": img.image_url if img else None,
-            "seller_email": seller.email if seller else None,
+            "seller_email": seller["email"] if seller else None,
         })
 
-    return jsonify({"listings": result, "total": total, "page": page, "pages": (total + per_page - 1) // per_page})
+    return jsonify({"listings": result, **meta})
 
 
 @admin_bp.delete("/listings/<listing_id>")
@@ -233,6 +271,9 @@ def delete_listing(listing_id):
     # Cascade delete dependents
     for tbl, col in [
         ("boost_impressions", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
+        ("boost_impression_hours", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
+        ("boost_impression_days", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
+        ("boost_stats", "boost_id IN (SELECT id FROM boosts WHERE listing_id=:lid)"),
         ("boosts", "listing_id=:lid"),
         ("messages", "conversation_id IN (SELECT id FROM conversations WHERE listing_id=:lid)"),
         ("conversations", "listing_id=:lid"),
@@ -244,7 +285,9 @@ def delete_listing(listing_id):
         ("price_history", "listing_id=:lid"),
         ("reviews", "listing_id=:lid"),
         ("listing_views", "listing_id=:lid"),
+        ("listing_view_hours", "listing_id=:lid"),
         ("meetup_confirmations", "listing_id=:lid"),
+        ("listing_image_variants", "image_id IN (SELECT id FROM listing_images WHERE listing_id=:lid)"),
         ("listing_images", "listing_id=:lid"),
     ]:
         try:
@@ -267,24 +310,24 @@ def delete_listing(listing_id):
 @admin_required
 def list_reports():
     status_filter = request.args.get("status", "").strip()
-    page = int(request.args.get("page", 1))
-    per_page = 20
 
     query = Report.query
     if status_filter:
         query = query.filter_by(status=status_filter)
-    query = query.order_by(Report.created_at.desc())
-    total = query.count()
-    reports = query.offset((page - 1) * per_page).limit(per_page).all()
+    try:
+        reports, meta = _paginate(query, Report.created_at, Report.id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    users = profile_utils.get_many({r.reporter_id for r in reports} | {r.reported_user_id for r in reports})
     result = []
     for r in reports:
-        reporter = db.session.get(User, r.reporter_id)
-        reported = db.session.get(User, r.reported_user_id) if r.reported_user_id else None
+        reporter = users.get(r.reporter_id)
+        reported = users.get(r.reported_user_id)
         result.append({
             "id": r.id, "reason": r.reason, "status": r.status,
-            "reporter_email": reporter.email if reporter else None,
-            "reported_email": reported.email if reported else None,
+            "reporter_email": reporter["email"] if reporter else None,
+            "reported_email": reported["email"] if reported else None,
             "reported_user_id": r.reported_user_id,
             "listing_id": getattr(r, "listing_id", None),
             "admin_notes": getattr(r, "admin_notes", None),
@@ -292,7 +335,7 @@ def list_reports():
             "created_at": r.created_at.isoformat() if r.created_at else None,
         })
 
-    return jsonify({"reports": result, "total": total, "page": page, "pages": (total + per_page - 1) // per_page})
+    return jsonify({"reports": result, **meta})
 
 
 @admin_bp.post("/reports/<report_id>/resolve")
@@ -315,29 +358,28 @@ def resolve_report(report_id):
 @admin_bp.get("/reviews")
 @admin_required
 def list_reviews():
-    page = int(request.args.get("page", 1))
-    per_page = 20
-
-    query = Review.query.order_by(Review.created_at.desc())
-    total = query.count()
-    reviews = query.offset((page - 1) * per_page).limit(per_page).all()
+    try:
+        reviews, meta = _paginate(Review.query, Review.created_at, Review.id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    users = profile_utils.get_many({rv.reviewer_id for rv in reviews} | {rv.seller_id for rv in reviews})
     result = []
     for rv in reviews:
-        reviewer = db.session.get(User, rv.reviewer_id)
-        seller = db.session.get(User, rv.seller_id)
+        reviewer = users.get(rv.reviewer_id)
+        seller = users.get(rv.seller_id)
         result.append({
             "id": rv.id,
             "is_positive": rv.is_positive,
             "comment": rv.comment,
-            "reviewer_email": reviewer.email if reviewer else None,
-            "seller_email": seller.email if seller else None,
+            "reviewer_email": reviewer["email"] if reviewer else None,
+            "seller_email": seller["email"] if seller else None,
             "seller_id": rv.seller_id,
             "listing_id": rv.listing_id,
             "created_at": rv.created_at.isoformat() if rv.created_at else None,
         })
 
-    return jsonify({"reviews": result, "total": total, "page": page, "pages": (total + per_page - 1) // per_page})
+    return jsonify({"reviews": result, **meta})
 
 
 @admin_bp.delete("/reviews/<review_id>")
@@ -1,14 +1,15 @@
+import hashlib
 import os
 import uuid
-from datetime import datetime, timezone
 
-from flask import Blueprint, request, jsonify, current_app, send_from_directory, Response
+from flask import Blueprint, request, jsonify, current_app, send_from_directory
 from flask_login import login_user, logout_user, login_required, current_user
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 
 from extensions import db, limiter
 from models import User
 from email_utils import send_welcome, send_password_reset, send_verification_email
+from image_utils import ONE_YEAR, not_modified, send_image
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -22,8 +23,6 @@ def _verify_serializer():
 def me():
     if not current_user.is_authenticated:
         return jsonify({"authenticated": False}), 200
-    current_user.last_seen = datetime.now(timezone.utc)
-    db.session.commit()
     return jsonify({
         "authenticated": True,
         "user": {
@@ -109,9 +108,12 @@ def upload_avatar():
     if ext not in mime_map:
         return jsonify({"error": "Only jpg/jpeg/png/webp allowed"}), 400
 
-    current_user.avatar_data = f.read()
+    data = f.read()
+    current_user.avatar_data = data
     current_user.avatar_mime = mime_map[ext]
-    current_user.avatar_url = f"/api/auth/avatars/{current_user.id}"
+    current_user.avatar_hash = hashlib.sha256(data).hexdigest()
+    # Versioned URL: a new upload gets a new URL, so the old one can be cached forever
+    current_user.avatar_url = f"/api/auth/avatars/{current_user.id}?v={current_user.avatar_hash[:12]}"
     db.session.commit()
 
     return jsonify({"ok": True, "avatar_url": current_user.avatar_url}), 200
@@ -119,10 +121,24 @@ def upload_avatar():
 
 @auth_bp.get("/avatars/<path:user_id>")
 def serve_avatar(user_id):
-    u = db.session.get(User, user_id)
-    if not u or not u.avatar_data:
+    meta = db.session.query(User.avatar_hash, User.avatar_mime).filter_by(id=user_id).first()
+    if not meta:
+        return jsonify({"error": "Not found"}), 404
+
+    # ?v= matching the current hash names exactly these bytes
+    etag = meta.avatar_hash
+    versioned = bool(etag) and request.args.get("v") == etag[:12]
+    max_age = ONE_YEAR if versioned else 3600
+    if etag:
+        cached = not_modified(etag, max_age, immutable=versioned)
+        if cached:
+            return cached
+
+    data = db.session.query(User.avatar_data).filter_by(id=user_id).scalar()
+    if not data:
         return jsonify({"error": "Not found"}), 404
-    return Response(u.avatar_data, mimetype=u.avatar_mime, headers={"Cache-Control": "public, max-age=3600"})
+    etag = etag or hashlib.sha256(data).hexdigest()
+    return send_image(data, meta.avatar_mime, etag, max_age, immutable=versioned)
 
 
 @auth_bp.post("/forgot")
@@ -1,24 +1,15 @@
-import random
 import stripe
-from collections import defaultdict
 from datetime import datetime, timedelta
 from flask import Blueprint, jsonify, request, current_app
 from flask_login import current_user, login_required
 
+from carousel_utils import invalidate_carousel, pick_featured
+from counter_utils import record_boost_impressions
 from extensions import db
-from models import Boost, BoostImpression, Listing, ListingImage, Subscription, User
+from models import Boost, BoostImpressionDay, BoostStats, Listing, Subscription
 
 boosts_bp = Blueprint("boosts", __name__)
 
-# ── Configurable constants ──
-CAROUSEL_SIZE = 10              # max boosted slots shown per request
-PAID_BOOST_WEIGHT = 3           # paid boosts appear 3x more often
-FREE_PRO_BOOST_WEIGHT = 1       # free Pro boosts appear at base rate
-MAX_SLOTS_PER_SELLER = 2        # anti-spam: same seller can't fill more than 2 slots
-
-# Round-robin offset — rotates which group gets shown each request
-_rotation_offset = 0
-
 DURATIONS = [
     {"label": "24 Hours", "hours": 24, "price_usd": 3, "price_cents": 300, "config_key": "BOOST_24H_PRICE_ID"},
     {"label": "3 Days",   "hours": 72, "price_usd": 7, "price_cents": 700, "config_key": "BOOST_3D_PRICE_ID"},
@@ -53,96 +44,66 @@ def _seconds_until_reset():
 
 
 def _expire_stale_boosts():
-    """Expire any boosts past their ends_at. Called before boost operations."""
+    """Expire any boosts past their ends_at.
+
+    Only called from write paths and the cron sweeper — reads filter on
+    ends_at > now instead, so GET endpoints never take row locks.
+    """
     now = datetime.utcnow()
     count = Boost.query.filter(
         Boost.status == "active", Boost.ends_at <= now,
     ).update({"status": "expired"})
     if count:
         db.session.commit()
+        invalidate_carousel()
     return count
 
 
-def _listing_to_dict(l, imgs, seller, boost_ends_at=None):
-    """Serialize a listing for the featured response."""
-    d = {
-        "id": l.id,
-        "title": l.title,
-        "price_cents": l.price_cents,
-        "is_sold": l.is_sold,
-        "images": [i.image_url for i in imgs],
-        "is_pro_seller": bool(seller and seller.is_pro),
-        "created_at": l.created_at.isoformat(),
-    }
-    if boost_ends_at:
-        d["boost_ends_at"] = boost_ends_at.isoformat()
-    return d
-
-
 @boosts_bp.get("/featured")
 def featured():
-    global _rotation_offset
-    now = datetime.utcnow()
-    _expire_stale_boosts()
+    batch = pick_featured()
 
-    active = Boost.query.filter(
-        Boost.status == "active", Boost.ends_at > now,
-    ).order_by(Boost.created_at.asc()).all()
-
-    # ── Weighted selection ──
-    # Build a weighted pool: paid boosts get PAID_BOOST_WEIGHT entries,
-    # free Pro boosts get FREE_PRO_BOOST_WEIGHT entries
-    weighted_pool = []
-    for b in active:
-        weight = PAID_BOOST_WEIGHT if b.boost_type == "paid" else FREE_PRO_BOOST_WEIGHT
-        weighted_pool.extend([b] * weight)
-
-    # Shuffle the weighted pool for randomness
-    random.shuffle(weighted_pool)
-
-    # ── Pick slots with anti-spam ──
-    # Same seller can only fill MAX_SLOTS_PER_SELLER slots
-    seller_count = defaultdict(int)
-    seen_listings = set()
-    batch = []
-
-    for b in weighted_pool:
-        if len(batch) >= CAROUSEL_SIZE:
-            break
-        # No duplicate listings
-        if b.listing_id in seen_listings:
-            continue
-        # Look up listing to get seller_id
-        listing = db.session.get(Listing, b.listing_id)
-        if not listing or listing.is_draft or listing.is_sold:
-            continue
-        # Anti-spam: cap per seller
-        if seller_count[listing.user_id] >= MAX_SLOTS_PER_SELLER:
-            continue
-        batch.append(b)
-        seen_listings.add(b.listing_id)
-        seller_count[listing.user_id] += 1
-
-    # Record impressions
+    # Buffered into per-hour buckets; no database write on the request path
     viewer_id = current_user.id if current_user.is_authenticated else None
-    for b in batch:
-        db.session.add(BoostImpression(boost_id=b.id, viewer_user_id=viewer_id))
-    if batch:
-        db.session.commit()
+    record_boost_impressions([c["boost_id"] for c in batch], viewer_id)
+
+    return jsonify({
+        "featured_listing_ids": [c["listing_id"] for c in batch],
+        "featured_listings": [c["card"] for c in batch],
+    }), 200
 
-    # Build listing data for boosted items
-    listing_ids = [b.listing_id for b in batch]
-    boost_ends_map = {b.listing_id: b.ends_at for b in batch}
-    featured_listings = []
-    for lid in listing_ids:
-        l = db.session.get(Listing, lid)
-        if not l:
-            continue
-        imgs = ListingImage.query.filter_by(listing_id=l.id).order_by(ListingImage.created_at.asc()).all()
-        seller = db.session.get(User, l.user_id)
-        featured_listings.append(_listing_to_dict(l, imgs, seller, boost_ends_map.get(lid)))
 
-    return jsonify({"featured_listing_ids": listing_ids, "featured_listings": featured_listings}), 200
+@boosts_bp.get("/<boost_id>/stats")
+@login_required
+def boost_stats(boost_id):
+    """What a boost delivered, served from the rollup tables (refreshed hourly)."""
+    b = db.session.get(Boost, boost_id)
+    if not b:
+        return jsonify({"error": "Boost not found"}), 404
+    owner_id = db.session.query(Listing.user_id).filter_by(id=b.listing_id).scalar()
+    if owner_id != current_user.id and not current_user.is_admin:
+        return jsonify({"error": "Forbidden"}), 403
+
+    stats = BoostStats.query.filter_by(boost_id=b.id).first()
+    days = BoostImpressionDay.query.filter_by(boost_id=b.id).order_by(BoostImpressionDay.day.asc()).all()
+    return jsonify({
+        "boost_id": b.id,
+        "listing_id": b.listing_id,
+        "boost_type": b.boost_type,
+        "status": b.status,
+        "starts_at": b.starts_at.isoformat(),
+        "ends_at": b.ends_at.isoformat(),
+        "impressions": stats.impressions if stats else 0,
+        "unique_viewers": stats.unique_viewers if stats else 0,
+        "listing_views": stats.listing_views if stats else 0,
+        "offers": stats.offers if stats else 0,
+        "final": bool(stats and stats.finalized),
+        "updated_at": stats.updated_at.isoformat() if stats else None,
+        "daily": [
+            {"day": d.day.isoformat(), "impressions": d.impressions, "unique_viewers": d.unique_viewers}
+            for d in days
+        ],
+    }), 200
 
 
 @boosts_bp.get("/durations")
@@ -164,7 +125,6 @@ def durations():
 @login_required
 def boost_status():
     """Return Pro boost status: whether free boost is available, countdown, etc."""
-    _expire_stale_boosts()
     is_pro = current_user.is_pro
     free_available = _free_boost_available(current_user)
     countdown_seconds = 0 if free_available else _seconds_until_reset()
@@ -1,9 +1,14 @@
+import json
 from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, timedelta
 
+from analytics_utils import rollup_boost_stats
 from extensions import db
-from models import Listing, Offer, User
-from email_utils import send_stale_listing_nudge
+from image_utils import gc_blobs
+from models import Listing, Offer, OutboxJob, User
+import outbox_utils
+from email_utils import render_stale_listing_nudge, send_email_batch
+from .boosts import _expire_stale_boosts
 
 cron_bp = Blueprint("cron", __name__)
 
@@ -20,21 +25,71 @@ def nudge_stale_listings():
         Listing.is_draft == False,
         Listing.nudged_at == None,
     ).all()
+    # nudged_at is only set once a batch is sent, so skip listings still queued
+    queued = set()
+    for payload, in db.session.query(OutboxJob.payload).filter(
+        OutboxJob.kind == "email_batch", OutboxJob.status == "pending",
+        OutboxJob.payload.contains('"nudge_listing_id"'),
+    ):
+        queued.update(e.get("nudge_listing_id") for e in json.loads(payload)["emails"])
 
-    nudged = 0
+    emails = []
     for listing in stale:
+        if listing.id in queued:
+            continue
         if Offer.query.filter_by(listing_id=listing.id).count() > 0:
             continue
         seller = db.session.get(User, listing.user_id)
         if not seller:
             continue
         days_old = (datetime.utcnow() - listing.created_at).days
-        try:
-            send_stale_listing_nudge(seller.email, seller.display_name, listing.title, listing.id, days_old)
-            listing.nudged_at = datetime.utcnow()
-            nudged += 1
-        except Exception as e:
-            current_app.logger.error(f"Nudge failed for {listing.id}: {e}")
+        emails.append(render_stale_listing_nudge(seller.email, seller.display_name, listing.title, listing.id, days_old))
 
+    send_email_batch(emails)
+    nudged = len(emails)
     db.session.commit()
     return jsonify({"ok": True, "stale_found": len(stale), "nudged": nudged}), 200
+
+
+@cron_bp.post("/expire-boosts")
+def expire_boosts():
+    """Flip boosts past their ends_at to expired. Run every few minutes."""
+    if request.headers.get("X-Cron-Secret") != current_app.config.get("CRON_SECRET"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    expired = _expire_stale_boosts()
+    return jsonify({"ok": True, "expired": expired}), 200
+
+
+@cron_bp.post("/rollup-boost-stats")
+def rollup_boost_stats_job():
+    """Compact boost impressions into hourly/daily rollups and prune raw rows. Run hourly."""
+    if request.headers.get("X-Cron-Secret") != current_app.config.get("CRON_SECRET"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        summary = rollup_boost_stats()
+    except Exception as e:
+        current_app.logger.error(f"Boost stats rollup failed: {e}")
+        return jsonify({"error": "Rollup failed"}), 500
+    return jsonify({"ok": True, **summary}), 200
+
+
+@cron_bp.post("/drain-outbox")
+def drain_outbox():
+    """Deliver due outbox emails/pushes. Only needed where OUTBOX_WORKER is off."""
+    if request.headers.get("X-Cron-Secret") != current_app.config.get("CRON_SECRET"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    sent = outbox_utils.drain_outbox()
+    return jsonify({"ok": True, "attempted": sent}), 200
+
+
+@cron_bp.post("/gc-blobs")
+def gc_blobs_job():
+    """Delete image blobs nothing references any more (see image_utils.release_blobs). Run daily."""
+    if request.headers.get("X-Cron-Secret") != current_app.config.get("CRON_SECRET"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    deleted = gc_blobs(current_app.config.get("BLOB_GC_MIN_AGE_HOURS", 24) * 3600)
+    return jsonify({"ok": True, "deleted": deleted}), 200
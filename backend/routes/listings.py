@@ -1,74 +1,146 @@
 import os
 import uuid
+from collections import defaultdict
 from datetime import datetime, timedelta
-from flask import Blueprint, request, jsonify, current_app, send_from_directory, Response
+from flask import Blueprint, request, jsonify, current_app, send_from_directory
 from flask_login import login_required, current_user
 
-from sqlalchemy import func
 from extensions import db
+from blob_store import get_blob_store
+from cache_utils import FEED_TAG, cache_get, cache_set, cached, listing_key, seller_tag
+from counter_utils import record_listing_view
+from fanout_utils import queue_listing_change
+from geo_utils import apply_radius_filter, geohash_encode, haversine_km
+from image_utils import (
+    ONE_YEAR, build_preview, finish_image, image_blob_keys, not_modified, pick_variant, process_images,
+    process_images_later, release_blobs, send_image, variant_srcsets,
+)
+from pagination_utils import paginate
+import profile_utils
+from search_utils import apply_text_search
 from models import (
-    Listing, ListingImage, SafeMeetLocation, Boost, BoostImpression,
-    Observing, Notification, User, PriceHistory, ListingView,
+    Listing, ListingImage, ListingImageVariant, SafeMeetLocation, Boost, BoostImpression, BoostImpressionHour, BoostImpressionDay, BoostStats,
+    Observing, Notification, PriceHistory, ListingView, ListingViewHour,
     Conversation, Message, SafetyAckEvent, Offer, Report, Review, MeetupConfirmation,
 )
 
 listings_bp = Blueprint("listings", __name__)
 
-def _listing_to_dict(l: Listing):
-    imgs = ListingImage.query.filter_by(listing_id=l.id).order_by(ListingImage.created_at.asc()).all()
-    meet = SafeMeetLocation.query.filter_by(listing_id=l.id).first()
-    # Expire stale boosts for this listing so is_boosted is accurate
+# sort name -> (key column, descending); ties are broken by Listing.id
+SORT_MAP = {
+    "newest": (Listing.created_at, True),
+    "oldest": (Listing.created_at, False),
+    "price_low": (Listing.price_cents, False),
+    "price_high": (Listing.price_cents, True),
+}
+
+def _listings_to_dicts(listings):
+    """Serialize many listings at once with one grouped query per related table."""
+    listings = list(listings)
+    if not listings:
+        return []
+    ids = [l.id for l in listings]
+    seller_ids = list({l.user_id for l in listings})
     now = datetime.utcnow()
-    stale = Boost.query.filter(
-        Boost.listing_id == l.id, Boost.status == "active", Boost.ends_at <= now,
-    ).update({"status": "expired"})
-    if stale:
-        db.session.commit()
-    active_boost = Boost.query.filter(
-        Boost.listing_id == l.id,
+
+    imgs_by_listing = defaultdict(list)
+    for lid, image_id, url in db.session.query(
+        ListingImage.listing_id, ListingImage.id, ListingImage.image_url,
+    ).filter(ListingImage.listing_id.in_(ids)).order_by(ListingImage.created_at.asc()):
+        imgs_by_listing[lid].append((image_id, url))
+    srcsets = variant_srcsets([i for imgs in imgs_by_listing.values() for i, _ in imgs])
+
+    meet_by_listing = {}
+    for meet in SafeMeetLocation.query.filter(SafeMeetLocation.listing_id.in_(ids)):
+        meet_by_listing.setdefault(meet.listing_id, meet)
+
+    # Boosts past ends_at count as expired even before the cron sweeper
+    # flips their status, so reads never need to write.
+    boost_by_listing = {}
+    for b in Boost.query.filter(
+        Boost.listing_id.in_(ids),
         Boost.status == "active",
-        Boost.ends_at > now
-    ).first()
-    observing_count = db.session.query(func.count(Observing.id)).filter_by(listing_id=l.id).scalar()
-    view_count = db.session.query(func.count(ListingView.id)).filter_by(listing_id=l.id).scalar()
-
-    seller = db.session.get(User, l.user_id)
-    return {
-        "id": l.id,
-        "user_id": l.user_id,
-        "seller_name": (seller.display_name or seller.email) if seller else "Unknown",
-        "seller_avatar": seller.avatar_url if seller else None,
-        "title": l.title,
-        "description": l.description,
-        "price_cents": l.price_cents,
-        "category": l.category,
-        "condition": l.condition,
-        "city": l.city,
-        "zip": l.zip,
-        "lat": l.lat,
-        "lng": l.lng,
-        "pickup_or_shipping": l.pickup_or_shipping,
-        "is_sold": l.is_sold,
-        "created_at": l.created_at.isoformat(),
-        "images": [i.image_url for i in imgs],
-        "safe_meet": None if not meet else {
-            "place_name": meet.place_name,
-            "address": meet.address,
-            "lat": float(meet.lat),
-            "lng": float(meet.lng),
-            "place_type": meet.place_type
-        },
-        "renewed_at": l.renewed_at.isoformat() if l.renewed_at else None,
-        "bundle_discount_pct": l.bundle_discount_pct,
-        "is_boosted": bool(active_boost),
-        "boost_ends_at": active_boost.ends_at.isoformat() if active_boost else None,
-        "observing_count": observing_count,
-        "view_count": view_count,
-        "is_pro_seller": bool(seller and seller.is_pro),
-        "is_verified_seller": bool(seller and seller.is_verified),
-        "seller_rating_avg": float(seller.rating_avg) if seller and seller.rating_avg else 0,
-        "seller_rating_count": seller.rating_count if seller else 0,
-    }
+        Boost.ends_at > now,
+    ):
+        boost_by_listing.setdefault(b.listing_id, b)
+
+    sellers = profile_utils.get_many(seller_ids)
+
+    result = []
+    for l in listings:
+        meet = meet_by_listing.get(l.id)
+        active_boost = boost_by_listing.get(l.id)
+        seller = sellers.get(l.user_id)
+        result.append({
+            "id": l.id,
+            "user_id": l.user_id,
+            "seller_name": profile_utils.display_name(seller),
+            "seller_avatar": seller["avatar_url"] if seller else None,
+            "title": l.title,
+            "description": l.description,
+            "price_cents": l.price_cents,
+            "category": l.category,
+            "condition": l.condition,
+            "city": l.city,
+            "zip": l.zip,
+            "lat": l.lat,
+            "lng": l.lng,
+            "pickup_or_shipping": l.pickup_or_shipping,
+            "is_sold": l.is_sold,
+            "created_at": l.created_at.isoformat(),
+            "images": [url for _, url in imgs_by_listing.get(l.id, [])],
+            "image_srcsets": [srcsets.get(i, {}) for i, _ in imgs_by_listing.get(l.id, [])],
+            "safe_meet": None if not meet else {
+                "place_name": meet.place_name,
+                "address": meet.address,
+                "lat": float(meet.lat),
+                "lng": float(meet.lng),
+                "place_type": meet.place_type
+            },
+            "renewed_at": l.renewed_at.isoformat() if l.renewed_at else None,
+            "bundle_discount_pct": l.bundle_discount_pct,
+            "is_boosted": bool(active_boost),
+            "boost_ends_at": active_boost.ends_at.isoformat() if active_boost else None,
+            "observing_count": l.observing_count or 0,
+            "view_count": l.view_count or 0,
+            "is_pro_seller": bool(seller and seller["is_pro"]),
+            "is_verified_seller": bool(seller and seller["is_verified"]),
+            "seller_rating_avg": seller["rating_avg"] if seller else 0,
+            "seller_rating_count": seller["rating_count"] if seller else 0,
+        })
+    return result
+
+
+def _listing_to_dict(l: Listing):
+    return _listings_to_dicts([l])[0]
+
+
+def _delete_listing_images(listing_id):
+    """Delete a listing's images. Returns their blob keys, for release_blobs() after commit."""
+    image_ids = db.session.query(ListingImage.id).filter_by(listing_id=listing_id)
+    keys = image_blob_keys(image_ids)
+    ListingImageVariant.query.filter(ListingImageVariant.image_id.in_(image_ids)).delete(synchronize_session=False)
+    ListingImage.query.filter_by(listing_id=listing_id).delete()
+    return keys
+
+
+def _cache_ttl(dicts, ttl):
+    """Cap a cache TTL so no cached listing outlives its boost's is_boosted flag."""
+    now = datetime.utcnow()
+    for d in dicts:
+        if d.get("boost_ends_at"):
+            ends = datetime.fromisoformat(d["boost_ends_at"]).replace(tzinfo=None)
+            ttl = min(ttl, max(int((ends - now).total_seconds()), 0))
+    return ttl
+
+
+def _add_distances(dicts, lat, lng):
+    """Attach distance_km from the searcher to each serialized listing."""
+    for d in dicts:
+        if d["lat"] is not None and d["lng"] is not None:
+            d["distance_km"] = round(haversine_km(lat, lng, d["lat"], d["lng"]), 2)
+        else:
+            d["distance_km"] = None
 
 @listings_bp.get("/uploads/<path:filename>")
 def uploads(filename):
@@ -78,28 +150,66 @@ def uploads(filename):
 
 @listings_bp.get("/image/<image_id>")
 def serve_image(image_id):
-    """Serve listing image from database storage."""
-    img = db.session.get(ListingImage, image_id)
-    if not img or not img.image_data:
+    """Serve a listing image from the blob store (or legacy DB storage).
+
+    ?w= picks the smallest variant at least that wide; without it the
+    largest is served. The format is negotiated from Accept on every URL,
+    plain ones included (AVIF/WebP, else JPEG), so clients that do not
+    name a modern format always get JPEG. Every variant is immutable, so
+    revalidation is answered from the metadata rows alone.
+    """
+    meta = db.session.query(
+        ListingImage.blob_key, ListingImage.image_mime, ListingImage.created_at, ListingImage.status,
+    ).filter_by(id=image_id).first()
+    if not meta or meta.status == "failed":
         return jsonify({"error": "Not found"}), 404
-    return Response(
-        img.image_data,
-        mimetype=img.image_mime or "image/jpeg",
-        headers={"Cache-Control": "public, max-age=86400"},
-    )
+    # A pending image serves its preview, whose bytes change once processed
+    max_age, immutable = (ONE_YEAR, True) if meta.status == "ready" else (60, False)
+
+    variants = db.session.query(
+        ListingImageVariant.width, ListingImageVariant.mime, ListingImageVariant.blob_key,
+    ).filter_by(image_id=image_id).all()
+    if variants:
+        chosen = pick_variant(variants, request.args.get("w", type=int))
+        mimetype, blob_key = chosen.mime, chosen.blob_key
+    else:
+        mimetype, blob_key = meta.image_mime or "image/jpeg", meta.blob_key
+    etag = blob_key or image_id
+
+    resp_304 = not_modified(etag, max_age, immutable=immutable)
+    if resp_304:
+        if variants:
+            resp_304.vary.add("Accept")
+        return resp_304
+
+    if blob_key:
+        store = get_blob_store()
+        source = store.path(blob_key)
+        if source and not os.path.exists(source):
+            source = None
+        elif not source:
+            source = store.get(blob_key)
+    else:
+        source = db.session.query(ListingImage.image_data).filter_by(id=image_id).scalar()
+    if not source:
+        return jsonify({"error": "Not found"}), 404
+    resp = send_image(source, mimetype, etag, max_age, immutable=immutable, last_modified=meta.created_at)
+    if variants:
+        resp.vary.add("Accept")
+    return resp
 
 @listings_bp.get("/mine")
 @login_required
 def my_listings():
     rows = Listing.query.filter_by(user_id=current_user.id).order_by(Listing.created_at.desc()).all()
-    return jsonify({"listings": [_listing_to_dict(l) for l in rows]}), 200
+    return jsonify({"listings": _listings_to_dicts(rows)}), 200
 
 
 @listings_bp.get("/purchases")
 @login_required
 def purchases():
     rows = Listing.query.filter_by(buyer_id=current_user.id).order_by(Listing.created_at.desc()).all()
-    return jsonify({"purchases": [_listing_to_dict(l) for l in rows]}), 200
+    return jsonify({"purchases": _listings_to_dicts(rows)}), 200
 
 
 @listings_bp.get("/my-stats")
@@ -111,12 +221,7 @@ def my_stats():
     total_earned = sum(l.price_cents for l in listings if l.is_sold)
     active = sum(1 for l in listings if not l.is_sold)
 
-    listing_ids = [l.id for l in listings]
-    total_views = 0
-    if listing_ids:
-        total_views = db.session.query(func.count(ListingView.id)).filter(
-            ListingView.listing_id.in_(listing_ids)
-        ).scalar() or 0
+    total_views = sum(l.view_count or 0 for l in listings)
 
     return jsonify({
         "stats": {
@@ -133,7 +238,7 @@ def my_stats():
 @login_required
 def my_drafts():
     rows = Listing.query.filter_by(user_id=current_user.id, is_draft=True).order_by(Listing.created_at.desc()).all()
-    return jsonify({"listings": [_listing_to_dict(l) for l in rows]}), 200
+    return jsonify({"listings": _listings_to_dicts(rows)}), 200
 
 
 @listings_bp.post("/bulk")
@@ -146,6 +251,7 @@ def bulk_action():
         return jsonify({"error": "Invalid action or no listings"}), 400
 
     count = 0
+    blob_keys = set()
     for lid in ids:
         l = db.session.get(Listing, lid)
         if not l or l.user_id != current_user.id:
@@ -157,12 +263,15 @@ def bulk_action():
             boost_ids = [b.id for b in Boost.query.filter_by(listing_id=l.id).all()]
             if boost_ids:
                 BoostImpression.query.filter(BoostImpression.boost_id.in_(boost_ids)).delete(synchronize_session=False)
+                BoostImpressionHour.query.filter(BoostImpressionHour.boost_id.in_(boost_ids)).delete(synchronize_session=False)
+                BoostImpressionDay.query.filter(BoostImpressionDay.boost_id.in_(boost_ids)).delete(synchronize_session=False)
+                BoostStats.query.filter(BoostStats.boost_id.in_(boost_ids)).delete(synchronize_session=False)
             Boost.query.filter_by(listing_id=l.id).delete()
             conv_ids = [c.id for c in Conversation.query.filter_by(listing_id=l.id).all()]
             if conv_ids:
                 Message.query.filter(Message.conversation_id.in_(conv_ids)).delete(synchronize_session=False)
             Conversation.query.filter_by(listing_id=l.id).delete()
-            ListingImage.query.filter_by(listing_id=l.id).delete()
+            blob_keys |= _delete_listing_images(l.id)
             SafeMeetLocation.query.filter_by(listing_id=l.id).delete()
             SafetyAckEvent.query.filter_by(listing_id=l.id).delete()
             Observing.query.filter_by(listing_id=l.id).delete()
@@ -172,6 +281,7 @@ def bulk_action():
             Review.query.filter_by(listing_id=l.id).delete()
             Report.query.filter_by(listing_id=l.id).delete()
             ListingView.query.filter_by(listing_id=l.id).delete()
+            ListingViewHour.query.filter_by(listing_id=l.id).delete()
             MeetupConfirmation.query.filter_by(listing_id=l.id).delete()
             db.session.delete(l)
         elif action == "renew":
@@ -179,6 +289,7 @@ def bulk_action():
         count += 1
 
     db.session.commit()
+    release_blobs(blob_keys)
     return jsonify({"ok": True, "affected": count}), 200
 
 
@@ -227,16 +338,13 @@ def search():
     sort = (request.args.get("sort") or "newest").strip()
     page = max(int(request.args.get("page", 1)), 1)
     per_page = min(max(int(request.args.get("per_page", 20)), 1), 100)
+    cursor = request.args.get("cursor")
 
     query = Listing.query.filter(Listing.is_sold == False, Listing.is_draft == False)
 
+    rank = None
     if q:
-        query = query.filter(
-            db.or_(
-                Listing.title.ilike(f"%{q}%"),
-                Listing.description.ilike(f"%{q}%"),
-            )
-        )
+        query, rank = apply_text_search(query, q)
     if category:
         query = query.filter_by(category=category)
     if city:
@@ -262,32 +370,33 @@ def search():
     user_lng = request.args.get("lng", type=float)
     radius_km = request.args.get("radius_km", 50, type=float)
 
+    distance = None
     if user_lat is not None and user_lng is not None:
-        import math
-        lat_delta = radius_km / 111.0
-        lng_delta = radius_km / (111.0 * max(math.cos(math.radians(user_lat)), 0.01))
-        query = query.filter(
-            Listing.lat.isnot(None),
-            Listing.lng.isnot(None),
-            Listing.lat.between(user_lat - lat_delta, user_lat + lat_delta),
-            Listing.lng.between(user_lng - lng_delta, user_lng + lng_delta),
-        )
+        query, distance = apply_radius_filter(query, user_lat, user_lng, radius_km)
 
     sort_map = {
-        "newest": Listing.created_at.desc(),
-        "oldest": Listing.created_at.asc(),
-        "price_low": Listing.price_cents.asc(),
-        "price_high": Listing.price_cents.desc(),
+        **SORT_MAP,
+        # Without a text index (ILIKE fallback) relevance degrades to newest
+        "relevance": (rank, True) if rank is not None else SORT_MAP["newest"],
     }
-    order = sort_map.get(sort, Listing.created_at.desc())
-
-    results = query.order_by(order).limit(per_page + 1).offset((page - 1) * per_page).all()
-    has_more = len(results) > per_page
-    results = results[:per_page]
-    dicts = [_listing_to_dict(l) for l in results]
-    if sort == "newest" or sort not in sort_map:
+    if distance is not None:
+        sort_map["distance"] = (distance, False)
+    if sort not in sort_map:
+        sort = "newest"
+    sort_expr, descending = sort_map[sort]
+
+    try:
+        results, has_more, next_cursor = paginate(
+            query, sort, sort_expr, descending, Listing.id, per_page, cursor=cursor, page=page,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    dicts = _listings_to_dicts(results)
+    if distance is not None:
+        _add_distances(dicts, user_lat, user_lng)
+    if sort == "newest":
         dicts.sort(key=lambda d: (not d["is_pro_seller"], 0))
-    return jsonify({"listings": dicts, "page": page, "has_more": has_more}), 200
+    return jsonify({"listings": dicts, "page": page, "has_more": has_more, "next_cursor": next_cursor}), 200
 
 
 @listings_bp.get("")
@@ -295,47 +404,59 @@ def feed():
     page = max(int(request.args.get("page", 1)), 1)
     per_page = min(max(int(request.args.get("per_page", 20)), 1), 100)
     sort = (request.args.get("sort") or "newest").strip()
+    cursor = request.args.get("cursor")
 
-    sort_map = {
-        "newest": Listing.created_at.desc(),
-        "oldest": Listing.created_at.asc(),
-        "price_low": Listing.price_cents.asc(),
-        "price_high": Listing.price_cents.desc(),
-    }
-    order = sort_map.get(sort, Listing.created_at.desc())
-
-    query = Listing.query.filter_by(is_draft=False).order_by(order)
+    query = Listing.query.filter_by(is_draft=False)
 
     user_lat = request.args.get("lat", type=float)
     user_lng = request.args.get("lng", type=float)
     radius_km = request.args.get("radius_km", 50, type=float)
 
+    distance = None
     if user_lat is not None and user_lng is not None:
-        import math
-        lat_delta = radius_km / 111.0
-        lng_delta = radius_km / (111.0 * max(math.cos(math.radians(user_lat)), 0.01))
-        query = query.filter(
-            Listing.lat.isnot(None),
-            Listing.lng.isnot(None),
-            Listing.lat.between(user_lat - lat_delta, user_lat + lat_delta),
-            Listing.lng.between(user_lng - lng_delta, user_lng + lng_delta),
+        query, distance = apply_radius_filter(query, user_lat, user_lng, radius_km)
+
+    sort_map = dict(SORT_MAP)
+    if distance is not None:
+        sort_map["distance"] = (distance, False)
+    if sort not in sort_map:
+        sort = "newest"
+    sort_expr, descending = sort_map[sort]
+
+    def _load():
+        listings, has_more, next_cursor = paginate(
+            query, sort, sort_expr, descending, Listing.id, per_page, cursor=cursor, page=page,
         )
-
-    total_query = query.limit(per_page + 1).offset((page - 1) * per_page).all()
-    has_more = len(total_query) > per_page
-    listings = total_query[:per_page]
-
-    dicts = [_listing_to_dict(l) for l in listings]
-    if sort == "newest" or sort not in sort_map:
-        dicts.sort(key=lambda d: (not d["is_pro_seller"], 0))
-    return jsonify({"listings": dicts, "page": page, "has_more": has_more}), 200
+        dicts = _listings_to_dicts(listings)
+        if distance is not None:
+            _add_distances(dicts, user_lat, user_lng)
+        if sort == "newest":
+            dicts.sort(key=lambda d: (not d["is_pro_seller"], 0))
+        body = {"listings": dicts, "page": page, "has_more": has_more, "next_cursor": next_cursor}
+        return body, _cache_ttl(dicts, current_app.config.get("FEED_CACHE_SECONDS", 30))
+
+    try:
+        # Only the shared first page is cached; deeper and nearby pages vary too much
+        if page == 1 and not cursor and distance is None:
+            body = cached(f"feed:{sort}:{per_page}", current_app.config.get("FEED_CACHE_SECONDS", 30), _load, tags=(FEED_TAG,))
+        else:
+            body, _ = _load()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(body), 200
 
 @listings_bp.get("/<listing_id>")
 def get_listing(listing_id):
-    l = db.session.get(Listing, listing_id)
-    if not l:
-        return jsonify({"error": "Not found"}), 404
-    return jsonify({"listing": _listing_to_dict(l)}), 200
+    key = listing_key(listing_id)
+    d = cache_get(key)
+    if d is None:
+        l = db.session.get(Listing, listing_id)
+        if not l:
+            return jsonify({"error": "Not found"}), 404
+        d = _listing_to_dict(l)
+        ttl = _cache_ttl([d], current_app.config.get("LISTING_CACHE_SECONDS", 60))
+        cache_set(key, d, ttl, tags=(seller_tag(l.user_id),))
+    return jsonify({"listing": d}), 200
 
 @listings_bp.post("")
 @login_required
@@ -360,6 +481,8 @@ def create_listing():
         pickup_or_shipping=(data.get("pickup_or_shipping") or "pickup").strip(),
         is_draft=bool(data.get("is_draft", False)),
     )
+    if l.lat is not None and l.lng is not None:
+        l.geohash = geohash_encode(float(l.lat), float(l.lng))
 
     if not l.is_draft and l.price_cents <= 0:
         return jsonify({"error": "price_cents must be > 0"}), 400
@@ -404,44 +527,9 @@ def update_listing(listing_id):
 
     db.session.commit()
 
-    # Notify observers about meaningful changes
-    messages = []
-    if "price_cents" in data and l.price_cents != old_price:
-        old_d = old_price / 100
-        new_d = l.price_cents / 100
-        if l.price_cents < old_price:
-            messages.append(f'Price dropped on "{l.title}": ${old_d:.0f} → ${new_d:.0f}')
-        else:
-            messages.append(f'Price changed on "{l.title}": ${old_d:.0f} → ${new_d:.0f}')
-    if "is_sold" in data and l.is_sold != old_sold:
-        if l.is_sold:
-            messages.append(f'"{l.title}" has been marked as sold')
-        else:
-            messages.append(f'"{l.title}" is available again!')
-
-    if messages:
-        is_price_drop = "price_cents" in data and l.price_cents < old_price
-        observers = Observing.query.filter_by(listing_id=l.id).all()
-        for obs in observers:
-            if obs.user_id == current_user.id:
-                continue
-            for msg in messages:
-                db.session.add(Notification(user_id=obs.user_id, listing_id=l.id, message=msg))
-            if is_price_drop:
-                obs_user = db.session.get(User, obs.user_id)
-                if obs_user:
-                    try:
-                        from email_utils import send_price_drop_alert
-                        send_price_drop_alert(obs_user.email, obs_user.display_name, l.title, l.id, old_price, l.price_cents)
-                    except Exception:
-                        pass
-                    try:
-                        from push_utils import send_push_to_user
-                        new_d = l.price_cents / 100
-                        send_push_to_user(obs.user_id, "Price Drop!", f"{l.title} dropped to ${new_d:.2f}", url=f"/listing/{l.id}", tag=f"price_drop_{l.id}")
-                    except Exception:
-                        pass
-        db.session.commit()
+    # Observers are notified by a delayed, coalesced job (see fanout_utils)
+    if ("price_cents" in data and l.price_cents != old_price) or ("is_sold" in data and l.is_sold != old_sold):
+        queue_listing_change(l, old_price, old_sold, current_user.id)
 
     return jsonify({"ok": True, "listing": _listing_to_dict(l)}), 200
 
@@ -461,6 +549,9 @@ def delete_listing(listing_id):
     boost_ids = [b.id for b in Boost.query.filter_by(listing_id=lid).all()]
     if boost_ids:
         BoostImpression.query.filter(BoostImpression.boost_id.in_(boost_ids)).delete(synchronize_session=False)
+        BoostImpressionHour.query.filter(BoostImpressionHour.boost_id.in_(boost_ids)).delete(synchronize_session=False)
+        BoostImpressionDay.query.filter(BoostImpressionDay.boost_id.in_(boost_ids)).delete(synchronize_session=False)
+        BoostStats.query.filter(BoostStats.boost_id.in_(boost_ids)).delete(synchronize_session=False)
     Boost.query.filter_by(listing_id=lid).delete()
 
     # Messages → Conversations
@@ -470,7 +561,7 @@ def delete_listing(listing_id):
     Conversation.query.filter_by(listing_id=lid).delete()
 
     # All other direct FK references
-    ListingImage.query.filter_by(listing_id=lid).delete()
+    blob_keys = _delete_listing_images(lid)
     SafeMeetLocation.query.filter_by(listing_id=lid).delete()
     SafetyAckEvent.query.filter_by(listing_id=lid).delete()
     Observing.query.filter_by(listing_id=lid).delete()
@@ -480,10 +571,12 @@ def delete_listing(listing_id):
     Review.query.filter_by(listing_id=lid).delete()
     Report.query.filter_by(listing_id=lid).delete()
     ListingView.query.filter_by(listing_id=lid).delete()
+    ListingViewHour.query.filter_by(listing_id=lid).delete()
     MeetupConfirmation.query.filter_by(listing_id=lid).delete()
 
     db.session.delete(l)
     db.session.commit()
+    release_blobs(blob_keys)
     return jsonify({"ok": True}), 200
 
 @listings_bp.post("/<listing_id>/images")
@@ -507,39 +600,60 @@ def upload_images(listing_id):
     if existing + len(files) > max_photos:
         return jsonify({"error": f"Max {max_photos} photos{' (upgrade to Pro for 10)' if not current_user.is_pro else ''}"}), 400
 
-    saved = []
-    import tempfile
-    from image_utils import compress_image
-
+    blobs = []
     for f in files:
         ext = os.path.splitext(f.filename)[1].lower()
         if ext not in [".jpg",".jpeg",".png",".webp"]:
             return jsonify({"error": "Only jpg/jpeg/png/webp allowed"}), 400
+        blobs.append(f.read())
 
-        # Compress via temp file, then store bytes in DB
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-            tmp_path = tmp.name
-            f.save(tmp_path)
-        compress_image(tmp_path)
-        with open(tmp_path, "rb") as fh:
-            image_bytes = fh.read()
-        os.unlink(tmp_path)
+    if current_app.config.get("IMAGE_VARIANTS_ASYNC"):
+        return _upload_images_async(l, blobs)
 
-        img_record = ListingImage(
-            listing_id=l.id,
-            image_url="",  # placeholder, updated after flush
-            image_data=image_bytes,
-            image_mime="image/jpeg",  # compress_image always saves as JPEG
-        )
+    # Decode and encode every file in parallel on the worker pool
+    results = process_images(blobs)
+    if any(v is None for v in results):
+        return jsonify({"error": "Could not read image"}), 400
+
+    saved = []
+    for variants in results:
+        img_record = ListingImage(listing_id=l.id, image_url="")  # url set after flush
         db.session.add(img_record)
         db.session.flush()  # get the id
         img_record.image_url = f"/api/listings/image/{img_record.id}"
+        finish_image(img_record, variants)
         saved.append(img_record.image_url)
 
     db.session.commit()
     return jsonify({"ok": True, "images": saved}), 201
 
 
+def _upload_images_async(l, blobs):
+    """Store a metadata-free preview of each upload as a pending image and build variants in the background."""
+    previews = []
+    for data in blobs:
+        try:
+            previews.append(build_preview(data))
+        except Exception:
+            return jsonify({"error": "Could not read image"}), 400
+
+    store = get_blob_store()
+    records = []
+    for preview in previews:
+        img_record = ListingImage(
+            listing_id=l.id, image_url="", status="pending",
+            blob_key=store.put(preview, "image/jpeg"), byte_size=len(preview), image_mime="image/jpeg",
+        )
+        db.session.add(img_record)
+        db.session.flush()
+        img_record.image_url = f"/api/listings/image/{img_record.id}"
+        records.append(img_record)
+    db.session.commit()
+
+    process_images_later([(r.id, data) for r, data in zip(records, blobs)])
+    return jsonify({"ok": True, "images": [r.image_url for r in records], "pending": True}), 202
+
+
 @listings_bp.delete("/<listing_id>/images/<image_id>")
 @login_required
 def delete_listing_image(listing_id, image_id):
@@ -553,33 +667,40 @@ def delete_listing_image(listing_id, image_id):
     if not img or img.listing_id != l.id:
         return jsonify({"error": "Image not found"}), 404
 
+    blob_keys = image_blob_keys([img.id])
+    ListingImageVariant.query.filter_by(image_id=img.id).delete()
     db.session.delete(img)
     db.session.commit()
+    release_blobs(blob_keys)
     return jsonify({"ok": True}), 200
 
 
 @listings_bp.get("/<listing_id>/similar")
 def similar_listings(listing_id):
-    l = db.session.get(Listing, listing_id)
-    if not l:
-        return jsonify({"listings": []}), 200
-
-    similar = Listing.query.filter(
-        Listing.category == l.category,
-        Listing.id != l.id,
-        Listing.is_sold == False,
-    ).order_by(Listing.created_at.desc()).limit(6).all()
-
-    result = []
-    for s in similar:
-        img = ListingImage.query.filter_by(listing_id=s.id).order_by(ListingImage.created_at.asc()).first()
-        result.append({
-            "id": s.id,
-            "title": s.title,
-            "price_cents": s.price_cents,
-            "image": img.image_url if img else None,
-            "created_at": s.created_at.isoformat(),
-        })
+    def _load():
+        l = db.session.get(Listing, listing_id)
+        if not l:
+            return []
+
+        similar = Listing.query.filter(
+            Listing.category == l.category,
+            Listing.id != l.id,
+            Listing.is_sold == False,
+        ).order_by(Listing.created_at.desc()).limit(6).all()
+
+        result = []
+        for s in similar:
+            img = ListingImage.query.filter_by(listing_id=s.id).order_by(ListingImage.created_at.asc()).first()
+            result.append({
+                "id": s.id,
+                "title": s.title,
+                "price_cents": s.price_cents,
+                "image": img.image_url if img else None,
+                "created_at": s.created_at.isoformat(),
+            })
+        return result
+
+    result = cached(f"similar:{listing_id}", current_app.config.get("LISTING_CACHE_SECONDS", 60), _load, tags=(FEED_TAG,))
     return jsonify({"listings": result}), 200
 
 
@@ -634,15 +755,14 @@ def reorder_images(listing_id):
 @listings_bp.post("/<listing_id>/view")
 def track_view(listing_id):
     from flask_login import current_user as cu
-    l = db.session.get(Listing, listing_id)
-    if not l:
+    owner_id = db.session.query(Listing.user_id).filter_by(id=listing_id).scalar()
+    if not owner_id:
         return jsonify({"error": "Not found"}), 404
     viewer_id = cu.id if hasattr(cu, 'id') and cu.is_authenticated else None
     # Don't track owner views
-    if viewer_id and viewer_id == l.user_id:
+    if viewer_id and viewer_id == owner_id:
         return jsonify({"ok": True}), 200
-    db.session.add(ListingView(listing_id=listing_id, viewer_id=viewer_id))
-    db.session.commit()
+    record_listing_view(listing_id)
     return jsonify({"ok": True}), 200
 
 
@@ -2,25 +2,109 @@ import os, uuid
 from datetime import datetime, timedelta, timezone
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
+from sqlalchemy import and_, case, func, or_, select
 
 from extensions import db, limiter
 from models import Conversation, Message, Listing, User, ListingImage
+from realtime_utils import publish
+import profile_utils
 
 messages_bp = Blueprint("messages", __name__)
 
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
+
+def _message_cursor(conversation_id, value):
+    """Resolve an after=/before= value to (created_at, id).
+
+    Accepts a message id from this conversation or an ISO timestamp (id is
+    then None). Raises ValueError for anything else.
+    """
+    if not value:
+        return None
+    row = db.session.query(Message.created_at, Message.id).filter_by(
+        id=value, conversation_id=conversation_id,
+    ).first()
+    if row:
+        return row.created_at, row.id
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError("Cursor must be a message id or ISO timestamp")
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts, None
+
+
+def _after(created_at, msg_id):
+    """Messages strictly after the cursor in (created_at, id) order."""
+    if msg_id is None:
+        return Message.created_at > created_at
+    return or_(Message.created_at > created_at, and_(Message.created_at == created_at, Message.id > msg_id))
+
+
+def _before(created_at, msg_id):
+    """Messages strictly before the cursor in (created_at, id) order."""
+    if msg_id is None:
+        return Message.created_at < created_at
+    return or_(Message.created_at < created_at, and_(Message.created_at == created_at, Message.id < msg_id))
+
+
+def _message_dict(m):
+    return {
+        "id": m.id,
+        "sender_id": m.sender_id,
+        "body": m.body,
+        "image_url": m.image_url,
+        "created_at": m.created_at.isoformat(),
+    }
+
+
+def _touch_conversation(conversation, m):
+    """Record a flushed message on its conversation's inbox fields.
+
+    Moves last_message_* forward, bumps the recipient's unread count and
+    marks the thread read for the sender. A single UPDATE, so concurrent
+    sends don't lose increments.
+    """
+    C = Conversation
+    newer = or_(C.last_message_at.is_(None), C.last_message_at <= m.created_at)
+    if m.sender_id == conversation.buyer_id:
+        sender_unread, sender_read_at, recipient_unread = C.buyer_unread_count, C.buyer_last_read_at, C.seller_unread_count
+    else:
+        sender_unread, sender_read_at, recipient_unread = C.seller_unread_count, C.seller_last_read_at, C.buyer_unread_count
+    C.query.filter_by(id=conversation.id).update({
+        C.last_message_id: case((newer, m.id), else_=C.last_message_id),
+        C.last_message_at: case((newer, m.created_at), else_=C.last_message_at),
+        recipient_unread: func.coalesce(recipient_unread, 0) + 1,
+        sender_unread: 0,
+        sender_read_at: m.created_at,
+    }, synchronize_session=False)
+
+
+def _publish_message(conversation, m):
+    """Push a committed message to both participants' open streams."""
+    data = {"conversation_id": conversation.id, "message": _message_dict(m)}
+    for uid in (conversation.buyer_id, conversation.seller_id):
+        publish(uid, "message", data)
+
 
 def _notify_recipient(conversation, sender_name, body):
     """Send email + push notification to the other party if they're offline."""
     recipient_id = conversation.seller_id if conversation.buyer_id == current_user.id else conversation.buyer_id
-    recipient = db.session.get(User, recipient_id)
+    recipient = db.session.query(User.email, User.display_name, User.last_seen).filter_by(id=recipient_id).first()
     if not recipient:
         return
 
     listing = db.session.get(Listing, conversation.listing_id)
     listing_title = listing.title if listing else "item"
 
-    # Email if offline 5+ minutes
-    if not recipient.last_seen or datetime.now(timezone.utc) - recipient.last_seen > timedelta(minutes=5):
+    # Email if offline 5+ minutes. SQLite hands back naive UTC timestamps
+    last_seen = recipient.last_seen
+    if last_seen and last_seen.tzinfo is None:
+        last_seen = last_seen.replace(tzinfo=timezone.utc)
+    if not last_seen or datetime.now(timezone.utc) - last_seen > timedelta(minutes=5):
         try:
             from email_utils import send_message_notification
             send_message_notification(recipient.email, recipient.display_name, sender_name, listing_title, conversation.id)
@@ -64,28 +148,45 @@ def start_conversation():
 @messages_bp.get("/conversations")
 @login_required
 def my_conversations():
+    """The inbox, most recent activity first, in one query."""
     uid = current_user.id
-    rows = Conversation.query.filter(
-        (Conversation.buyer_id == uid) | (Conversation.seller_id == uid)
-    ).order_by(Conversation.created_at.desc()).all()
+    is_buyer = Conversation.buyer_id == uid
+    other_id = case((is_buyer, Conversation.seller_id), else_=Conversation.buyer_id)
+    first_img = select(ListingImage.image_url).where(
+        ListingImage.listing_id == Conversation.listing_id,
+    ).order_by(ListingImage.created_at.asc()).limit(1).scalar_subquery()
+
+    rows = db.session.query(
+        Conversation.id, Conversation.listing_id, Conversation.buyer_id, Conversation.seller_id,
+        Conversation.created_at, Conversation.last_message_at,
+        case((is_buyer, Conversation.buyer_unread_count), else_=Conversation.seller_unread_count).label("unread_count"),
+        case((is_buyer, Conversation.buyer_last_read_at), else_=Conversation.seller_last_read_at).label("last_read_at"),
+        Listing.title.label("listing_title"),
+        first_img.label("listing_image"),
+        User.display_name.label("other_user_name"),
+        User.avatar_url.label("other_user_avatar"),
+        Message.body.label("last_message"),
+    ).outerjoin(Listing, Listing.id == Conversation.listing_id
+    ).outerjoin(User, User.id == other_id
+    ).outerjoin(Message, Message.id == Conversation.last_message_id
+    ).filter(
+        or_(Conversation.buyer_id == uid, Conversation.seller_id == uid)
+    ).order_by(Conversation.last_message_at.desc()).all()
 
     result = []
     for c in rows:
-        other_id = c.seller_id if c.buyer_id == uid else c.buyer_id
-        other_user = db.session.get(User, other_id)
-        listing = db.session.get(Listing, c.listing_id)
-        last_msg = Message.query.filter_by(conversation_id=c.id).order_by(Message.created_at.desc()).first()
-        first_img = ListingImage.query.filter_by(listing_id=c.listing_id).order_by(ListingImage.created_at.asc()).first()
-
+        last_at = c.last_message_at or c.created_at
         result.append({
             "id": c.id,
             "listing_id": c.listing_id,
-            "listing_title": listing.title if listing else "Deleted",
-            "listing_image": first_img.image_url if first_img else None,
-            "other_user_name": other_user.display_name or "User" if other_user else "User",
-            "other_user_avatar": other_user.avatar_url if other_user else None,
-            "last_message": last_msg.body if last_msg else None,
-            "last_message_at": last_msg.created_at.isoformat() if last_msg else c.created_at.isoformat(),
+            "listing_title": c.listing_title or "Deleted",
+            "listing_image": c.listing_image,
+            "other_user_name": c.other_user_name or "User",
+            "other_user_avatar": c.other_user_avatar,
+            "last_message": c.last_message,
+            "last_message_at": last_at.isoformat(),
+            "unread_count": c.unread_count or 0,
+            "last_read_at": c.last_read_at.isoformat() if c.last_read_at else None,
             "buyer_id": c.buyer_id,
             "seller_id": c.seller_id,
             "created_at": c.created_at.isoformat()
@@ -93,9 +194,50 @@ def my_conversations():
 
     return jsonify({"conversations": result}), 200
 
+
+@messages_bp.get("/unread-count")
+@login_required
+def unread_count():
+    """Number of conversations with unread messages, for the nav badge."""
+    uid = current_user.id
+    n = Conversation.query.filter(or_(
+        and_(Conversation.buyer_id == uid, Conversation.buyer_unread_count > 0),
+        and_(Conversation.seller_id == uid, Conversation.seller_unread_count > 0),
+    )).count()
+    return jsonify({"count": n}), 200
+
+
+@messages_bp.post("/<conversation_id>/read")
+@login_required
+def mark_read(conversation_id):
+    c = db.session.get(Conversation, conversation_id)
+    if not c:
+        return jsonify({"error": "Not found"}), 404
+    if current_user.id not in [c.buyer_id, c.seller_id]:
+        return jsonify({"error": "Forbidden"}), 403
+
+    now = datetime.utcnow()
+    if c.buyer_id == current_user.id:
+        c.buyer_unread_count = 0
+        c.buyer_last_read_at = now
+    else:
+        c.seller_unread_count = 0
+        c.seller_last_read_at = now
+    db.session.commit()
+    # Other tabs and devices clear their badge too
+    publish(current_user.id, "conversation_read", {"conversation_id": c.id})
+    return jsonify({"ok": True}), 200
+
 @messages_bp.get("/<conversation_id>")
 @login_required
 def get_messages(conversation_id):
+    """A page of a thread, always in ascending order.
+
+    No cursor: the newest `limit` messages. before=<id|timestamp>: the
+    `limit` messages just before it (scrolling back). after=<id|timestamp>:
+    up to `limit` messages after it (catching up). has_more says whether
+    more exist in the direction paged.
+    """
     c = db.session.get(Conversation, conversation_id)
     if not c:
         return jsonify({"error": "Not found"}), 404
@@ -103,22 +245,41 @@ def get_messages(conversation_id):
         return jsonify({"error": "Forbidden"}), 403
 
     other_id = c.seller_id if c.buyer_id == current_user.id else c.buyer_id
-    other_user = db.session.get(User, other_id)
+    other_user = profile_utils.get_one(other_id)
     listing = db.session.get(Listing, c.listing_id)
 
-    msgs = Message.query.filter_by(conversation_id=conversation_id).order_by(Message.created_at.asc()).all()
+    limit = min(max(request.args.get("limit", MESSAGE_PAGE_SIZE, type=int), 1), MAX_MESSAGE_PAGE_SIZE)
+    try:
+        after = _message_cursor(conversation_id, request.args.get("after"))
+        before = _message_cursor(conversation_id, request.args.get("before"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = Message.query.filter_by(conversation_id=conversation_id)
+    if after:
+        query = query.filter(_after(*after))
+    if before:
+        query = query.filter(_before(*before))
+
+    if after and not before:
+        # Catching up: oldest first from the cursor
+        rows = query.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        msgs = rows[:limit]
+    else:
+        # Tail or backward page: newest first, then flipped to ascending
+        rows = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        msgs = list(reversed(rows[:limit]))
+
     return jsonify({
         "listing_title": listing.title if listing else "Deleted",
-        "other_user_name": other_user.display_name or "User" if other_user else "User",
-        "messages": [{
-            "id": m.id,
-            "sender_id": m.sender_id,
-            "body": m.body,
-            "image_url": m.image_url,
-            "created_at": m.created_at.isoformat()
-        } for m in msgs]
+        "other_user_name": (other_user and other_user["display_name"]) or "User",
+        "messages": [_message_dict(m) for m in msgs],
+        "has_more": has_more,
     }), 200
 
+
 @messages_bp.post("/<conversation_id>")
 @login_required
 @limiter.limit("30 per minute")
@@ -136,7 +297,10 @@ def send_message(conversation_id):
 
     m = Message(conversation_id=conversation_id, sender_id=current_user.id, body=body)
     db.session.add(m)
+    db.session.flush()
+    _touch_conversation(c, m)
     db.session.commit()
+    _publish_message(c, m)
 
     _notify_recipient(c, current_user.display_name or current_user.email, body)
 
@@ -174,7 +338,10 @@ def send_chat_image(conversation_id):
 
     m = Message(conversation_id=conversation_id, sender_id=current_user.id, body="[Image]", image_url=url)
     db.session.add(m)
+    db.session.flush()
+    _touch_conversation(c, m)
     db.session.commit()
+    _publish_message(c, m)
 
     _notify_recipient(c, current_user.display_name or current_user.email, "[Image]")
 
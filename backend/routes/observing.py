@@ -1,28 +1,47 @@
 from flask import Blueprint, jsonify
 from flask_login import login_required, current_user
 from sqlalchemy import func
+from cache_utils import invalidate, listing_key
 from extensions import db
 from models import Observing, Listing
 
 observing_bp = Blueprint("observing", __name__)
 
+
+def _bump_observing_count(listing_id, delta):
+    """Atomically adjust the denormalized observer counter.
+
+    Bypasses the ORM, so the caller drops the cached listing after committing.
+    """
+    Listing.query.filter_by(id=listing_id).update(
+        {Listing.observing_count: func.coalesce(Listing.observing_count, 0) + delta},
+        synchronize_session=False,
+    )
+
+
+def _observing_count(listing_id):
+    return db.session.query(Listing.observing_count).filter_by(id=listing_id).scalar() or 0
+
+
 @observing_bp.post("/toggle/<listing_id>")
 @login_required
 def toggle(listing_id):
     existing = Observing.query.filter_by(user_id=current_user.id, listing_id=listing_id).first()
     if existing:
         db.session.delete(existing)
+        _bump_observing_count(listing_id, -1)
         db.session.commit()
-        count = db.session.query(func.count(Observing.id)).filter_by(listing_id=listing_id).scalar()
-        return jsonify({"ok": True, "observing": False, "observing_count": count}), 200
+        invalidate(listing_key(listing_id))
+        return jsonify({"ok": True, "observing": False, "observing_count": _observing_count(listing_id)}), 200
 
     if not db.session.get(Listing, listing_id):
         return jsonify({"error": "Listing not found"}), 404
 
     db.session.add(Observing(user_id=current_user.id, listing_id=listing_id))
+    _bump_observing_count(listing_id, 1)
     db.session.commit()
-    count = db.session.query(func.count(Observing.id)).filter_by(listing_id=listing_id).scalar()
-    return jsonify({"ok": True, "observing": True, "observing_count": count}), 200
+    invalidate(listing_key(listing_id))
+    return jsonify({"ok": True, "observing": True, "observing_count": _observing_count(listing_id)}), 200
 
 @observing_bp.get("")
 @login_required
@@ -2,7 +2,10 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 
 from extensions import db, limiter
-from models import Offer, Listing, Notification, User, Conversation, Message
+from models import Offer, Listing, Notification, Conversation, Message
+import profile_utils
+from realtime_utils import publish
+from .messages import _publish_message, _touch_conversation
 
 offers_bp = Blueprint("offers", __name__)
 
@@ -43,6 +46,7 @@ def make_offer():
     ))
 
     db.session.commit()
+    publish(l.user_id, "offer", _offer_dict(offer))
 
     try:
         from push_utils import send_push_to_user
@@ -61,7 +65,7 @@ def listing_offers(listing_id):
         return jsonify({"error": "Not found"}), 404
 
     offers = Offer.query.filter_by(listing_id=listing_id).order_by(Offer.created_at.desc()).all()
-    return jsonify({"offers": [_offer_dict(o) for o in offers]}), 200
+    return jsonify({"offers": _offer_dicts(offers)}), 200
 
 
 @offers_bp.post("/<offer_id>/respond")
@@ -103,11 +107,14 @@ def respond_offer(offer_id):
             db.session.add(conv)
             db.session.flush()
         amt_str = f"${offer.amount_cents / 100:.2f}"
-        db.session.add(Message(
+        accept_msg = Message(
             conversation_id=conv.id,
             sender_id=offer.seller_id,
             body=f"Offer accepted for {amt_str}! Use this chat to arrange your meetup. Stay safe and meet in a public place!",
-        ))
+        )
+        db.session.add(accept_msg)
+        db.session.flush()
+        _touch_conversation(conv, accept_msg)
 
         try:
             from push_utils import send_push_to_user
@@ -138,19 +145,27 @@ def respond_offer(offer_id):
         return jsonify({"error": "Invalid action"}), 400
 
     db.session.commit()
-    return jsonify({"ok": True, "offer": _offer_dict(offer)}), 200
+    offer_data = _offer_dict(offer)
+    publish(offer.buyer_id, "offer", offer_data)
+    if action == "accept":
+        _publish_message(conv, accept_msg)
+    return jsonify({"ok": True, "offer": offer_data}), 200
 
 
-def _offer_dict(o):
-    buyer = db.session.get(User, o.buyer_id)
-    return {
+def _offer_dicts(offers):
+    buyers = profile_utils.get_many({o.buyer_id for o in offers})
+    return [{
         "id": o.id,
         "listing_id": o.listing_id,
         "buyer_id": o.buyer_id,
-        "buyer_name": buyer.display_name or buyer.email if buyer else "Unknown",
+        "buyer_name": profile_utils.display_name(buyers.get(o.buyer_id)),
         "seller_id": o.seller_id,
         "amount_cents": o.amount_cents,
         "status": o.status,
         "counter_cents": o.counter_cents,
         "created_at": o.created_at.isoformat(),
-    }
+    } for o in offers]
+
+
+def _offer_dict(o):
+    return _offer_dicts([o])[0]
@@ -4,6 +4,7 @@ from flask_login import login_required, current_user
 from sqlalchemy import func
 from extensions import db
 from models import Review, Listing, User, Notification
+import profile_utils
 
 reviews_bp = Blueprint("reviews", __name__)
 
@@ -79,7 +80,7 @@ def seller_reviews(seller_id):
     negative = len(reviews) - positive
 
     return jsonify({
-        "reviews": [_review_dict(r) for r in reviews],
+        "reviews": _review_dicts(reviews),
         "summary": {
             "total": len(reviews),
             "positive": positive,
@@ -117,16 +118,24 @@ def can_review(listing_id):
     return jsonify({"can_review": True}), 200
 
 
+def _review_dicts(reviews):
+    reviewers = profile_utils.get_many({r.reviewer_id for r in reviews})
+    result = []
+    for r in reviews:
+        reviewer = reviewers.get(r.reviewer_id)
+        result.append({
+            "id": r.id,
+            "reviewer_id": r.reviewer_id,
+            "reviewer_name": profile_utils.display_name(reviewer),
+            "reviewer_avatar": reviewer["avatar_url"] if reviewer else None,
+            "seller_id": r.seller_id,
+            "listing_id": r.listing_id,
+            "is_positive": r.is_positive,
+            "comment": r.comment,
+            "created_at": r.created_at.isoformat(),
+        })
+    return result
+
+
 def _review_dict(r):
-    reviewer = db.session.get(User, r.reviewer_id)
-    return {
-        "id": r.id,
-        "reviewer_id": r.reviewer_id,
-        "reviewer_name": (reviewer.display_name or reviewer.email) if reviewer else "Unknown",
-        "reviewer_avatar": reviewer.avatar_url if reviewer else None,
-        "seller_id": r.seller_id,
-        "listing_id": r.listing_id,
-        "is_positive": r.is_positive,
-        "comment": r.comment,
-        "created_at": r.created_at.isoformat(),
-    }
+    return _review_dicts([r])[0]
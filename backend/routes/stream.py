@@ -0,0 +1,68 @@
+import json
+import queue
+import threading
+import time
+
+from flask import Blueprint, Response, current_app, jsonify
+from flask_login import login_required, current_user
+
+from extensions import db, limiter
+from realtime_utils import subscribe, unsubscribe
+
+stream_bp = Blueprint("stream", __name__)
+
+_lock = threading.Lock()
+_open = 0   # streams held by this process
+
+
+@stream_bp.get("")
+@login_required
+@limiter.exempt
+def event_stream():
+    """Server-Sent Events: new messages, offers and notifications for the current user.
+
+    Connections are closed after STREAM_MAX_SECONDS; EventSource reconnects
+    on its own, which keeps worker threads from being held indefinitely.
+    Each open stream still pins a gthread worker thread, so a process holds
+    at most STREAM_MAX_CONNECTIONS of them (kept well below the thread
+    count). Beyond that the client gets a 503 and falls back to polling.
+    """
+    global _open
+    with _lock:
+        if _open >= current_app.config.get("STREAM_MAX_CONNECTIONS", 8):
+            return jsonify({"error": "Too many open streams"}), 503, {"Retry-After": "60"}
+        _open += 1
+
+    user_id = current_user.id
+    heartbeat = current_app.config.get("STREAM_HEARTBEAT_SECONDS", 25)
+    max_seconds = current_app.config.get("STREAM_MAX_SECONDS", 300)
+    q = subscribe(user_id)
+    # Don't hold a pooled DB connection for the life of the stream
+    db.session.remove()
+
+    def generate():
+        deadline = time.monotonic() + max_seconds
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            try:
+                payload = q.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            msg = json.loads(payload)
+            yield f"event: {msg['event']}\ndata: {json.dumps(msg['data'])}\n\n"
+
+    def release():
+        global _open
+        unsubscribe(user_id, q)
+        with _lock:
+            _open -= 1
+
+    resp = Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # keep proxies from buffering the stream
+    })
+    # Runs when the server closes the response, even if the client left
+    # before the first chunk and the generator never started
+    resp.call_on_close(release)
+    return resp
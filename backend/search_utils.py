@@ -0,0 +1,97 @@
+"""Full-text search over listing titles and descriptions.
+
+PostgreSQL: a generated, weighted tsvector column with a GIN index, plus a
+pg_trgm index on title so typos and partial words still match.
+SQLite (dev): an external-content FTS5 table (porter stemmer) kept in sync
+with listings by triggers.
+
+Both are created by migration 517520e7b3da and maintained by the database
+itself, so listing create and update need no extra work. When neither is
+available search falls back to ILIKE.
+"""
+import re
+
+from sqlalchemy import func, literal_column, or_, select, table, text
+
+from extensions import db
+from models import Listing
+
+_caps = None  # cached {"fts": "postgres"|"sqlite"|None, "trgm": bool}
+
+
+def _capabilities():
+    """Detect which search index exists (cached per process)."""
+    global _caps
+    if _caps is not None:
+        return _caps
+    caps = {"fts": None, "trgm": False}
+    dialect = db.engine.dialect.name
+    try:
+        if dialect == "postgresql":
+            row = db.session.execute(text(
+                "SELECT "
+                "EXISTS (SELECT 1 FROM information_schema.columns "
+                "        WHERE table_name='listings' AND column_name='search_vector'), "
+                "EXISTS (SELECT 1 FROM pg_indexes WHERE indexname='ix_listings_title_trgm')"
+            )).first()
+            caps["fts"] = "postgres" if row[0] else None
+            caps["trgm"] = bool(row[1])
+        elif dialect == "sqlite":
+            row = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='listings_fts'"
+            )).first()
+            caps["fts"] = "sqlite" if row else None
+    except Exception:
+        db.session.rollback()
+    _caps = caps
+    return caps
+
+
+def _fts5_query(q):
+    """Turn free text into a safe FTS5 query: every word must match, last one as a prefix."""
+    words = re.findall(r"\w+", q, flags=re.UNICODE)
+    if not words:
+        return None
+    terms = ['"' + w.replace('"', '""') + '"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def apply_text_search(query, q):
+    """Filter a Listing query by free text.
+
+    Returns (query, rank) where rank is a relevance expression (higher is
+    better) usable in ORDER BY, or None when only the ILIKE fallback exists.
+    """
+    caps = _capabilities()
+
+    if caps["fts"] == "postgres":
+        tsq = func.websearch_to_tsquery("english", q)
+        vector = literal_column("listings.search_vector")
+        match = vector.op("@@")(tsq)
+        rank = func.ts_rank_cd(vector, tsq)
+        if caps["trgm"]:
+            # Trigram fallback catches typos and partial words ("iphon")
+            match = or_(match, Listing.title.op("%")(q))
+            rank = rank + func.similarity(Listing.title, q)
+        return query.filter(match), rank
+
+    if caps["fts"] == "sqlite":
+        fts_q = _fts5_query(q)
+        if fts_q:
+            fts = select(
+                literal_column("rowid").label("fts_rowid"),
+                literal_column("-bm25(listings_fts, 10.0, 1.0)").label("rank"),
+            ).select_from(table("listings_fts")).where(
+                text("listings_fts MATCH :fts_q").bindparams(fts_q=fts_q)
+            ).subquery("fts")
+            query = query.join(fts, literal_column("listings.rowid") == fts.c.fts_rowid)
+            return query, fts.c.rank
+
+    query = query.filter(
+        or_(
+            Listing.title.ilike(f"%{q}%"),
+            Listing.description.ilike(f"%{q}%"),
+        )
+    )
+    return query, None
@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="pm-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["UPLOAD_FOLDER"] = os.path.join(_tmp, "uploads")
+os.environ["OUTBOX_WORKER"] = "0"
+os.environ.pop("REDIS_URL", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+    from extensions import db
+    with flask_app.app_context():
+        db.create_all()
+    return flask_app
+
+
+@pytest.fixture()
+def db_session(app):
+    from extensions import db
+    with app.app_context():
+        yield db.session
+        db.session.remove()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+
+class FakeResend:
+    """A local stand-in for the Resend API that records every POST.
+
+    Answers with the next status in `statuses`, then 200 once they run out.
+    """
+
+    def __init__(self):
+        self.requests = []   # (path, headers, parsed JSON body)
+        self.statuses = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.requests.append((self.path, dict(self.headers), body))
+                status = fake.statuses.pop(0) if fake.statuses else 200
+                out = json.dumps({"id": "fake"} if status < 400 else {"message": "nope"}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture(scope="session")
+def fake_resend_server():
+    fake = FakeResend()
+    yield fake
+    fake.server.shutdown()
+
+
+@pytest.fixture()
+def fake_resend(app, fake_resend_server):
+    fake_resend_server.requests.clear()
+    fake_resend_server.statuses.clear()
+    app.config.update(RESEND_API_KEY="re_test", RESEND_API_BASE=fake_resend_server.base)
+    return fake_resend_server
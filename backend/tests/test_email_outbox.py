@@ -0,0 +1,136 @@
+"""Resend delivery through the outbox, against the local fake server in conftest."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from email_utils import BATCH_SIZE, render_stale_listing_nudge, send_email, send_email_batch
+from models import Listing, OutboxJob, User
+from outbox_utils import drain_outbox
+
+
+def _jobs(kind):
+    return OutboxJob.query.filter_by(kind=kind).all()
+
+
+def test_single_email_body(fake_resend, db_session):
+    send_email("buyer@example.com", "Hello", "<p>Hi</p>", reply_to="help@example.com")
+    db_session.commit()
+
+    assert drain_outbox() == 1
+    [(path, headers, body)] = fake_resend.requests
+    assert path == "/emails"
+    assert headers["Authorization"] == "Bearer re_test"
+    assert body == {
+        "from": "Pocket Market <noreply@pocket-market.com>",
+        "to": ["buyer@example.com"],
+        "subject": "Hello",
+        "html": "<p>Hi</p>",
+        "reply_to": "help@example.com",
+    }
+    [job] = _jobs("email")
+    assert job.status == "sent" and job.sent_at is not None and job.last_error is None
+
+
+def test_batch_templates_and_chunks(fake_resend, db_session):
+    emails = [render_stale_listing_nudge(f"s{i}@example.com", f"Seller {i}", f"Bike {i}", f"l{i}", 14)
+              for i in range(BATCH_SIZE + 50)]
+    send_email_batch(emails)
+    db_session.commit()
+
+    assert drain_outbox() == 2
+    assert sorted(len(body) for path, _, body in fake_resend.requests) == [50, BATCH_SIZE]
+    assert {path for path, _, _ in fake_resend.requests} == {"/emails/batch"}
+    sent = {e["to"][0]: e for _, _, body in fake_resend.requests for e in body}
+    assert len(sent) == BATCH_SIZE + 50
+    first = sent["s0@example.com"]
+    assert first["subject"] == 'Your listing "Bike 0" hasn\'t had any offers'
+    assert "Hi Seller 0," in first["html"]
+    assert "<strong>14 days</strong>" in first["html"]
+    assert "https://pocket-market.com/listing/l0" in first["html"]
+    assert "$" not in first["html"]  # every placeholder substituted
+    assert [j.status for j in _jobs("email_batch")] == ["sent", "sent"]
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retryable_errors_back_off(fake_resend, db_session, status):
+    fake_resend.statuses.append(status)
+    send_email_batch([render_stale_listing_nudge("s@example.com", "S", "Bike", "l1", 14)])
+    db_session.commit()
+
+    before = datetime.utcnow()
+    assert drain_outbox() == 1
+    [job] = _jobs("email_batch")
+    assert job.status == "pending"
+    assert job.attempts == 1
+    assert f"Resend API error {status}" in job.last_error
+    # OUTBOX_BACKOFF_SECONDS (30) with up to 20% jitter
+    assert job.next_attempt_at.replace(tzinfo=None) >= before + timedelta(seconds=24)
+
+    # Not due yet, so nothing more is sent until the backoff runs out
+    assert drain_outbox() == 0
+    job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+    assert drain_outbox() == 1
+    db_session.refresh(job)
+    assert job.status == "sent" and job.attempts == 2
+    assert len(fake_resend.requests) == 2
+
+
+@pytest.mark.parametrize("status", [400, 403, 422])
+def test_client_errors_fail_for_good(fake_resend, db_session, status):
+    fake_resend.statuses.append(status)
+    send_email("buyer@example.com", "Hello", "<p>Hi</p>")
+    db_session.commit()
+
+    assert drain_outbox() == 1
+    [job] = _jobs("email")
+    assert job.status == "failed"
+    assert job.attempts == 1
+    assert f"Resend API error {status}" in job.last_error
+    assert len(fake_resend.requests) == 1
+
+
+def _stale_listing(db_session, email):
+    user = User(email=email, display_name="Sam")
+    db_session.add(user)
+    db_session.flush()
+    listing = Listing(user_id=user.id, title="Bike", price_cents=5000, category="bikes", condition="used",
+                      pickup_or_shipping="pickup", created_at=datetime.utcnow() - timedelta(days=10))
+    db_session.add(listing)
+    db_session.commit()
+    return listing.id
+
+
+def _nudge(app):
+    with app.test_client() as client:
+        return client.post("/api/cron/nudge-stale", headers={"X-Cron-Secret": app.config["CRON_SECRET"]}).get_json()
+
+
+def test_stale_nudge_marked_only_after_send(app, fake_resend, db_session):
+    listing_id = _stale_listing(db_session, "seller@example.com")
+    fake_resend.statuses.append(503)
+
+    assert _nudge(app)["nudged"] == 1
+    assert drain_outbox() == 1
+    assert db_session.get(Listing, listing_id).nudged_at is None
+    # Still queued for retry, so the next run does not queue it again
+    assert _nudge(app)["nudged"] == 0
+
+    [job] = _jobs("email_batch")
+    job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+    assert drain_outbox() == 1
+    db_session.expire_all()
+    assert db_session.get(Listing, listing_id).nudged_at is not None
+    assert _nudge(app)["nudged"] == 0
+
+
+def test_stale_nudge_requeued_after_permanent_failure(app, fake_resend, db_session):
+    listing_id = _stale_listing(db_session, "seller@example.com")
+    fake_resend.statuses.append(422)
+
+    _nudge(app)
+    drain_outbox()
+    assert [j.status for j in _jobs("email_batch")] == ["failed"]
+    assert db_session.get(Listing, listing_id).nudged_at is None
+    assert _nudge(app)["nudged"] == 1
@@ -3,6 +3,7 @@ import { Routes, Route, Navigate, useLocation } from "react-router-dom";
 import BottomNav from "./components/BottomNav.jsx";
 import Toast from "./components/Toast.jsx";
 import { api } from "./api.js";
+import { onStreamEvent, closeStream, pollWhileStreamDown } from "./utils/stream.js";
 
 import Home from "./pages/Home.jsx";
 import Search from "./pages/Search.jsx";
@@ -114,17 +115,23 @@ export default function App(){
     if (!me.authed) return;
     const check = async () => {
       try {
-        const [convRes, notifRes] = await Promise.all([
-          api.conversations(),
+        const [chatRes, notifRes] = await Promise.all([
+          api.unreadChatCount(),
           api.unreadNotifCount(),
         ]);
-        setUnreadChats((convRes.conversations || []).filter(c => c.unread_count > 0).length);
+        setUnreadChats(chatRes.count || 0);
         setUnreadNotifs(notifRes.count || 0);
       } catch {}
     };
     check();
-    const timer = setInterval(check, 30000);
-    return () => clearInterval(timer);
+    // New messages/notifications arrive over the event stream; the slow poll
+    // is a safety net, the fast one covers a missing or refused stream
+    const timer = setInterval(check, 300000);
+    const offPoll = pollWhileStreamDown(check, 30000);
+    const offMessage = onStreamEvent("message", check);
+    const offRead = onStreamEvent("conversation_read", check);
+    const offNotif = onStreamEvent("notification", () => setUnreadNotifs(n => n + 1));
+    return () => { clearInterval(timer); offPoll(); offMessage(); offRead(); offNotif(); closeStream(); };
   }, [me.authed]);
 
   const notify = (t) => {
@@ -66,7 +66,12 @@ export const api = {
 
   startConversation: (payload) => req("/api/messages/start", { method:"POST", body: payload }),
   conversations: () => req("/api/messages/conversations"),
-  messages: (conversationId) => req(`/api/messages/${conversationId}`),
+  unreadChatCount: () => req("/api/messages/unread-count"),
+  markConversationRead: (conversationId) => req(`/api/messages/${conversationId}/read`, { method:"POST" }),
+  messages: (conversationId, params = {}) => {
+    const qs = new URLSearchParams(params).toString();
+    return req(`/api/messages/${conversationId}${qs ? `?${qs}` : ""}`);
+  },
   sendMessage: (conversationId, payload) => req(`/api/messages/${conversationId}`, { method:"POST", body: payload }),
 
   warningText: () => req("/api/safety/warning-text"),
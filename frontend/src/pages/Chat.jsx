@@ -2,6 +2,7 @@ import React, { useEffect, useState, useRef } from "react";
 import { useParams, useNavigate } from "react-router-dom";
 import { IconBack, IconSend, IconCamera } from "../components/Icons.jsx";
 import { api } from "../api.js";
+import { onStreamEvent, pollWhileStreamDown } from "../utils/stream.js";
 
 function formatTime(iso){
   const d = new Date(iso);
@@ -15,12 +16,40 @@ export default function Chat({ me, notify }){
   const [body, setBody] = useState("");
   const [meta, setMeta] = useState({});
   const [busy, setBusy] = useState(true);
+  const [hasEarlier, setHasEarlier] = useState(false);
   const bottomRef = useRef(null);
 
+  const appendNew = (incoming) => setMsgs(prev => {
+    const seen = new Set(prev.map(m => m.id));
+    return [...prev, ...incoming.filter(m => !seen.has(m.id))];
+  });
+
   const load = async () => {
     const res = await api.messages(id);
     setMsgs(res.messages || []);
+    setHasEarlier(!!res.has_more);
     setMeta({ listing_title: res.listing_title, other_user_name: res.other_user_name });
+    api.markConversationRead(id).catch(() => {});
+  };
+
+  // Fetch only what arrived after the newest message we already have
+  const loadNewer = async () => {
+    const last = msgs[msgs.length - 1];
+    if (!last) return load();
+    const res = await api.messages(id, { after: last.id });
+    appendNew(res.messages || []);
+  };
+
+  const loadNewerRef = useRef(loadNewer);
+  loadNewerRef.current = loadNewer;
+
+  const loadEarlier = async () => {
+    if (!msgs.length) return;
+    try {
+      const res = await api.messages(id, { before: msgs[0].id });
+      setMsgs(prev => [...(res.messages || []), ...prev]);
+      setHasEarlier(!!res.has_more);
+    } catch(err) { notify(err.message); }
   };
 
   useEffect(() => {
@@ -31,16 +60,29 @@ export default function Chat({ me, notify }){
     })();
   }, [id]);
 
+  useEffect(() => {
+    return onStreamEvent("message", (data) => {
+      if (data.conversation_id !== id) return;
+      appendNew([data.message]);
+      if (data.message.sender_id !== me?.user?.id) api.markConversationRead(id).catch(() => {});
+    });
+  }, [id]);
+
+  // Without a live stream, check for new messages every few seconds
+  useEffect(() => pollWhileStreamDown(() => loadNewerRef.current().catch(() => {}), 10000), [id]);
+
+  // Scroll to bottom only when a newer message arrives, not when older ones are prepended
+  const lastId = msgs[msgs.length - 1]?.id;
   useEffect(() => {
     bottomRef.current?.scrollIntoView({ behavior:"smooth" });
-  }, [msgs]);
+  }, [lastId]);
 
   const send = async () => {
     if (!body.trim()) return;
     try{
       await api.sendMessage(id, { body });
       setBody("");
-      await load();
+      await loadNewer();
     }catch(err){ notify(err.message); }
   };
 
@@ -54,7 +96,7 @@ export default function Chat({ me, notify }){
     if (!file) return;
     try {
       await api.sendChatImage(id, file);
-      await load();
+      await loadNewer();
     } catch(err) { notify(err.message); }
     e.target.value = "";
   };
@@ -88,7 +130,16 @@ export default function Chat({ me, notify }){
           <div className="muted" style={{ textAlign:"center", marginTop:20 }}>Loading...</div>
         ) : msgs.length === 0 ? (
           <div className="muted" style={{ textAlign:"center", marginTop:40 }}>No messages yet. Say hello!</div>
-        ) : msgs.map(m => {
+        ) : <>
+        {hasEarlier && (
+          <div style={{ textAlign:"center", marginBottom:8 }}>
+            <button onClick={loadEarlier} style={{
+              background:"none", border:"none", color:"var(--muted)",
+              cursor:"pointer", fontSize:12, padding:4,
+            }}>Load earlier messages</button>
+          </div>
+        )}
+        {msgs.map(m => {
           const isMe = m.sender_id === myId;
           return (
             <div key={m.id} style={{
@@ -120,6 +171,7 @@ export default function Chat({ me, notify }){
             </div>
           );
         })}
+        </>}
         <div ref={bottomRef} />
       </div>
 
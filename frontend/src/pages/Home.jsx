@@ -5,6 +5,7 @@ import SkeletonCard from "../components/SkeletonCard.jsx";
 import { IconSearch, IconChevronRight, IconCamera, IconBell } from "../components/Icons.jsx";
 import SwipeCards from "../components/SwipeCards.jsx";
 import { api } from "../api.js";
+import { imageSrcSet, CARD_SIZES } from "../utils/images.js";
 
 const SORT_OPTIONS = [
   { value:"newest", label:"Newest" },
@@ -280,6 +281,7 @@ export default function Home({ me, notify, unreadNotifs = 0 }){
                   <div style={{ position:"relative" }}>
                     {l.images?.length > 0 ? (
                       <img src={`${api.base}${l.images[0]}`} alt={l.title} className="card-image"
+                        srcSet={imageSrcSet(api.base, l.image_srcsets?.[0])} sizes={CARD_SIZES} loading="lazy"
                         onError={e => { e.target.onerror=null; e.target.src=""; e.target.className="card-image-placeholder"; }} />
                     ) : (
                       <div className="card-image-placeholder"><IconCamera size={28} /></div>
@@ -340,6 +342,7 @@ export default function Home({ me, notify, unreadNotifs = 0 }){
               <div style={{ position:"relative" }}>
                 {l.images?.length > 0 ? (
                   <img src={`${api.base}${l.images[0]}`} alt={l.title} className="card-image"
+                    srcSet={imageSrcSet(api.base, l.image_srcsets?.[0])} sizes={CARD_SIZES} loading="lazy"
                     onError={e => { e.target.onerror=null; e.target.src=""; e.target.className="card-image-placeholder"; }} />
                 ) : (
                   <div className="card-image-placeholder"><IconCamera size={28} /></div>
@@ -4,6 +4,7 @@ import Card from "../components/Card.jsx";
 import SkeletonCard from "../components/SkeletonCard.jsx";
 import { IconSearch, IconBack, IconCamera, IconChevronRight } from "../components/Icons.jsx";
 import { api } from "../api.js";
+import { imageSrcSet, CARD_SIZES } from "../utils/images.js";
 
 function money(cents){
   const d = cents / 100;
@@ -27,6 +28,7 @@ const SORT_OPTIONS = [
   { value:"oldest", label:"Oldest" },
   { value:"price_low", label:"Price: Low → High" },
   { value:"price_high", label:"Price: High → Low" },
+  { value:"relevance", label:"Best match" },
 ];
 const RADIUS_OPTIONS = [
   { value:8,   label:"5 mi" },
@@ -383,6 +385,7 @@ export default function Search({ notify }){
                   <div style={{ position:"relative" }}>
                     {l.images?.length > 0 ? (
                       <img src={`${api.base}${l.images[0]}`} alt={l.title} className="card-image"
+                        srcSet={imageSrcSet(api.base, l.image_srcsets?.[0])} sizes={CARD_SIZES} loading="lazy"
                         onError={e => { e.target.onerror=null; e.target.src=""; e.target.className="card-image-placeholder"; }} />
                     ) : (
                       <div className="card-image-placeholder"><IconCamera size={28} /></div>
@@ -0,0 +1,13 @@
+/**
+ * Build an <img srcSet> string from a listing's image_srcsets entry
+ * ({ width: url }). Returns undefined for images without variants so the
+ * browser just uses src.
+ */
+export function imageSrcSet(base, srcset) {
+  const entries = Object.entries(srcset || {});
+  if (!entries.length) return undefined;
+  return entries.map(([w, url]) => `${base}${url} ${w}w`).join(", ");
+}
+
+// Grid cards are two columns on phones, up to ~240px wide on desktop
+export const CARD_SIZES = "(max-width: 600px) 50vw, 240px";
@@ -0,0 +1,64 @@
+import { api } from "../api.js";
+
+/**
+ * One shared EventSource on /api/stream for the whole app. Components
+ * subscribe to named events ("message", "offer", "notification",
+ * "conversation_read", ...) and get the parsed payload. A listener for an
+ * event name is added the first time something subscribes to it. The
+ * browser reconnects on its own after drops and the server's periodic close.
+ * When the server refuses the stream (503 when a process has too many open),
+ * the browser gives up; we retry a minute later and pollWhileStreamDown()
+ * callers poll in the meantime.
+ */
+const RETRY_MS = 60000;
+let source = null;
+let retryTimer = null;
+const handlers = {};
+const listening = new Set();
+
+function listen(name){
+  if (!source || listening.has(name)) return;
+  listening.add(name);
+  source.addEventListener(name, (e) => {
+    let data;
+    try { data = JSON.parse(e.data); } catch { return; }
+    (handlers[name] || []).forEach((fn) => fn(data));
+  });
+}
+
+function ensureSource(){
+  if (source || typeof EventSource === "undefined") return;
+  source = new EventSource(`${api.base}/api/stream`, { withCredentials: true });
+  source.onerror = () => {
+    if (!source || source.readyState !== EventSource.CLOSED) return;
+    source = null;
+    clearTimeout(retryTimer);
+    retryTimer = setTimeout(() => { retryTimer = null; if (Object.keys(handlers).length) ensureSource(); }, RETRY_MS);
+  };
+  listening.clear();
+  Object.keys(handlers).forEach(listen);
+}
+
+export function streamLive(){
+  return !!source && source.readyState === EventSource.OPEN;
+}
+
+/** Call fn every ms while the event stream is not connected. Returns a cleanup function. */
+export function pollWhileStreamDown(fn, ms){
+  const timer = setInterval(() => { if (!streamLive()) fn(); }, ms);
+  return () => clearInterval(timer);
+}
+
+export function onStreamEvent(name, fn){
+  ensureSource();
+  (handlers[name] = handlers[name] || []).push(fn);
+  listen(name);
+  return () => { handlers[name] = (handlers[name] || []).filter((h) => h !== fn); };
+}
+
+export function closeStream(){
+  if (source) source.close();
+  source = null;
+  clearTimeout(retryTimer);
+  retryTimer = null;
+}